@@ -1,221 +1,1114 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
+import collections
+import itertools
 import json
 import asyncio
-from datetime import datetime, timedelta
+import bisect
+from datetime import datetime, timedelta, timezone
+import gzip
+import heapq
 import os
-from typing import Optional, cast
+import re
+import signal
+import sys
+import tempfile
+import time
+from typing import Literal, Optional, cast
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-# Bot setup - using only non-privileged intents for slash commands
+# The command extensions import this module for its state and helpers. When
+# it's run as a script it is __main__, so make sure they get this copy rather
+# than importing a second one.
+sys.modules.setdefault('discord_bot', sys.modules[__name__])
+
+def env_flag(name, default=False):
+    """Read a yes/no setting from the environment"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Member cache - BOT_MEMBER_CACHE=0 stops discord.py from keeping and chunking
+# every guild's member list. Display names then come from interaction payloads,
+# the stored usernames and occasional batched lookups. Welcome messages need the
+# members intent, so in that mode they are opt-in with BOT_WELCOME_MESSAGES=1.
+MEMBER_CACHE = env_flag('BOT_MEMBER_CACHE', default=True)
+WELCOME_MESSAGES = env_flag('BOT_WELCOME_MESSAGES', default=MEMBER_CACHE)
+
+# Bot setup
 intents = discord.Intents.default()
 intents.guilds = True
-intents.members = True  # Enable to detect new members for welcome messages
+intents.members = MEMBER_CACHE or WELCOME_MESSAGES  # Needed to detect new members for welcome messages
+
+if MEMBER_CACHE:
+    member_options = {}
+else:
+    member_options = {
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+        'chunk_guilds_at_startup': False
+    }
+
+def parse_shard_ids(value):
+    """Parse a shard list like "0-3,8" into a sorted list of shard IDs"""
+    shard_ids = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            shard_ids.update(range(int(first), int(last) + 1))
+        else:
+            shard_ids.add(int(part))
+    return sorted(shard_ids) or None
+
+# Sharding - opt in with BOT_SHARDED=1 once one gateway connection can't keep up.
+# BOT_SHARD_COUNT is optional, Discord's recommended count is used when it's unset.
+# For multi-process deployments, give each process its own BOT_SHARD_IDS range
+# (e.g. "0-3") together with BOT_SHARD_COUNT and BOT_STORAGE=sqlite.
+SHARD_IDS = parse_shard_ids(os.getenv('BOT_SHARD_IDS', ''))
+SHARDED = env_flag('BOT_SHARDED') or SHARD_IDS is not None
+SHARD_COUNT = int(os.environ['BOT_SHARD_COUNT']) if os.getenv('BOT_SHARD_COUNT') else None
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# HTTP interactions - BOT_HTTP_INTERACTIONS=1 serves slash commands, buttons and
+# modals from a signed HTTP endpoint (BOT_HTTP_HOST:BOT_HTTP_PORT/interactions)
+# instead of the gateway, so several workers can share the load behind a load
+# balancer. Workers share data through BOT_STORAGE=sqlite, and a normal gateway
+# process still runs the status boards and welcome messages. BOT_PUBLIC_KEY is
+# the application's public key, fetched from Discord when it's unset.
+HTTP_INTERACTIONS = env_flag('BOT_HTTP_INTERACTIONS')
+HTTP_HOST = os.getenv('BOT_HTTP_HOST', '127.0.0.1')
+HTTP_PORT = int(os.getenv('BOT_HTTP_PORT', '8080'))
+PUBLIC_KEY = os.getenv('BOT_PUBLIC_KEY')
 
-# Data storage
+if SHARDED:
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **member_options)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents, **member_options)
+
+# Data storage - "json" (default) or "sqlite" for several processes sharing one store
 DATA_FILE = 'bot_data.json'
+STORAGE = os.getenv('BOT_STORAGE', 'json').lower()
+DB_FILE = os.getenv('BOT_DB_FILE', 'bot_data.db')
+STORE_POLL_SECONDS = float(os.getenv('BOT_STORE_POLL_SECONDS', '2'))
+
+# HTTP workers always run next to a gateway process, and two processes
+# rewriting one JSON file would lose each other's changes
+if HTTP_INTERACTIONS and STORAGE != 'sqlite':
+    raise ValueError("BOT_HTTP_INTERACTIONS needs BOT_STORAGE=sqlite, so the workers and the gateway process share one store")
+
+# Durability - how hard a save tries to reach the disk before returning.
+# "none" leaves it to the OS, "periodic" (default) fsyncs the data file every
+# BOT_FSYNC_SECONDS and "always" fsyncs on every save. JSON saves always write
+# a temporary file and swap it in, so a crash can't leave a half-written file.
+DURABILITY = os.getenv('BOT_DURABILITY', 'periodic').lower()
+if DURABILITY not in ('none', 'periodic', 'always'):
+    raise ValueError(f"BOT_DURABILITY must be none, periodic or always, not {DURABILITY!r}")
+FSYNC_SECONDS = float(os.getenv('BOT_FSYNC_SECONDS', '30'))
+SQLITE_SYNCHRONOUS = {'none': 'OFF', 'periodic': 'NORMAL', 'always': 'FULL'}
+
+# Snapshots - a gzipped copy of bot_data every BOT_SNAPSHOT_MINUTES (0 turns
+# them off), keeping the newest BOT_SNAPSHOT_KEEP. A damaged data file is
+# restored from the newest snapshot that reads back cleanly.
+SNAPSHOT_DIR = os.getenv('BOT_SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_MINUTES = float(os.getenv('BOT_SNAPSHOT_MINUTES', '60'))
+SNAPSHOT_KEEP = int(os.getenv('BOT_SNAPSHOT_KEEP', '24'))
+if SNAPSHOT_KEEP < 1:
+    raise ValueError(f"BOT_SNAPSHOT_KEEP must be at least 1, not {SNAPSHOT_KEEP} (set BOT_SNAPSHOT_MINUTES=0 to turn snapshots off)")
+
+def empty_data():
+    """Return a fresh, empty bot data structure"""
+    return {
+        'config': {},
+        'active_operations': {},
+        'shifts': {},
+        'shift_totals': {},
+        'usernames': {},
+        'airport_usage': {}
+    }
+
+def merge_changes(base, ours, theirs, additive=False):
+    """Three-way merge of two edits made to the same base value.
+    
+    Keys only one side changed keep that side's value, nested dicts are merged
+    recursively, and when both sides changed a plain value ours wins - unless
+    additive is set, in which case both numeric changes are kept.
+    """
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in set(base) | set(ours) | set(theirs):
+            value = merge_changes(base.get(key), ours.get(key), theirs.get(key), additive)
+            if value is not None:
+                merged[key] = value
+        return merged
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    if additive and all(isinstance(value, (int, float)) for value in (ours, theirs)):
+        return max(0, theirs + ours - (base or 0))
+    return ours
+
+class SQLiteStore:
+    """bot_data kept in SQLite so several bot processes can share it.
+    
+    Each top-level entry of a section (one guild's config, shifts, totals or
+    usernames, or one operation) is its own row, stamped with the store-wide
+    revision that last wrote it. A commit holds SQLite's write lock, writes only
+    the rows this process changed, and if another process wrote one of them
+    since we last read it the two edits are merged instead of one overwriting
+    the other. Shift totals merge additively so no minutes are lost.
+    """
+    
+    ADDITIVE_SECTIONS = ('shift_totals', 'airport_usage')
+    
+    def __init__(self, path):
+        import sqlite3
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS[DURABILITY]}")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS documents (
+            section TEXT NOT NULL,
+            key TEXT NOT NULL,
+            body TEXT,
+            revision INTEGER NOT NULL,
+            PRIMARY KEY (section, key))""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_revision ON documents (revision)")
+        # {(section, key): (revision, body)} as of the last time we read or wrote the row
+        self.known = {}
+        self.revision = 0
+        self.data_version = None
+        # Called with (section, key) whenever another process changed a row
+        self.listeners = []
+    
+    def _last_revision(self):
+        row = self.conn.execute("SELECT MAX(revision) FROM documents").fetchone()
+        return row[0] or 0
+    
+    def load(self):
+        """Read the whole store, importing the JSON data file on first use"""
+        data = empty_data()
+        rows = self.conn.execute("SELECT section, key, body, revision FROM documents").fetchall()
+        if not rows and os.path.exists(DATA_FILE):
+            with open(DATA_FILE, 'r') as f:
+                imported = json.load(f)
+            self.commit(imported)
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            print(f"Imported {DATA_FILE} into {DB_FILE}")
+            return imported
+        for section, key, body, revision in rows:
+            self.known[(section, key)] = (revision, body)
+            if body is not None:
+                data.setdefault(section, {})[key] = json.loads(body)
+        self.revision = self._last_revision()
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return data
+    
+    def commit(self, data):
+        """Write every row that changed since we last saw it, merging concurrent edits.
+        
+        Returns the number of bytes written.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            revision = self._last_revision() + 1
+            written = {}
+            sections = {section for section, value in data.items() if isinstance(value, dict)}
+            sections.update(section for section, _ in self.known)
+            for section in sections:
+                current = data.setdefault(section, {})
+                keys = set(current) | {key for known_section, key in self.known if known_section == section}
+                for key in keys:
+                    base_revision, base_body = self.known.get((section, key), (0, None))
+                    ours_body = json.dumps(current[key], sort_keys=True, default=str) if key in current else None
+                    if ours_body == base_body:
+                        continue
+                    row = self.conn.execute(
+                        "SELECT body, revision FROM documents WHERE section = ? AND key = ?", (section, key)
+                    ).fetchone()
+                    theirs_body, theirs_revision = row if row else (None, 0)
+                    if theirs_revision != base_revision:
+                        # Another process wrote this row since we last read it
+                        merged = merge_changes(
+                            json.loads(base_body) if base_body else None,
+                            current.get(key),
+                            json.loads(theirs_body) if theirs_body else None,
+                            additive=section in self.ADDITIVE_SECTIONS
+                        )
+                        if merged is None:
+                            current.pop(key, None)
+                        else:
+                            current[key] = merged
+                        ours_body = json.dumps(merged, sort_keys=True, default=str) if merged is not None else None
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO documents (section, key, body, revision) VALUES (?, ?, ?, ?)",
+                        (section, key, ours_body, revision)
+                    )
+                    written[(section, key)] = (revision, ours_body)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        # self.revision is left alone so refresh() still sees rows other
+        # processes committed before this one
+        self.known.update(written)
+        return sum(len(body or '') for _, body in written.values())
+    
+    def update_row(self, data, section, key, change):
+        """Run a check-and-change on one row while holding SQLite's write lock.
+        
+        change gets the row as it is in the store right now, including other
+        processes' edits (None if there isn't one), may edit it in place, and
+        returns a result that is passed back. An edited row is written before
+        the lock is released and copied into data, so no other process can
+        act on the old value in between, which a merge in commit() can't
+        guarantee for checks like a capacity limit.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT body, revision FROM documents WHERE section = ? AND key = ?", (section, key)
+            ).fetchone()
+            body, revision = row if row else (None, 0)
+            value = json.loads(body) if body is not None else None
+            result = change(value)
+            new_body = json.dumps(value, sort_keys=True, default=str) if value is not None else None
+            if new_body != body:
+                revision = self._last_revision() + 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO documents (section, key, body, revision) VALUES (?, ?, ?, ?)",
+                    (section, key, new_body, revision)
+                )
+                body = new_body
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        if row or body is not None:
+            self.known[(section, key)] = (revision, body)
+            if value is None:
+                data.setdefault(section, {}).pop(key, None)
+            else:
+                data.setdefault(section, {})[key] = value
+        return result
+    
+    def refresh(self, data):
+        """Pull in rows other processes wrote since our last look"""
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return []
+        self.data_version = data_version
+        rows = self.conn.execute(
+            "SELECT section, key, body, revision FROM documents WHERE revision > ? ORDER BY revision",
+            (self.revision,)
+        ).fetchall()
+        changed = []
+        for section, key, body, revision in rows:
+            self.revision = max(self.revision, revision)
+            base_revision, base_body = self.known.get((section, key), (0, None))
+            if revision == base_revision:
+                continue
+            current = data.setdefault(section, {})
+            theirs = json.loads(body) if body is not None else None
+            ours_body = json.dumps(current[key], sort_keys=True, default=str) if key in current else None
+            if ours_body != base_body:
+                # We have unsaved edits to this row, keep them on top of theirs
+                value = merge_changes(
+                    json.loads(base_body) if base_body else None,
+                    current.get(key),
+                    theirs,
+                    additive=section in self.ADDITIVE_SECTIONS
+                )
+            else:
+                value = theirs
+            if value is None:
+                current.pop(key, None)
+            else:
+                current[key] = value
+            self.known[(section, key)] = (revision, body)
+            changed.append((section, key))
+        for section, key in changed:
+            for listener in self.listeners:
+                listener(section, key)
+        return changed
+
+data_store = SQLiteStore(DB_FILE) if STORAGE == 'sqlite' else None
+
+# Sections a data file must have to be loaded
+REQUIRED_SECTIONS = ('config', 'active_operations', 'shifts', 'shift_totals')
+
+def read_data_file(path):
+    """Read a data file or gzipped snapshot, raising ValueError if it's damaged"""
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as f:
+            data = json.loads(f.read())
+    except (OSError, EOFError, ValueError) as e:
+        # gzip checks its CRC, so a truncated or corrupted snapshot fails here too
+        raise ValueError(f"{type(e).__name__}: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+    missing = [section for section in REQUIRED_SECTIONS if not isinstance(data.get(section), dict)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    return data
+
+def snapshot_paths():
+    """Snapshot files, oldest first"""
+    try:
+        names = os.listdir(SNAPSHOT_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        os.path.join(SNAPSHOT_DIR, name) for name in names
+        if name.startswith('bot_data-') and name.endswith('.json.gz')
+    )
 
 def load_data():
-    """Load bot data from JSON file"""
+    """Load bot data from the configured store"""
+    if data_store:
+        return data_store.load()
+    if not os.path.exists(DATA_FILE):
+        return empty_data()
+    try:
+        return read_data_file(DATA_FILE)
+    except ValueError as e:
+        print(f"{DATA_FILE} is damaged ({e}), looking for a snapshot")
+    for path in reversed(snapshot_paths()):
+        try:
+            data = read_data_file(path)
+        except ValueError as e:
+            print(f"Skipping damaged snapshot {path} ({e})")
+            continue
+        # Keep the damaged file for a look later; the next save replaces it
+        damaged = f"{DATA_FILE}.damaged-{int(time.time())}"
+        os.replace(DATA_FILE, damaged)
+        print(f"Restored bot data from {path}, moved the damaged file to {damaged}")
+        return data
+    raise RuntimeError(f"{DATA_FILE} is damaged and there is no usable snapshot in {SNAPSHOT_DIR}/")
+
+# Set when bot_data has changes that only need to reach disk eventually,
+# such as refreshed display names. flush_dirty_data writes them in one go.
+data_dirty = False
+
+def mark_dirty():
+    """Flag bot_data as having unsaved, non-urgent changes"""
+    global data_dirty
+    data_dirty = True
+
+# Persistence cost counters, shown in /diagnostics
+save_stats = {'saves': 0, 'seconds': 0.0, 'bytes': 0, 'fsyncs': 0, 'fsync_seconds': 0.0}
+snapshot_stats = {'snapshots': 0, 'seconds': 0.0, 'last_bytes': 0, 'last_raw_bytes': 0, 'failures': 0}
+
+# Set when the data file was replaced but not yet fsynced ("periodic" durability)
+data_unsynced = False
+
+def fsync_path(path):
+    """fsync a file or directory by path, counting it in save_stats"""
+    started = time.perf_counter()
+    fd = os.open(path, os.O_RDONLY)
     try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
+        os.fsync(fd)
+    except OSError:
+        # Not every platform can sync a directory
+        if not os.path.isdir(path):
+            raise
+    finally:
+        os.close(fd)
+    save_stats['fsyncs'] += 1
+    save_stats['fsync_seconds'] += time.perf_counter() - started
+
+def replace_file(path, body, durable):
+    """Atomically replace path with body (bytes), fsyncing it first if durable"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
     except FileNotFoundError:
-        return {
-            'config': {},
-            'active_operations': {},
-            'shifts': {},
-            'shift_totals': {},
-            'usernames': {}
-        }
+        # What open() would have created, under the process umask
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        # mkstemp makes the file private, which the swap would carry over
+        os.chmod(temp_path, mode)
+        if durable:
+            fsync_path(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if durable:
+        # Make the rename itself survive a power cut
+        fsync_path(directory)
+
+def sync_data_file():
+    """fsync the data file if it was replaced since the last sync"""
+    global data_unsynced
+    if data_unsynced and os.path.exists(DATA_FILE):
+        fsync_path(DATA_FILE)
+        fsync_path(os.path.dirname(os.path.abspath(DATA_FILE)))
+    data_unsynced = False
 
 def save_data(data):
-    """Save bot data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2, default=str)
+    """Save bot data to the configured store"""
+    global data_dirty, data_unsynced
+    data_dirty = False
+    started = time.perf_counter()
+    if data_store:
+        written = data_store.commit(data)
+    else:
+        body = json.dumps(data, separators=(',', ':'), default=str).encode()
+        replace_file(DATA_FILE, body, durable=DURABILITY == 'always')
+        data_unsynced = DURABILITY == 'periodic'
+        written = len(body)
+    save_stats['saves'] += 1
+    save_stats['seconds'] += time.perf_counter() - started
+    save_stats['bytes'] += written
+
+def write_snapshot(body):
+    """Write a gzipped snapshot and prune the old ones. Returns its size.
+    
+    Runs in a worker thread; body is the already serialized bot_data.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    compressed = gzip.compress(body, compresslevel=6)
+    path = os.path.join(SNAPSHOT_DIR, f"bot_data-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.json.gz")
+    replace_file(path, compressed, durable=DURABILITY != 'none')
+    for old_path in snapshot_paths()[:-SNAPSHOT_KEEP]:
+        os.remove(old_path)
+    return len(compressed)
 
 # Global data variable
 bot_data = load_data()
 
+# Handlers await REST calls between reading and saving bot_data, so every
+# check-and-mutate step runs under the lock of the guild (or operation) it
+# touches. Different guilds never wait on each other.
+guild_locks = {}
+operation_locks = {}
+role_locks = {}
+status_board_locks = {}
+
+def keyed_lock(locks, key):
+    """Return the lock for key, creating it on first use"""
+    key = str(key)
+    lock = locks.get(key)
+    if lock is None:
+        lock = locks[key] = asyncio.Lock()
+    return lock
+
+def guild_lock(guild_id):
+    """Lock guarding one guild's config, shifts, totals and usernames"""
+    return keyed_lock(guild_locks, guild_id)
+
+def operation_lock(operation_id):
+    """Lock guarding one operation's attendee list"""
+    return keyed_lock(operation_locks, operation_id)
+
+# Outbound REST priority classes, highest first, with the (jobs per second,
+# burst) each may start per bucket. Interaction responses and followups are
+# never held back, and the other classes have their own budgets so background
+# edits can't use up the rate limit that user replies need. Like Discord's own
+# rate limits, the budgets apply per bucket - the guild or channel a job is
+# for - so a busy guild doesn't hold up everyone else's edits. discord.py
+# still handles Discord's global limit.
+REST_BUDGETS = {
+    'interaction': None,
+    'user_edit': (10.0, 10),
+    'maintenance': (5.0, 10),
+}
+
+class RestScheduler:
+    """Runs outbound REST work in priority order, each class within its budget.
+    
+    Jobs are coroutine functions. A job's bucket (a guild or channel ID, or None
+    for work that belongs to neither) picks the budget it's counted against.
+    Submitting a job with a key replaces a queued
+    job with the same key that hasn't started yet - the older work is dropped,
+    the queue position is kept and the job moves up if the new one is more
+    urgent - so only the newest status board edit for a guild is ever sent.
+    
+    A job may also carry a resume descriptor, a JSON-safe list that
+    resume_work() can turn back into the same job, so work still queued at
+    shutdown can be saved and queued again on the next start. Once drain()
+    has given up, the scheduler is closed and later jobs are only recorded.
+    """
+    
+    def __init__(self, budgets):
+        self.budgets = budgets
+        self.priorities = list(budgets)
+        self.queues = {name: collections.deque() for name in budgets}
+        # {(priority, bucket): (tokens, time.monotonic() they were counted)}
+        self.tokens = {}
+        self.queued_keys = {}
+        self.wakeup = asyncio.Event()
+        self.task = None
+        # Running jobs; the event loop only keeps weak references to tasks
+        self.jobs = set()
+        self.running = 0
+        # Set by drain(); from then on jobs are recorded in unsent, not run
+        self.closed = False
+        self.unsent = []
+        self.stats = {
+            name: {'sent': 0, 'failed': 0, 'superseded': 0, 'wait': 0.0, 'max_wait': 0.0, 'max_depth': 0}
+            for name in budgets
+        }
+    
+    def submit(self, priority, job, key=None, resume=None, bucket=None):
+        """Queue job in a priority class, returning a future for its result"""
+        if self.closed:
+            if resume:
+                self.unsent.append(resume)
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(lambda f: f.exception())
+            future.set_exception(RuntimeError("the REST scheduler has shut down"))
+            return future
+        
+        queued = self.queued_keys.get(key) if key is not None else None
+        if queued is not None:
+            queued['job'] = job
+            queued['resume'] = resume
+            self.stats[queued['priority']]['superseded'] += 1
+            if self.priorities.index(priority) < self.priorities.index(queued['priority']):
+                self.queues[queued['priority']].remove(queued)
+                queued['priority'] = priority
+                self.queues[priority].appendleft(queued)
+            self.wakeup.set()
+            return queued['future']
+        
+        future = asyncio.get_running_loop().create_future()
+        # Fire-and-forget callers never look at the result; failures are printed instead
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        entry = {'priority': priority, 'job': job, 'key': key, 'resume': resume, 'bucket': bucket, 'future': future, 'queued_at': time.monotonic()}
+        self.queues[priority].append(entry)
+        if key is not None:
+            self.queued_keys[key] = entry
+        stats = self.stats[priority]
+        stats['max_depth'] = max(stats['max_depth'], len(self.queues[priority]))
+        
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.dispatch())
+        self.wakeup.set()
+        return future
+    
+    async def run(self, priority, job, key=None, resume=None, bucket=None):
+        """Queue job and wait for its result"""
+        return await self.submit(priority, job, key, resume, bucket)
+    
+    async def drain(self, timeout):
+        """Wait up to timeout seconds for queued and running jobs to finish, then close.
+        
+        Jobs that haven't started by then are taken off the queue, so they
+        never run here, and their resume descriptors are returned. The list is
+        also self.unsent, which collects the jobs submitted after closing.
+        """
+        deadline = time.monotonic() + timeout
+        while (self.running or any(self.queues.values())) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        
+        # No await from here on, so nothing can start in between
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+        for name in self.priorities:
+            while self.queues[name]:
+                entry = self.queues[name].popleft()
+                if entry['resume']:
+                    self.unsent.append(entry['resume'])
+                entry['future'].set_exception(RuntimeError("the REST scheduler has shut down"))
+        self.queued_keys.clear()
+        return self.unsent
+    
+    def available(self, name, bucket, now):
+        """The budget a bucket of a priority class has left, refilled up to now"""
+        rate, burst = self.budgets[name]
+        tokens, counted_at = self.tokens.get((name, bucket), (burst, now))
+        return min(burst, tokens + (now - counted_at) * rate)
+    
+    def next_entry(self):
+        """Take the most urgent queued job whose bucket has budget left"""
+        now = time.monotonic()
+        for name in self.priorities:
+            queue = self.queues[name]
+            if not queue:
+                continue
+            if not self.budgets[name]:
+                entry = queue.popleft()
+            else:
+                # The oldest job in a bucket with budget left; others keep their places
+                entry, exhausted = None, set()
+                for queued in queue:
+                    if queued['bucket'] in exhausted:
+                        continue
+                    tokens = self.available(name, queued['bucket'], now)
+                    if tokens >= 1:
+                        self.tokens[(name, queued['bucket'])] = (tokens - 1, now)
+                        entry = queued
+                        break
+                    exhausted.add(queued['bucket'])
+                if entry is None:
+                    continue
+                queue.remove(entry)
+            if entry['key'] is not None:
+                self.queued_keys.pop(entry['key'], None)
+            return entry
+        return None
+    
+    def seconds_until_budget(self):
+        """How long until some bucket with queued work can start another job"""
+        now = time.monotonic()
+        waits = [
+            (1 - self.available(name, bucket, now)) / self.budgets[name][0]
+            for name in self.priorities
+            if self.budgets[name]
+            for bucket in {entry['bucket'] for entry in self.queues[name]}
+        ]
+        return max(0.01, min(waits)) if waits else None
+    
+    async def dispatch(self):
+        while True:
+            self.wakeup.clear()
+            entry = self.next_entry()
+            if entry is not None:
+                task = asyncio.create_task(self.execute(entry))
+                self.jobs.add(task)
+                task.add_done_callback(self.jobs.discard)
+                continue
+            
+            timeout = self.seconds_until_budget()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def execute(self, entry):
+        stats = self.stats[entry['priority']]
+        waited = time.monotonic() - entry['queued_at']
+        stats['wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+        self.running += 1
+        try:
+            result = await entry['job']()
+        except Exception as e:
+            stats['failed'] += 1
+            print(f"{entry['priority']} request failed: {e}")
+            entry['future'].set_exception(e)
+        else:
+            stats['sent'] += 1
+            entry['future'].set_result(result)
+        finally:
+            self.running -= 1
+    
+    def describe(self):
+        """One line of queue metrics per priority class"""
+        lines = []
+        for name in self.priorities:
+            stats = self.stats[name]
+            done = stats['sent'] + stats['failed']
+            average_ms = stats['wait'] / done * 1000 if done else 0
+            lines.append(
+                f"• **{name}** - {len(self.queues[name])} queued (max {stats['max_depth']}), "
+                f"{stats['sent']} sent, {stats['failed']} failed, {stats['superseded']} superseded, "
+                f"wait {average_ms:.0f}ms avg / {stats['max_wait'] * 1000:.0f}ms max"
+            )
+        return lines
+
+rest_scheduler = RestScheduler(REST_BUDGETS)
+
+class TimerScheduler:
+    """Runs jobs at wall-clock deadlines from one task sleeping on a min-heap.
+    
+    Each timer has a key, and scheduling a key that's already pending does
+    nothing, so timers can be rebuilt from bot_data as often as needed. Jobs
+    check whether they're still wanted when they fire instead of being
+    cancelled, so idle timers cost nothing until their deadline.
+    """
+    
+    # Sleep at most this long, so a changed system clock can't strand a timer
+    MAX_SLEEP = 3600
+    
+    def __init__(self):
+        self.heap = []
+        self.keys = set()
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        # Timers that have fired and are still running
+        self.firing = set()
+    
+    def schedule(self, when, key, job):
+        """Run the coroutine function job at the aware datetime when"""
+        if key in self.keys:
+            return
+        entry = (when.timestamp(), next(self.sequence), key, job)
+        heapq.heappush(self.heap, entry)
+        self.keys.add(key)
+        if self.heap[0] is entry:
+            self.wakeup.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+    
+    def next_deadline(self):
+        return datetime.fromtimestamp(self.heap[0][0], timezone.utc) if self.heap else None
+    
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), min(delay, self.MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, key, job = heapq.heappop(self.heap)
+            self.keys.discard(key)
+            task = asyncio.create_task(self.fire(key, job))
+            self.firing.add(task)
+            task.add_done_callback(self.firing.discard)
+    
+    def stop(self):
+        """Drop every pending timer and stop the task"""
+        self.heap.clear()
+        self.keys.clear()
+        if self.task is not None:
+            self.task.cancel()
+    
+    async def fire(self, key, job):
+        try:
+            await job()
+        except Exception as e:
+            print(f"Timer {key} failed: {e}")
+
+timers = TimerScheduler()
+
+# Render cache - each guild has a version number that goes up whenever its
+# shifts, totals or usernames change. A rendered leaderboard or status board is
+# reused until the version moves on or the time shown on it would change.
+RENDER_CACHE_SECONDS = 600
+
+# {guild_id: version}
+guild_versions = {}
+
+# {(guild_id, kind): (version, valid until as time.time(), embed)}
+render_cache = {}
+
+# Render cache counters, shown in /diagnostics
+render_stats = {'hits': 0, 'renders': 0}
+
+def guild_changed(guild_id):
+    """Note that a guild's shifts, totals or usernames changed"""
+    guild_id = str(guild_id)
+    guild_versions[guild_id] = guild_versions.get(guild_id, 0) + 1
+    global_ranking.stale.add(guild_id)
+
+def on_guild_data_stored(section, key):
+    """Invalidate renders of a guild another process changed"""
+    if section in ('shifts', 'shift_totals', 'usernames'):
+        guild_changed(key)
+
+if data_store:
+    data_store.listeners.append(on_guild_data_stored)
+
+async def cached_render(guild, kind, render, valid_until):
+    """Return a guild's embed of one kind, rendering it only if the cached one is stale.
+    
+    valid_until(embed) says until when a fresh render stays correct.
+    """
+    guild_id = str(guild.id)
+    version = guild_versions.get(guild_id, 0)
+    entry = render_cache.get((guild_id, kind))
+    if entry and entry[0] == version and time.time() < entry[1]:
+        render_stats['hits'] += 1
+        return entry[2]
+    render_stats['renders'] += 1
+    embed = await render(guild)
+    render_cache[(guild_id, kind)] = (version, valid_until(), embed)
+    return embed
+
+# User IDs per guild whose display name we still need to look up
+pending_username_lookups = {}
+
+def display_name_for(guild, user_id, fallback=None):
+    """Best known display name without touching the API.
+    
+    Tries the member cache, then the stored usernames, then fallback. Unknown
+    users are queued for the next batched lookup when the member cache is off.
+    """
+    member = guild.get_member(int(user_id))
+    if member:
+        return member.display_name
+    stored = bot_data.get('usernames', {}).get(str(guild.id), {}).get(str(user_id))
+    if stored:
+        return stored
+    if not MEMBER_CACHE:
+        pending_username_lookups.setdefault(str(guild.id), set()).add(int(user_id))
+    return fallback or f"User {user_id}"
+
+async def fetch_member(guild, user_id):
+    """Return a guild member from the cache, or from the API if it isn't cached"""
+    member = guild.get_member(user_id)
+    if member:
+        return member
+    try:
+        return await guild.fetch_member(user_id)
+    except discord.NotFound:
+        return None
+
+def remember_username(guild_id, user_id, display_name):
+    """Store a display name, marking data dirty only if it actually changed"""
+    names = bot_data.setdefault('usernames', {}).setdefault(str(guild_id), {})
+    if names.get(str(user_id)) == display_name:
+        return False
+    names[str(user_id)] = display_name
+    guild_changed(guild_id)
+    mark_dirty()
+    return True
+
+@tasks.loop(minutes=5)
+async def resolve_pending_usernames():
+    """Look up queued unknown display names, 100 members per gateway request"""
+    for guild_id in list(pending_username_lookups):
+        user_ids = sorted(pending_username_lookups.pop(guild_id))
+        guild = bot.get_guild(int(guild_id))
+        if guild is None:
+            continue
+        for i in range(0, len(user_ids), 100):
+            try:
+                members = await guild.query_members(user_ids=user_ids[i:i + 100], limit=100, cache=False)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                print(f"Username lookup failed for guild {guild_id}: {e}")
+                continue
+            for member in members:
+                remember_username(guild_id, member.id, member.display_name)
+
+# PTFS airports offered by autocomplete before anyone has used them.
+# BOT_KNOWN_AIRPORTS adds more as a comma separated list of codes.
+KNOWN_AIRPORTS = {
+    'IRFD': 'Greater Rockford',
+    'ITKO': 'Tokyo International',
+    'IPPH': 'Perth International',
+    'ILAR': 'Larnaca International',
+    'IZOL': 'Izolirani International',
+    'ISAU': 'Sauthemptona',
+    'IMLR': 'Mellor International',
+    'IBTH': 'Saint Barthelemy',
+    'IGRV': 'Grindavik',
+    'IPAP': 'Paphos International',
+    'ILKL': 'Lukla',
+    'IHEN': 'Henstridge',
+    'ISCM': 'RAF Scampton',
+    'IJAF': 'Al Najaf',
+    'IBAR': 'Barra',
+    'ISKP': 'Skopelos',
+    'IDCS': 'Saba',
+    'IBLT': 'Boltic',
+    'ITRC': 'Training Centre',
+    'IGAR': 'Air Base Garry',
+    'IIAB': 'McConnell AFB',
+}
+for code in os.getenv('BOT_KNOWN_AIRPORTS', '').split(','):
+    if code.strip():
+        KNOWN_AIRPORTS.setdefault(code.strip().upper(), '')
+
+class AirportIndex:
+    """One guild's airport codes, sorted so every prefix is a contiguous slice.
+    
+    Built once from the known airports and the guild's usage counts and then
+    kept up to date as airports are used, so autocomplete never scans shifts.
+    """
+    
+    def __init__(self, usage):
+        # The guild's {code: uses} dict in bot_data
+        self.usage = usage
+        self.codes = sorted(set(KNOWN_AIRPORTS) | set(usage))
+        self.ranked = None
+    
+    def add(self, code):
+        """Count one use of an airport"""
+        self.usage[code] = self.usage.get(code, 0) + 1
+        position = bisect.bisect_left(self.codes, code)
+        if position == len(self.codes) or self.codes[position] != code:
+            self.codes.insert(position, code)
+        self.ranked = None
+    
+    def suggest(self, prefix, limit=25):
+        """Codes starting with prefix, most used first"""
+        rank = lambda code: (-self.usage.get(code, 0), code)
+        prefix = prefix.strip().upper()
+        if not prefix:
+            if self.ranked is None:
+                self.ranked = sorted(self.codes, key=rank)
+            return self.ranked[:limit]
+        start = bisect.bisect_left(self.codes, prefix)
+        end = bisect.bisect_left(self.codes, prefix + '\uffff', lo=start)
+        return heapq.nsmallest(limit, self.codes[start:end], key=rank)
+    
+    def label(self, code):
+        """How a code is shown in the autocomplete list"""
+        label = f"{code} - {KNOWN_AIRPORTS[code]}" if KNOWN_AIRPORTS.get(code) else code
+        uses = self.usage.get(code, 0)
+        if uses:
+            label += f" ({uses} use{'s' if uses != 1 else ''})"
+        return label[:100]
+
+# Airport indexes by guild ID, built on first use
+airport_indexes = {}
+
+def airport_index(guild_id):
+    """Return a guild's airport index, building it on first use"""
+    guild_id = str(guild_id)
+    index = airport_indexes.get(guild_id)
+    if index is None:
+        all_usage = bot_data.setdefault('airport_usage', {})
+        if guild_id not in all_usage:
+            # First time for this guild - count the airports already in its data
+            usage = {}
+            airports = [shift['airport'] for shift in bot_data['shifts'].get(guild_id, {}).values()]
+            airports += [
+                operation['airport'] for operation_id, operation in bot_data['active_operations'].items()
+                if operation_id.startswith(f"{guild_id}_")
+            ]
+            for airport in airports:
+                airport = airport.strip().upper()
+                usage[airport] = usage.get(airport, 0) + 1
+            all_usage[guild_id] = usage
+        index = airport_indexes[guild_id] = AirportIndex(all_usage[guild_id])
+    return index
+
+def forget_airport_index(section, key):
+    """Rebuild a guild's index next time if another process changed its usage"""
+    if section == 'airport_usage':
+        airport_indexes.pop(key, None)
+
+if data_store:
+    data_store.listeners.append(forget_airport_index)
+
+async def airport_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest airport codes from the guild's prefix index"""
+    if interaction.guild_id is None:
+        return []
+    index = airport_index(interaction.guild_id)
+    return [app_commands.Choice(name=index.label(code), value=code) for code in index.suggest(current)]
+
+# Set by shut_down(). From then on commands, buttons and modals get a short
+# reply instead of starting work the drain would have to finish or save.
+shutting_down = False
+
+async def accept_interaction(interaction):
+    """Interaction check that turns everything away while shutting down"""
+    if not shutting_down:
+        return True
+    if interaction.type is not discord.InteractionType.autocomplete:
+        await interaction.response.send_message("The bot is restarting, please try again in a minute.", ephemeral=True)
+    return False
+
+bot.tree.interaction_check = accept_interaction
+
+class ShutdownCheck:
+    """Mixin for views, modals and dynamic items, applying accept_interaction"""
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await accept_interaction(interaction)
+
 class AttendButton(discord.ui.View):
     def __init__(self, operation_id):
         super().__init__(timeout=None)
         self.operation_id = operation_id
-        
-        # Set custom_id after button creation for persistence
-        for item in self.children:
-            if isinstance(item, discord.ui.Button) and item.label == 'Attend':
-                item.custom_id = f"attend_operation_{operation_id}"
-
-    @discord.ui.button(label='Attend', style=discord.ButtonStyle.green, emoji='✋')
-    async def attend_operation(self, interaction: discord.Interaction, button: discord.ui.Button):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        guild = interaction.guild
-        user = interaction.user
-        
-        # Get member object
-        member = user if isinstance(user, discord.Member) else guild.get_member(user.id)
-        if member is None:
-            await interaction.response.send_message("Could not find your member information.", ephemeral=True)
-            return
-        
-        # Get operation data
-        if self.operation_id not in bot_data['active_operations']:
-            await interaction.response.send_message("This operation is no longer active.", ephemeral=True)
-            return
-        
-        operation_data = bot_data['active_operations'][self.operation_id]
-        
-        # Check if user is already attending
-        if str(user.id) in operation_data['attendees']:
-            await interaction.response.send_message("You are already attending this operation!", ephemeral=True)
-            return
-        
-        # Check if operation is at max capacity
-        if operation_data.get('max_attendees') and len(operation_data['attendees']) >= operation_data['max_attendees']:
-            await interaction.response.send_message("This operation is at maximum capacity!", ephemeral=True)
-            return
-        
-        # Add user to attendees and store username for leaderboard
-        operation_data['attendees'][str(user.id)] = {
-            'username': member.display_name,
-            'joined_at': datetime.now().isoformat()
-        }
-        
-        # Store username for future leaderboard use
-        guild_id_str = str(guild.id)
-        if guild_id_str not in bot_data.setdefault('usernames', {}):
-            bot_data['usernames'][guild_id_str] = {}
-        bot_data['usernames'][guild_id_str][str(user.id)] = member.display_name
-        
-        # Give user the operation role
-        role_name = f"Operation_{operation_data['date']}"
+        self.add_item(AttendAction(operation_id))
+
+class AttendAction(ShutdownCheck, discord.ui.DynamicItem[discord.ui.Button], template=r'attend_operation_(?P<operation_id>.+)'):
+    """The Attend button of any operation, matched by custom_id.
+    
+    Registered once with add_dynamic_items, so buttons keep working after a
+    restart without a view per active operation.
+    """
+    
+    def __init__(self, operation_id):
+        super().__init__(discord.ui.Button(
+            label='Attend',
+            style=discord.ButtonStyle.green,
+            emoji='✋',
+            custom_id=f"attend_operation_{operation_id}"
+        ))
+        self.operation_id = operation_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['operation_id'])
+    
+    async def callback(self, interaction: discord.Interaction):
+        await extension('operations').attend(interaction, self.operation_id)
+
+async def give_operation_role(guild, member, role_name):
+    """Give a member the operation role, creating it only once even if clicks race"""
+    async with keyed_lock(role_locks, f"{guild.id}_{role_name}"):
         role = discord.utils.get(guild.roles, name=role_name)
         if not role:
             role = await guild.create_role(name=role_name, color=discord.Color.blue())
-        
-        await member.add_roles(role)
-        
-        # Update the embed with all operation info
-        embed_description = f"**Airport:** {operation_data['airport']}\n**Time:** {operation_data['time']}\n**Date:** {operation_data['date']}"
-        
-        if operation_data.get('operation_type'):
-            embed_description += f"\n**Type:** {operation_data['operation_type']}"
-        if operation_data.get('description'):
-            embed_description += f"\n**Description:** {operation_data['description']}"
-        if operation_data.get('max_attendees'):
-            embed_description += f"\n**Max Attendees:** {operation_data['max_attendees']}"
-        
-        embed = discord.Embed(
-            title="📢 OPERATION ACTIVE",
-            description=embed_description,
-            color=discord.Color.green(),
-            timestamp=datetime.now()
-        )
-        
-        attendees_list = []
-        for attendee_data in operation_data['attendees'].values():
-            attendees_list.append(f"• {attendee_data['username']}")
-        
-        # Show attendee count with capacity if applicable
-        attendee_count = len(attendees_list)
-        max_attendees = operation_data.get('max_attendees')
-        
-        if max_attendees:
-            attendee_header = f"Attendees ({attendee_count}/{max_attendees})"
-        else:
-            attendee_header = f"Attendees ({attendee_count})"
-        
-        if attendees_list:
-            embed.add_field(name=attendee_header, value="\n".join(attendees_list), inline=False)
-        else:
-            embed.add_field(name=attendee_header, value="No attendees yet", inline=False)
-        
-        embed.set_footer(text="ATC24 PTFS Ground Crew")
-        
-        # Update the message
-        await interaction.response.edit_message(embed=embed, view=self)
-        
-        # Save data
-        save_data(bot_data)
-        
-        # Send confirmation
-        await interaction.followup.send(f"You have successfully joined the operation! You now have the {role.name} role.", ephemeral=True)
+            # Cache it now - GUILD_ROLE_CREATE can arrive after the next click
+            # takes the lock, and HTTP workers never receive it at all
+            guild._add_role(role)
+    
+    await member.add_roles(role)
 
-class ShiftManageView(discord.ui.View):
+class ShiftManageView(ShutdownCheck, discord.ui.View):
     def __init__(self):
         super().__init__(timeout=300)
 
-    @discord.ui.button(label='Add Time', style=discord.ButtonStyle.green)
+    @discord.ui.button(label='Add Time', style=discord.ButtonStyle.green, custom_id='shift_manage:add_time')
     async def add_time(self, interaction: discord.Interaction, button: discord.ui.Button):
         modal = AddTimeModal()
         await interaction.response.send_modal(modal)
 
-    @discord.ui.button(label='Remove Time', style=discord.ButtonStyle.red)
+    @discord.ui.button(label='Remove Time', style=discord.ButtonStyle.red, custom_id='shift_manage:remove_time')
     async def remove_time(self, interaction: discord.Interaction, button: discord.ui.Button):
         modal = RemoveTimeModal()
         await interaction.response.send_modal(modal)
 
-    @discord.ui.button(label='End Shift', style=discord.ButtonStyle.secondary)
+    @discord.ui.button(label='End Shift', style=discord.ButtonStyle.secondary, custom_id='shift_manage:end_shift')
     async def end_shift(self, interaction: discord.Interaction, button: discord.ui.Button):
         modal = EndShiftModal()
         await interaction.response.send_modal(modal)
 
-    @discord.ui.button(label='Update Leaderboard', style=discord.ButtonStyle.primary)
+    @discord.ui.button(label='Update Leaderboard', style=discord.ButtonStyle.primary, custom_id='shift_manage:leaderboard')
     async def update_leaderboard(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.send_leaderboard_update(interaction)
+        await extension('shifts').update_leaderboard(interaction)
 
-    async def send_leaderboard_update(self, interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        config = bot_data['config'].get(str(interaction.guild.id), {})
-        leaderboard_channel_id = config.get('leaderboard_channel')
-        
-        if not leaderboard_channel_id:
-            await interaction.response.send_message("Leaderboard channel not configured. Use /setup first.", ephemeral=True)
-            return
-        
-        channel = bot.get_channel(leaderboard_channel_id)
-        if not isinstance(channel, discord.TextChannel):
-            await interaction.response.send_message("Leaderboard channel not found or is not a text channel.", ephemeral=True)
-            return
-        
-        # Generate leaderboard
-        leaderboard_embed = await generate_leaderboard_embed(interaction.guild)
-        
-        # Send or update leaderboard message
-        async for message in channel.history(limit=10):
-            if (message.author == bot.user and message.embeds and 
-                message.embeds[0].title and "Shift Time Leaderboard" in message.embeds[0].title):
-                await message.edit(embed=leaderboard_embed)
-                await interaction.response.send_message("Leaderboard updated!", ephemeral=True)
-                return
-        
-        await channel.send(embed=leaderboard_embed)
-        await interaction.response.send_message("New leaderboard posted!", ephemeral=True)
+def parse_user_reference(text):
+    """Parse a user mention or ID, raising ValueError if it's neither"""
+    text = text.strip()
+    if text.startswith('<@') and text.endswith('>'):
+        return int(text[2:-1].replace('!', ''))
+    return int(text)
 
-class AddTimeModal(discord.ui.Modal):
+def modal_custom_id(kind):
+    """A unique modal custom_id that still says which modal class it belongs to"""
+    return f"{kind}:{os.urandom(8).hex()}"
+
+class AddTimeModal(ShutdownCheck, discord.ui.Modal):
     def __init__(self):
-        super().__init__(title="Add Time to User")
+        super().__init__(title="Add Time to User", custom_id=modal_custom_id('add_time'))
         
         self.user_input = discord.ui.TextInput(
             label="User (mention or ID)",
+            custom_id='user',
             placeholder="@username or user ID",
             required=True
         )
         self.time_input = discord.ui.TextInput(
             label="Time to add (in minutes)",
+            custom_id='minutes',
             placeholder="60",
             required=True
         )
@@ -224,62 +1117,21 @@ class AddTimeModal(discord.ui.Modal):
         self.add_item(self.time_input)
 
     async def on_submit(self, interaction: discord.Interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        try:
-            # Parse user
-            user_str = self.user_input.value.strip()
-            if user_str.startswith('<@') and user_str.endswith('>'):
-                user_id = int(user_str[2:-1].replace('!', ''))
-            else:
-                user_id = int(user_str)
-            
-            user = interaction.guild.get_member(user_id)
-            if not user:
-                await interaction.response.send_message("User not found.", ephemeral=True)
-                return
-            
-            # Store username for leaderboard
-            guild_id = str(interaction.guild.id)
-            user_id_str = str(user_id)
-            if guild_id not in bot_data.setdefault('usernames', {}):
-                bot_data['usernames'][guild_id] = {}
-            bot_data['usernames'][guild_id][user_id_str] = user.display_name
-            
-            # Parse time
-            minutes = int(self.time_input.value)
-            
-            if guild_id not in bot_data['shift_totals']:
-                bot_data['shift_totals'][guild_id] = {}
-            
-            if user_id_str not in bot_data['shift_totals'][guild_id]:
-                bot_data['shift_totals'][guild_id][user_id_str] = 0
-            
-            bot_data['shift_totals'][guild_id][user_id_str] += minutes
-            save_data(bot_data)
-            
-            await interaction.response.send_message(f"Added {minutes} minutes to {user.display_name}'s total time.", ephemeral=True)
-            
-        except ValueError:
-            await interaction.response.send_message("Invalid input. Please check your values.", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
+        await extension('shifts').add_time(interaction, self.user_input.value, self.time_input.value)
 
-class RemoveTimeModal(discord.ui.Modal):
+class RemoveTimeModal(ShutdownCheck, discord.ui.Modal):
     def __init__(self):
-        super().__init__(title="Remove Time from User")
+        super().__init__(title="Remove Time from User", custom_id=modal_custom_id('remove_time'))
         
         self.user_input = discord.ui.TextInput(
             label="User (mention or ID)",
+            custom_id='user',
             placeholder="@username or user ID",
             required=True
         )
         self.time_input = discord.ui.TextInput(
             label="Time to remove (in minutes)",
+            custom_id='minutes',
             placeholder="60",
             required=True
         )
@@ -288,57 +1140,15 @@ class RemoveTimeModal(discord.ui.Modal):
         self.add_item(self.time_input)
 
     async def on_submit(self, interaction: discord.Interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        try:
-            # Parse user
-            user_str = self.user_input.value.strip()
-            if user_str.startswith('<@') and user_str.endswith('>'):
-                user_id = int(user_str[2:-1].replace('!', ''))
-            else:
-                user_id = int(user_str)
-            
-            user = interaction.guild.get_member(user_id)
-            if not user:
-                await interaction.response.send_message("User not found.", ephemeral=True)
-                return
-            
-            # Store username for leaderboard
-            guild_id = str(interaction.guild.id)
-            user_id_str = str(user_id)
-            if guild_id not in bot_data.setdefault('usernames', {}):
-                bot_data['usernames'][guild_id] = {}
-            bot_data['usernames'][guild_id][user_id_str] = user.display_name
-            
-            # Parse time
-            minutes = int(self.time_input.value)
-            
-            if guild_id not in bot_data['shift_totals']:
-                bot_data['shift_totals'][guild_id] = {}
-            
-            if user_id_str not in bot_data['shift_totals'][guild_id]:
-                bot_data['shift_totals'][guild_id][user_id_str] = 0
-            
-            bot_data['shift_totals'][guild_id][user_id_str] = max(0, bot_data['shift_totals'][guild_id][user_id_str] - minutes)
-            save_data(bot_data)
-            
-            await interaction.response.send_message(f"Removed {minutes} minutes from {user.display_name}'s total time.", ephemeral=True)
-            
-        except ValueError:
-            await interaction.response.send_message("Invalid input. Please check your values.", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
+        await extension('shifts').remove_time(interaction, self.user_input.value, self.time_input.value)
 
-class EndShiftModal(discord.ui.Modal):
+class EndShiftModal(ShutdownCheck, discord.ui.Modal):
     def __init__(self):
-        super().__init__(title="End User's Shift")
+        super().__init__(title="End User's Shift", custom_id=modal_custom_id('end_user_shift'))
         
         self.user_input = discord.ui.TextInput(
             label="User (mention or ID)",
+            custom_id='user',
             placeholder="@username or user ID",
             required=True
         )
@@ -346,576 +1156,715 @@ class EndShiftModal(discord.ui.Modal):
         self.add_item(self.user_input)
 
     async def on_submit(self, interaction: discord.Interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        try:
-            # Parse user
-            user_str = self.user_input.value.strip()
-            if user_str.startswith('<@') and user_str.endswith('>'):
-                user_id = int(user_str[2:-1].replace('!', ''))
-            else:
-                user_id = int(user_str)
-            
-            user = interaction.guild.get_member(user_id)
-            if not user:
-                await interaction.response.send_message("User not found.", ephemeral=True)
-                return
-            
-            # Store username for leaderboard
-            guild_id = str(interaction.guild.id)
-            user_id_str = str(user_id)
-            if guild_id not in bot_data.setdefault('usernames', {}):
-                bot_data['usernames'][guild_id] = {}
-            bot_data['usernames'][guild_id][user_id_str] = user.display_name
-            
-            if guild_id in bot_data['shifts'] and user_id_str in bot_data['shifts'][guild_id]:
-                shift_data = bot_data['shifts'][guild_id][user_id_str]
-                start_time = datetime.fromisoformat(shift_data['start_time'])
-                end_time = datetime.now()
-                duration = int((end_time - start_time).total_seconds() / 60)
-                
-                # Add to total time
-                if guild_id not in bot_data['shift_totals']:
-                    bot_data['shift_totals'][guild_id] = {}
-                if user_id_str not in bot_data['shift_totals'][guild_id]:
-                    bot_data['shift_totals'][guild_id][user_id_str] = 0
-                
-                bot_data['shift_totals'][guild_id][user_id_str] += duration
-                
-                # Remove from active shifts
-                del bot_data['shifts'][guild_id][user_id_str]
-                save_data(bot_data)
-                
-                await interaction.response.send_message(f"Ended {user.display_name}'s shift. Duration: {duration} minutes.", ephemeral=True)
-            else:
-                await interaction.response.send_message(f"{user.display_name} doesn't have an active shift.", ephemeral=True)
-            
-        except ValueError:
-            await interaction.response.send_message("Invalid input. Please check your values.", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
+        await extension('shifts').end_user_shift(interaction, self.user_input.value)
 
 async def generate_leaderboard_embed(guild):
-    global bot_data
-    guild_id = str(guild.id)
+    """The guild's leaderboard, from the render cache when nothing has changed"""
+    return await cached_render(guild, 'leaderboard', extension('leaderboard').render_leaderboard_embed, lambda: time.time() + RENDER_CACHE_SECONDS)
+
+async def post_leaderboard(guild, channel):
+    """Edit the leaderboard message in channel, or post one if there isn't one yet.
     
-    if guild_id not in bot_data['shift_totals']:
-        bot_data['shift_totals'][guild_id] = {}
+    Returns True if an existing message was updated.
+    """
+    leaderboard_embed = await generate_leaderboard_embed(guild)
     
-    # Sort users by total time
-    user_times = bot_data['shift_totals'][guild_id]
-    sorted_users = sorted(user_times.items(), key=lambda x: x[1], reverse=True)
+    async for message in channel.history(limit=10):
+        if (message.author == bot.user and message.embeds and 
+            message.embeds[0].title and "Shift Time Leaderboard" in message.embeds[0].title):
+            await message.edit(embed=leaderboard_embed)
+            return True
     
-    embed = discord.Embed(
-        title="📊 Shift Time Leaderboard",
-        color=discord.Color.gold(),
-        timestamp=datetime.now()
-    )
+    await channel.send(embed=leaderboard_embed)
+    return False
+
+async def refresh_leaderboard(guild):
+    """Update the guild's leaderboard channel if one is configured"""
+    config = bot_data['config'].get(str(guild.id), {})
+    channel = bot.get_channel(config.get('leaderboard_channel'))
+    if isinstance(channel, discord.TextChannel):
+        await post_leaderboard(guild, channel)
+
+class GlobalLeaderboard:
+    """Shift totals summed across every guild that opted in, kept ranked.
     
-    if not sorted_users:
-        embed.description = "No shift data available yet."
-        return embed
+    Each guild's totals are merged in as partial sums and only merged again
+    after that guild changes, so a request touches just the guilds that changed
+    since the last one. The ranking stays sorted, so the top is a slice and a
+    user's rank is a bisect.
+    """
     
-    leaderboard_text = ""
-    for i, (user_id, total_minutes) in enumerate(sorted_users[:10]):
-        user = guild.get_member(int(user_id))
-        
-        # Try to get username from stored usernames first, then current member, then fallback
-        stored_usernames = bot_data.get('usernames', {}).get(guild_id, {})
-        if user:
-            username = user.display_name
-            # Update stored username if member is found
-            if guild_id not in bot_data.setdefault('usernames', {}):
-                bot_data['usernames'][guild_id] = {}
-            bot_data['usernames'][guild_id][user_id] = username
-            save_data(bot_data)
-        elif user_id in stored_usernames:
-            username = stored_usernames[user_id]
-        else:
-            username = f"User {user_id}"
-        
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-        
-        if i == 0:
-            emoji = "🥇"
-        elif i == 1:
-            emoji = "🥈"
-        elif i == 2:
-            emoji = "🥉"
+    def __init__(self):
+        # {guild_id: {user_id: minutes}} as last merged in
+        self.merged = {}
+        # {user_id: minutes across the participating guilds}
+        self.totals = {}
+        # (-minutes, user_id) for everyone with time, best first
+        self.ranking = []
+        # Guilds whose totals or participation changed since the last merge
+        self.stale = set()
+        self.loaded = False
+    
+    def refresh(self):
+        """Merge in the guilds that changed since the last refresh"""
+        if not self.loaded:
+            self.stale.update(bot_data['config'])
+            self.loaded = True
+        while self.stale:
+            guild_id = self.stale.pop()
+            current = {}
+            if bot_data['config'].get(guild_id, {}).get('global_leaderboard'):
+                current = dict(bot_data['shift_totals'].get(guild_id, {}))
+            previous = self.merged.pop(guild_id, {})
+            for user_id in set(previous) | set(current):
+                delta = current.get(user_id, 0) - previous.get(user_id, 0)
+                if delta:
+                    self.adjust(user_id, delta)
+            if current:
+                self.merged[guild_id] = current
+    
+    def adjust(self, user_id, delta):
+        """Move a user's global total by delta minutes"""
+        old = self.totals.get(user_id, 0)
+        new = old + delta
+        if old:
+            del self.ranking[bisect.bisect_left(self.ranking, (-old, user_id))]
+        if new > 0:
+            self.totals[user_id] = new
+            bisect.insort(self.ranking, (-new, user_id))
         else:
-            emoji = f"{i+1}."
-        
-        leaderboard_text += f"{emoji} **{username}** - {hours}h {minutes}m\n"
-    
-    embed.description = leaderboard_text
-    embed.set_footer(text="ATC24 PTFS Ground Crew")
-    
-    return embed
+            self.totals.pop(user_id, None)
+    
+    def top(self, count=10):
+        """The count best (user_id, minutes)"""
+        self.refresh()
+        return [(user_id, -minutes) for minutes, user_id in self.ranking[:count]]
+    
+    def rank(self, user_id):
+        """A user's (rank, minutes), or None if they have no time counted"""
+        self.refresh()
+        user_id = str(user_id)
+        minutes = self.totals.get(user_id)
+        if not minutes:
+            return None
+        return bisect.bisect_left(self.ranking, (-minutes, user_id)) + 1, minutes
 
-@tasks.loop(minutes=1)
-async def update_all_status_boards():
-    """Update all status boards every minute"""
-    global bot_data
-    for guild_id, config in bot_data.get('config', {}).items():
-        if config.get('status_board_channel'):
-            guild = bot.get_guild(int(guild_id))
-            if guild:
-                await update_status_board_for_guild(guild)
+global_ranking = GlobalLeaderboard()
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user} has logged in!')
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
-    
-    # Register persistent views for button persistence across restarts
-    # This allows buttons to work even after bot restarts
-    for operation_id in bot_data.get('active_operations', {}).keys():
-        view = AttendButton(operation_id)
-        bot.add_view(view)
-    
-    # Start the status board update loop
-    if not update_all_status_boards.is_running():
-        update_all_status_boards.start()
-        print("Started status board update loop")
+def on_config_stored(section, key):
+    """Pick up a guild joining or leaving the global leaderboard elsewhere"""
+    if section == 'config':
+        global_ranking.stale.add(key)
 
-@bot.event
-async def on_member_join(member):
-    """Welcome new members to the server"""
-    global bot_data
-    config = bot_data['config'].get(str(member.guild.id), {})
-    welcome_channel_id = config.get('welcome_channel')
-    
-    if not welcome_channel_id:
+if data_store:
+    data_store.listeners.append(on_config_stored)
+
+def global_display_name(user_id):
+    """A user's name for the global leaderboard, without touching the API"""
+    user = bot.get_user(int(user_id))
+    if user:
+        return user.display_name
+    for guild_id in global_ranking.merged:
+        name = bot_data.get('usernames', {}).get(guild_id, {}).get(user_id)
+        if name:
+            return name
+    return f"User {user_id}"
+
+# Boards only change while someone is on shift, so only those guilds get timed
+# refreshes: once a shown duration has actually changed, and at most every
+# BOT_STATUS_BOARD_SECONDS. Idle boards are updated when someone clocks in or out.
+STATUS_BOARD_SECONDS = float(os.getenv('BOT_STATUS_BOARD_SECONDS', '60'))
+
+# {guild_id: time.time() its board is next due}, for guilds with people on shift
+status_board_due = {}
+
+# {guild_id: time.time() of the loop tick that queued its timed refresh}
+status_board_ticks = {}
+
+# {guild_id: last board content sent}, so an unchanged board isn't sent again
+status_board_renders = {}
+
+# Status board counters, shown in /diagnostics
+status_board_stats = {'sent': 0, 'unchanged': 0}
+
+def board_duration_step(minutes):
+    """How many minutes a shift duration is rounded to on the board"""
+    if minutes < 60:
+        return 1
+    if minutes < 240:
+        return 5
+    return 15
+
+def next_status_board_change(shifts, now):
+    """When any duration shown on a board next changes"""
+    changes = []
+    for shift_data in shifts.values():
+        start_time = datetime.fromisoformat(shift_data['start_time'])
+        minutes = int((now - start_time).total_seconds() / 60)
+        step = board_duration_step(minutes)
+        changes.append(start_time + timedelta(minutes=minutes - minutes % step + step))
+        if shift_data.get('on_break') and shift_data.get('break_start'):
+            break_start = datetime.fromisoformat(shift_data['break_start'])
+            changes.append(break_start + timedelta(minutes=int((now - break_start).total_seconds() / 60) + 1))
+    return min(changes, default=None)
+
+def plan_status_board(guild_id, since=None):
+    """Work out when a guild's board next needs a timed refresh, if ever.
+    
+    since is when the refresh being made was due to start, so queueing delays
+    don't push the next one past the loop tick that should pick it up.
+    """
+    guild_id = str(guild_id)
+    shifts = bot_data['shifts'].get(guild_id)
+    if not shifts or not bot_data['config'].get(guild_id, {}).get('status_board_channel'):
+        status_board_due.pop(guild_id, None)
         return
-    
-    channel = bot.get_channel(welcome_channel_id)
-    if not isinstance(channel, discord.TextChannel):
+    change = next_status_board_change(shifts, datetime.now())
+    status_board_due[guild_id] = max(change.timestamp(), (since or time.time()) + STATUS_BOARD_SECONDS)
+
+def queue_active_status_boards():
+    """Put every board with people on shift back on its timer, e.g. after a restart.
+    
+    Boards were brought up to date before the last shutdown, so none is
+    refreshed before something on it changes.
+    """
+    for guild_id, shifts in bot_data['shifts'].items():
+        if shifts:
+            plan_status_board(guild_id)
+
+def on_shifts_changed_elsewhere(section, key):
+    """Start timed refreshes for a board whose shifts another process changed"""
+    if section == 'shifts' and bot_data['shifts'].get(key):
+        status_board_due.setdefault(key, 0)
+
+if data_store:
+    data_store.listeners.append(on_shifts_changed_elsewhere)
+
+# Per-shard status board loops, keyed by shard ID
+status_board_loops = {}
+
+# Shard health for /diagnostics, keyed by shard ID
+shard_health = {}
+
+def mark_shard(shard_id, state):
+    """Record a shard's connection state"""
+    shard_health[shard_id] = {'state': state, 'since': datetime.now()}
+
+async def update_status_boards_for_shard(shard_id):
+    """Update the due status boards of the guilds served by one shard"""
+    if shard_health.get(shard_id, {}).get('state') != 'ready':
         return
-    
-    embed = discord.Embed(
-        title="🎉 Welcome to ATC24 PTFS Ground Crew!",
-        description=f"Welcome {member.mention}! We're excited to have you join our ground crew team.",
-        color=discord.Color.green(),
-        timestamp=datetime.now()
-    )
-    
-    embed.add_field(
-        name="📚 Getting Started",
-        value="Use `/links` to access the Ground Crew Guide and important resources.",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="⏰ Shift Management",
-        value="Use `/shift` to start working and track your hours.",
-        inline=False
-    )
-    
-    embed.set_thumbnail(url=member.display_avatar.url)
-    embed.set_footer(text="ATC24 PTFS Ground Crew")
-    
-    await channel.send(embed=embed)
+    now = time.time()
+    for guild_id, due in list(status_board_due.items()):
+        # The loop can wake a hair before a due time set from the last tick
+        if due > now + 0.1:
+            continue
+        guild = bot.get_guild(int(guild_id))
+        if guild is None:
+            # Served by another process
+            status_board_due.pop(guild_id, None)
+        elif guild.shard_id == shard_id:
+            status_board_ticks[guild_id] = now
+            schedule_status_board_update(guild, 'maintenance')
 
-# Admin check decorator - using built-in has_permissions
-# This replaces the custom is_admin check to avoid type issues
+def start_status_board_loop(shard_id):
+    """Start the status board loop for a shard if it isn't running yet"""
+    loop = status_board_loops.get(shard_id)
+    if loop is None:
+        loop = tasks.loop(seconds=STATUS_BOARD_SECONDS)(update_status_boards_for_shard)
+        status_board_loops[shard_id] = loop
+    if not loop.is_running():
+        loop.start(shard_id)
+        print(f"Started status board update loop for shard {shard_id}")
 
-@bot.tree.command(name="setup", description="Configure bot settings (Admin only)")
-@app_commands.checks.has_permissions(administrator=True)
-@app_commands.guild_only()
-@app_commands.describe(
-    operation_role="Role to ping for operations",
-    operation_channel="Channel for operation announcements",
-    leaderboard_channel="Channel for leaderboard updates",
-    status_board_channel="Channel for live status board",
-    welcome_channel="Channel for welcome messages"
-)
-async def setup(
-    interaction: discord.Interaction, 
-    operation_role: discord.Role, 
-    operation_channel: discord.TextChannel, 
-    leaderboard_channel: discord.TextChannel,
-    status_board_channel: Optional[discord.TextChannel] = None,
-    welcome_channel: Optional[discord.TextChannel] = None
-):
+@tasks.loop(seconds=30)
+async def flush_dirty_data():
+    """Persist non-urgent changes batched up since the last save"""
     global bot_data
-    
-    # Guild is guaranteed to exist due to @app_commands.guild_only()
-    assert interaction.guild is not None
-    guild_id = str(interaction.guild.id)
-    
-    if guild_id not in bot_data['config']:
-        bot_data['config'][guild_id] = {}
-    
-    config_updates = {
-        'operation_role_id': operation_role.id,
-        'operation_channel_id': operation_channel.id,
-        'leaderboard_channel': leaderboard_channel.id
-    }
-    
-    if status_board_channel:
-        config_updates['status_board_channel'] = status_board_channel.id
-    
-    if welcome_channel:
-        config_updates['welcome_channel'] = welcome_channel.id
-    
-    bot_data['config'][guild_id].update(config_updates)
-    
-    save_data(bot_data)
-    
-    description = f"**Operation Role:** {operation_role.mention}\n**Operation Channel:** {operation_channel.mention}\n**Leaderboard Channel:** {leaderboard_channel.mention}"
-    
-    if status_board_channel:
-        description += f"\n**Status Board Channel:** {status_board_channel.mention}"
-    
-    if welcome_channel:
-        description += f"\n**Welcome Channel:** {welcome_channel.mention}"
-    
-    embed = discord.Embed(
-        title="✅ Setup Complete",
-        description=description,
-        color=discord.Color.green()
-    )
-    
-    # Post initial status board if configured
-    if status_board_channel:
-        status_embed = await generate_status_board_embed(interaction.guild)
-        message = await status_board_channel.send(embed=status_embed)
-        # Store message ID for future updates
-        bot_data['config'][guild_id]['status_board_message_id'] = message.id
+    if data_dirty:
         save_data(bot_data)
-    
-    await interaction.response.send_message(embed=embed, ephemeral=True)
 
-@bot.tree.command(name="operation-start", description="Start a new operation (Admin only)")
-@app_commands.checks.has_permissions(administrator=True)
-@app_commands.guild_only()
-@app_commands.describe(
-    airport="Airport code", 
-    time="Operation time", 
-    date="Operation date",
-    description="Optional description or notes about the operation",
-    max_attendees="Maximum number of attendees (leave blank for unlimited)",
-    operation_type="Type of operation (e.g., Training, Event, Regular)"
-)
-async def operation_start(
-    interaction: discord.Interaction, 
-    airport: str, 
-    time: str, 
-    date: str,
-    description: Optional[str] = None,
-    max_attendees: Optional[int] = None,
-    operation_type: Optional[str] = None
-):
-    # Validate max_attendees
-    if max_attendees is not None and max_attendees < 1:
-        await interaction.response.send_message("Max attendees must be at least 1.", ephemeral=True)
+@tasks.loop(seconds=FSYNC_SECONDS)
+async def sync_data_periodically():
+    """fsync the data file for "periodic" durability"""
+    sync_data_file()
+
+@tasks.loop(minutes=SNAPSHOT_MINUTES or 60)
+async def snapshot_data():
+    """Write a compressed snapshot of bot_data, starting with one at startup"""
+    # Serialize here so the data can't change underneath; compress and write in a thread
+    body = json.dumps(bot_data, separators=(',', ':'), default=str).encode()
+    started = time.perf_counter()
+    try:
+        size = await asyncio.to_thread(write_snapshot, body)
+    except OSError as e:
+        snapshot_stats['failures'] += 1
+        print(f"Failed to write a snapshot: {e}")
         return
+    snapshot_stats['snapshots'] += 1
+    snapshot_stats['seconds'] += time.perf_counter() - started
+    snapshot_stats['last_bytes'] = size
+    snapshot_stats['last_raw_bytes'] = len(body)
+
+def start_persistence_loops():
+    """Start the loops that flush, fsync and snapshot bot_data"""
+    if not flush_dirty_data.is_running():
+        flush_dirty_data.start()
+    if not data_store and DURABILITY == 'periodic' and not sync_data_periodically.is_running():
+        sync_data_periodically.start()
+    if SNAPSHOT_MINUTES > 0 and not snapshot_data.is_running():
+        snapshot_data.start()
+
+@tasks.loop(seconds=STORE_POLL_SECONDS)
+async def refresh_shared_data():
+    """Pick up writes other bot processes made to the shared store"""
     global bot_data
+    changed = data_store.refresh(bot_data)
+    if changed:
+        print(f"Reloaded {len(changed)} record(s) written by another process")
+
+def register_persistent_views():
+    """Register views whose buttons must work after a restart or on another worker"""
+    # Attend buttons for every operation, past and future
+    bot.add_dynamic_items(AttendAction)
+    
+    # The /shift and /shift-manage menus, for messages sent before a restart
+    # or by another HTTP worker
+    for view_class in (ShiftManagementView, ShiftManageView):
+        view = view_class()
+        view.timeout = None
+        bot.add_view(view)
+
+def shard_latencies():
+    """Return {shard_id: latency in seconds} for every shard this process runs"""
+    if SHARDED:
+        return dict(bot.latencies)
+    return {0: bot.latency}
+
+@bot.event
+async def on_ready():
+    print(f'{bot.user} has logged in!')
+    # In multi-process deployments only the process running shard 0 syncs commands
+    if not SHARD_IDS or 0 in SHARD_IDS:
+        try:
+            synced = await bot.tree.sync()
+            print(f"Synced {len(synced)} command(s)")
+        except Exception as e:
+            print(f"Failed to sync commands: {e}")
     
-    # Guild is guaranteed to exist due to @app_commands.guild_only()
-    assert interaction.guild is not None
-    guild_id = str(interaction.guild.id)
-    config = bot_data['config'].get(guild_id, {})
-    
-    if not config.get('operation_role_id') or not config.get('operation_channel_id'):
-        await interaction.response.send_message("Please run /setup first to configure the bot.", ephemeral=True)
-        return
-    
-    # Check if there's already an active operation for this guild
-    if any(op_id.startswith(f"{guild_id}_") for op_id in bot_data['active_operations']):
-        await interaction.response.send_message("There is already an active operation. Please stop it first with /operation-stop.", ephemeral=True)
-        return
+    register_persistent_views()
+    schedule_all_operation_timers()
+    schedule_all_shift_expiries()
+    queue_active_status_boards()
+    await restore_pending_work()
     
-    # Create operation data
-    operation_id = f"{guild_id}_{datetime.now().timestamp()}"
-    operation_data = {
-        'airport': airport,
-        'time': time,
-        'date': date,
-        'description': description,
-        'max_attendees': max_attendees,
-        'operation_type': operation_type,
-        'started_by': interaction.user.id,
-        'started_at': datetime.now().isoformat(),
-        'attendees': {}
-    }
+    start_persistence_loops()
     
-    bot_data['active_operations'][operation_id] = operation_data
-    save_data(bot_data)
+    if data_store and not refresh_shared_data.is_running():
+        refresh_shared_data.start()
     
-    # Create embed with additional info
-    embed_description = f"**Airport:** {airport}\n**Time:** {time}\n**Date:** {date}"
-    
-    if operation_type:
-        embed_description += f"\n**Type:** {operation_type}"
-    if description:
-        embed_description += f"\n**Description:** {description}"
-    if max_attendees:
-        embed_description += f"\n**Max Attendees:** {max_attendees}"
-    
-    embed = discord.Embed(
-        title="📢 OPERATION ACTIVE",
-        description=embed_description,
-        color=discord.Color.green(),
-        timestamp=datetime.now()
-    )
-    embed.add_field(name="Attendees (0)", value="No attendees yet", inline=False)
-    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    if not MEMBER_CACHE and not resolve_pending_usernames.is_running():
+        resolve_pending_usernames.start()
     
-    # Get role and channel
-    role = interaction.guild.get_role(config['operation_role_id'])
-    channel = interaction.guild.get_channel(config['operation_channel_id'])
+    # Sharded bots start their loops from on_shard_ready instead
+    if not SHARDED:
+        mark_shard(0, 'ready')
+        start_status_board_loop(0)
+
+@bot.event
+async def on_resumed():
+    if not SHARDED:
+        mark_shard(0, 'ready')
+
+@bot.event
+async def on_disconnect():
+    if not SHARDED:
+        mark_shard(0, 'disconnected')
+
+@bot.event
+async def on_shard_ready(shard_id):
+    print(f"Shard {shard_id} is ready")
+    mark_shard(shard_id, 'ready')
+    start_status_board_loop(shard_id)
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    mark_shard(shard_id, 'ready')
+
+@bot.event
+async def on_shard_connect(shard_id):
+    mark_shard(shard_id, 'connecting')
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    mark_shard(shard_id, 'disconnected')
+
+# Join surges - the first member to join a quiet guild is welcomed right away,
+# and anyone joining in the next BOT_WELCOME_BATCH_SECONDS is welcomed together
+# in one message when the window closes (or once BOT_WELCOME_BATCH_MAX are
+# waiting). Windows keep rolling while people keep joining.
+WELCOME_BATCH_SECONDS = float(os.getenv('BOT_WELCOME_BATCH_SECONDS', '10'))
+WELCOME_BATCH_MAX = int(os.getenv('BOT_WELCOME_BATCH_MAX', '50'))
+
+# Room left in an embed description for the mentions of one batch
+WELCOME_MENTIONS_LENGTH = 3800
+
+# {guild_id: mentions waiting for the batch welcome}, for guilds in a window
+welcome_buffers = {}
+
+# Welcome counters, shown in /diagnostics
+welcome_stats = {'joins': 0, 'sends': 0}
+
+def welcome_channel_for(guild_id):
+    """The guild's welcome channel, if it has a usable one"""
+    config = bot_data['config'].get(str(guild_id), {})
+    channel = bot.get_channel(config.get('welcome_channel'))
+    return channel if isinstance(channel, discord.TextChannel) else None
+
+def send_welcome(channel, embed):
+    """Queue one welcome message"""
+    welcome_stats['sends'] += 1
+    # Nobody is waiting on a welcome, so it goes out with the background work
+    rest_scheduler.submit('maintenance', lambda: channel.send(embed=embed), resume=['message', channel.id, None, embed.to_dict()], bucket=channel.guild.id)
+
+def flush_welcomes(guild_id):
+    """Send the waiting batch of welcomes, split to fit message limits"""
+    mentions = welcome_buffers.get(guild_id)
+    if not mentions:
+        return
+    welcome_buffers[guild_id] = []
+    channel = welcome_channel_for(guild_id)
+    if channel is None:
+        return
+    chunk, length = [], 0
+    for mention in mentions:
+        if chunk and length + len(mention) + 2 > WELCOME_MENTIONS_LENGTH:
+            send_welcome(channel, extension('welcome').welcome_embed(chunk))
+            chunk, length = [], 0
+        chunk.append(mention)
+        length += len(mention) + 2
+    send_welcome(channel, extension('welcome').welcome_embed(chunk))
+
+async def close_welcome_window(guild_id):
+    """End a guild's join window, starting another if anyone joined during it"""
+    if welcome_buffers.get(guild_id):
+        flush_welcomes(guild_id)
+        open_welcome_window(guild_id)
+    else:
+        welcome_buffers.pop(guild_id, None)
+
+def open_welcome_window(guild_id):
+    """Hold the guild's joins for a batch welcome until the window closes"""
+    welcome_buffers[guild_id] = []
+    closes_at = datetime.now(timezone.utc) + timedelta(seconds=WELCOME_BATCH_SECONDS)
+    timers.schedule(closes_at, ('welcome_window', guild_id), lambda: close_welcome_window(guild_id))
+
+@bot.event
+async def on_member_join(member):
+    """Welcome new members to the server"""
+    if not WELCOME_MESSAGES:
+        return
+    guild_id = member.guild.id
+    channel = welcome_channel_for(guild_id)
+    if channel is None:
+        return
+    welcome_stats['joins'] += 1
     
-    if not role:
-        await interaction.response.send_message("Operation role not found. Please run /setup again.", ephemeral=True)
+    if guild_id in welcome_buffers:
+        # Part of a surge - welcome them with the rest of the batch
+        welcome_buffers[guild_id].append(member.mention)
+        if len(welcome_buffers[guild_id]) >= WELCOME_BATCH_MAX:
+            flush_welcomes(guild_id)
         return
     
-    if not isinstance(channel, discord.TextChannel):
-        await interaction.response.send_message("Operation channel not found or is not a text channel. Please run /setup again.", ephemeral=True)
+    embed = extension('welcome').welcome_embed([member.mention])
+    embed.set_thumbnail(url=member.display_avatar.url)
+    send_welcome(channel, embed)
+    open_welcome_window(guild_id)
+
+# Operation scheduling - /operation-start's free-text time and date are parsed
+# into an aware start time where possible. Role-ping reminders go out
+# BOT_REMINDER_MINUTES before the start (0 means "starting now"), and an
+# operation started with a duration stops itself when that runs out. Times with
+# no timezone are read in BOT_TIMEZONE.
+REMINDER_MINUTES = sorted({int(m) for m in os.getenv('BOT_REMINDER_MINUTES', '60,15,0').split(',') if m.strip()}, reverse=True)
+DEFAULT_TIMEZONE = os.getenv('BOT_TIMEZONE', 'UTC')
+
+# Reminders that were due more than this long ago (say, while the bot was
+# offline) are skipped rather than sent late
+REMINDER_GRACE = timedelta(minutes=5)
+
+TIMEZONE_ALIASES = {
+    'UTC': 'UTC', 'GMT': 'UTC', 'Z': 'UTC', 'ZULU': 'UTC',
+    'EST': 'America/New_York', 'EDT': 'America/New_York', 'ET': 'America/New_York',
+    'CST': 'America/Chicago', 'CDT': 'America/Chicago', 'CT': 'America/Chicago',
+    'MST': 'America/Denver', 'MDT': 'America/Denver', 'MT': 'America/Denver',
+    'PST': 'America/Los_Angeles', 'PDT': 'America/Los_Angeles', 'PT': 'America/Los_Angeles',
+    'BST': 'Europe/London', 'UK': 'Europe/London',
+    'CET': 'Europe/Paris', 'CEST': 'Europe/Paris',
+    'AEST': 'Australia/Sydney', 'AEDT': 'Australia/Sydney',
+}
+
+MONTHS = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1)}
+
+def parse_timezone(text):
+    """Return the tzinfo for an abbreviation, UTC offset or IANA name, or None"""
+    text = text.strip()
+    if not text:
+        return ZoneInfo(DEFAULT_TIMEZONE)
+    if text.upper() in TIMEZONE_ALIASES:
+        return ZoneInfo(TIMEZONE_ALIASES[text.upper()])
+    offset = re.fullmatch(r'(?:UTC|GMT)\s*([+-])(\d{1,2})(?::?(\d{2}))?', text, re.I)
+    if offset:
+        sign = 1 if offset.group(1) == '+' else -1
+        hours, minutes = int(offset.group(2)), int(offset.group(3) or 0)
+        # Real offsets run from -12:00 to +14:00
+        if hours > 14 or minutes > 59:
+            return None
+        return timezone(sign * timedelta(hours=hours, minutes=minutes))
+    try:
+        return ZoneInfo(text)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+def parse_operation_time(text):
+    """Parse "12:30 PM EST", "14:00", "2pm ET" or "1830z" into (hour, minute, tzinfo)"""
+    match = re.fullmatch(r'\s*(\d{1,2})(?::?(\d{2}))?\s*([ap])?\.?\s*(?:m\.?)?\s*(.*?)\s*', text, re.I)
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    meridiem = (match.group(3) or '').lower()
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == 'p' else 0)
+    zone = parse_timezone(match.group(4))
+    if zone is None or hour > 23 or minute > 59:
+        return None
+    return hour, minute, zone
+
+def parse_operation_date(text, today):
+    """Parse "12/25", "12/25/2026", "2026-12-25", "Dec 25", "today" or "tomorrow".
+    
+    Returns (year or None, month, day); a missing year is filled in by the caller.
+    """
+    text = text.strip().lower()
+    if text in ('today', 'tonight'):
+        return today.year, today.month, today.day
+    if text == 'tomorrow':
+        tomorrow = today + timedelta(days=1)
+        return tomorrow.year, tomorrow.month, tomorrow.day
+    match = re.fullmatch(r'(\d{4})-(\d{1,2})-(\d{1,2})', text)
+    if match:
+        return int(match.group(1)), int(match.group(2)), int(match.group(3))
+    match = re.fullmatch(r'(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2}|\d{4}))?', text)
+    if match:
+        year = match.group(3)
+        if year and len(year) == 2:
+            year = '20' + year
+        return int(year) if year else None, int(match.group(1)), int(match.group(2))
+    match = re.fullmatch(r'([a-z]{3})[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?(?:\s+(\d{4}))?', text)
+    if match and match.group(1) in MONTHS:
+        return int(match.group(3)) if match.group(3) else None, MONTHS[match.group(1)], int(match.group(2))
+    match = re.fullmatch(r'(\d{1,2})(?:st|nd|rd|th)?\s+([a-z]{3})[a-z]*\.?,?(?:\s+(\d{4}))?', text)
+    if match and match.group(2) in MONTHS:
+        return int(match.group(3)) if match.group(3) else None, MONTHS[match.group(2)], int(match.group(1))
+    return None
+
+def parse_operation_start(time_text, date_text, now=None):
+    """Work out when an operation starts from its free-text time and date.
+    
+    Returns an aware datetime, or None if either can't be read. A date without
+    a year means its next occurrence.
+    """
+    parsed_time = parse_operation_time(time_text)
+    if parsed_time is None:
+        return None
+    hour, minute, zone = parsed_time
+    now = now or datetime.now(timezone.utc)
+    parsed_date = parse_operation_date(date_text, now.astimezone(zone).date())
+    if parsed_date is None:
+        return None
+    year, month, day = parsed_date
+    try:
+        starts_at = datetime(year or now.year, month, day, hour, minute, tzinfo=zone)
+        # "12/25" typed on December 26th means next year's
+        if year is None and starts_at < now - timedelta(days=1):
+            starts_at = starts_at.replace(year=starts_at.year + 1)
+    except ValueError:
+        return None
+    return starts_at
+
+def schedule_operation_timers(operation_id):
+    """Queue the reminders and auto-stop still due for an operation"""
+    # Gateway processes run the timers, picking up operations that HTTP
+    # workers start through the shared store
+    if HTTP_INTERACTIONS:
+        return
+    operation_data = bot_data['active_operations'].get(operation_id)
+    if not operation_data or not operation_data.get('starts_at'):
         return
+    starts_at = datetime.fromisoformat(operation_data['starts_at'])
+    now = datetime.now(timezone.utc)
+    for minutes in REMINDER_MINUTES:
+        due = starts_at - timedelta(minutes=minutes)
+        if minutes in operation_data.get('reminders_sent', []) or due < now - REMINDER_GRACE:
+            continue
+        timers.schedule(due, ('reminder', operation_id, minutes), lambda minutes=minutes: send_operation_reminder(operation_id, minutes))
+    if operation_data.get('auto_stop_at'):
+        auto_stop_at = datetime.fromisoformat(operation_data['auto_stop_at'])
+        timers.schedule(auto_stop_at, ('auto_stop', operation_id), lambda: auto_stop_operation(operation_id))
+
+def schedule_all_operation_timers():
+    """Rebuild the timers for every active operation, e.g. after a restart"""
+    for operation_id in list(bot_data['active_operations']):
+        schedule_operation_timers(operation_id)
+
+def on_operation_stored(section, key):
+    """Schedule timers for operations another process started"""
+    if section == 'active_operations':
+        schedule_operation_timers(key)
+
+if data_store:
+    data_store.listeners.append(on_operation_stored)
+
+def operation_guild(operation_id):
+    """The guild an operation belongs to, if this process serves it"""
+    return bot.get_guild(int(operation_id.split('_', 1)[0]))
+
+async def send_operation_reminder(operation_id, minutes):
+    """Ping the operation role that an operation is starting soon"""
+    guild = operation_guild(operation_id)
+    if guild is None:
+        return
+    guild_id = str(guild.id)
+    async with guild_lock(guild_id):
+        operation_data = bot_data['active_operations'].get(operation_id)
+        if operation_data is None or minutes in operation_data.setdefault('reminders_sent', []):
+            return
+        operation_data['reminders_sent'].append(minutes)
+        save_data(bot_data)
     
-    # Send message with button
-    view = AttendButton(operation_id)
-    # Register the view for persistence
-    bot.add_view(view)
-    message = await channel.send(content=f"{role.mention} New operation starting!", embed=embed, view=view)
+    config = bot_data['config'].get(guild_id, {})
+    role = guild.get_role(config.get('operation_role_id'))
+    channel = guild.get_channel(config.get('operation_channel_id'))
+    if role is None or not isinstance(channel, discord.TextChannel):
+        return
     
-    await interaction.response.send_message(f"Operation started successfully in {channel.mention}!", ephemeral=True)
+    content = extension('operations').reminder_content(role, operation_data, minutes)
+    rest_scheduler.submit('user_edit', lambda: channel.send(content), resume=['message', channel.id, content, None], bucket=guild.id)
 
-@bot.tree.command(name="operation-stop", description="Stop the current operation (Admin only)")
-@app_commands.checks.has_permissions(administrator=True)
-@app_commands.guild_only()
-async def operation_stop(interaction: discord.Interaction):
-    global bot_data
+async def auto_stop_operation(operation_id):
+    """Stop an operation whose duration has run out"""
+    guild = operation_guild(operation_id)
+    if guild is not None and operation_id in bot_data['active_operations']:
+        await stop_operations(guild, [operation_id])
+        print(f"Auto-stopped operation {operation_id}")
+
+async def stop_operations(guild, operation_ids=None):
+    """Stop some or (by default) all of a guild's operations.
     
-    # Guild is guaranteed to exist due to @app_commands.guild_only()
-    assert interaction.guild is not None
-    guild_id = str(interaction.guild.id)
-    config = bot_data['config'].get(guild_id, {})
+    Removes them, then queues the end notice and the operation role deletions.
+    Returns the data of the operations that were stopped.
+    """
+    global bot_data
+    guild_id = str(guild.id)
+    async with guild_lock(guild_id):
+        if operation_ids is None:
+            operation_ids = [op_id for op_id in bot_data['active_operations'].keys() if op_id.startswith(f"{guild_id}_")]
+        operation_ids = [op_id for op_id in operation_ids if op_id in bot_data['active_operations']]
+        
+        # Remove operations from active operations
+        stopped_operations = [bot_data['active_operations'].pop(op_id) for op_id in operation_ids]
+        if stopped_operations:
+            save_data(bot_data)
     
-    # Find and stop all active operations for this guild
-    operations_to_stop = [op_id for op_id in bot_data['active_operations'].keys() if op_id.startswith(f"{guild_id}_")]
+    if not stopped_operations:
+        return []
     
-    if not operations_to_stop:
-        await interaction.response.send_message("No active operation found.", ephemeral=True)
-        return
+    # Send end message
+    config = bot_data['config'].get(guild_id, {})
+    channel = guild.get_channel(config.get('operation_channel_id'))
+    if isinstance(channel, discord.TextChannel):
+        embed = extension('operations').operation_ended_embed()
+        rest_scheduler.submit('user_edit', lambda: channel.send(embed=embed), resume=['message', channel.id, None, embed.to_dict()], bucket=guild.id)
     
-    # Stop all operations and clean up roles
-    for operation_id in operations_to_stop:
-        operation_data = bot_data['active_operations'][operation_id]
+    # Clean up roles
+    for operation_id, operation_data in zip(operation_ids, stopped_operations):
+        operation_locks.pop(operation_id, None)
         
         # Delete the operation role if it exists
         role_name = f"Operation_{operation_data['date']}"
-        role = discord.utils.get(interaction.guild.roles, name=role_name)
+        role = discord.utils.get(guild.roles, name=role_name)
         if role:
-            await role.delete()
-        
-        # Remove operation from active operations
-        del bot_data['active_operations'][operation_id]
-    
-    save_data(bot_data)
-    
-    # Send end message
-    channel = interaction.guild.get_channel(config.get('operation_channel_id'))
-    if isinstance(channel, discord.TextChannel):
-        embed = discord.Embed(
-            title="🔴 OPERATION ENDED",
-            description="This operation has ended. Thank you all for attending!",
-            color=discord.Color.red(),
-            timestamp=datetime.now()
-        )
-        embed.set_footer(text="ATC24 PTFS Ground Crew")
-        await channel.send(embed=embed)
-    
-    await interaction.response.send_message("Operation stopped successfully!", ephemeral=True)
+            rest_scheduler.submit(
+                'maintenance',
+                lambda role=role: delete_operation_role(guild, role),
+                resume=['delete_role', guild.id, role.id],
+                bucket=guild.id
+            )
+    
+    return stopped_operations
+
+async def delete_operation_role(guild, role):
+    """Delete an operation's role once the operation has stopped"""
+    await role.delete()
+    # Without a gateway connection no GUILD_ROLE_DELETE drops it from the cache
+    if HTTP_INTERACTIONS:
+        guild._remove_role(role.id)
+
+def close_shift(guild_id, user_id, end_time=None):
+    """Clock a user out and add the shift to their total. Call under the guild lock.
+    
+    A break still running at end_time counts as break time. Returns the ended
+    shift's data and the minutes it was worth.
+    """
+    shift_data = bot_data['shifts'][guild_id].pop(user_id)
+    start_time = datetime.fromisoformat(shift_data['start_time'])
+    end_time = end_time or datetime.now()
+    
+    # Account for break time if any
+    total_break_time = shift_data.get('total_break_time', 0)
+    if shift_data.get('on_break') and shift_data.get('break_start'):
+        total_break_time += int((end_time - datetime.fromisoformat(shift_data['break_start'])).total_seconds() / 60)
+    duration_minutes = max(0, int((end_time - start_time).total_seconds() / 60) - total_break_time)
+    
+    # Add to total time
+    totals = bot_data['shift_totals'].setdefault(guild_id, {})
+    totals[user_id] = totals.get(user_id, 0) + duration_minutes
+    guild_changed(guild_id)
+    return shift_data, duration_minutes
 
-class ShiftManagementView(discord.ui.View):
+class ShiftManagementView(ShutdownCheck, discord.ui.View):
     def __init__(self):
         super().__init__(timeout=300)
 
-    @discord.ui.button(label='Start Shift', style=discord.ButtonStyle.green, emoji='🟢')
+    @discord.ui.button(label='Start Shift', style=discord.ButtonStyle.green, emoji='🟢', custom_id='shift_menu:start_shift')
     async def start_shift(self, interaction: discord.Interaction, button: discord.ui.Button):
         modal = StartShiftModal()
         await interaction.response.send_modal(modal)
 
-    @discord.ui.button(label='End Shift', style=discord.ButtonStyle.red, emoji='🔴')
+    @discord.ui.button(label='End Shift', style=discord.ButtonStyle.red, emoji='🔴', custom_id='shift_menu:end_shift')
     async def end_shift(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.handle_end_shift(interaction)
+        await extension('shifts').end_shift(interaction)
 
-    @discord.ui.button(label='Start Break', style=discord.ButtonStyle.secondary, emoji='☕')
+    @discord.ui.button(label='Start Break', style=discord.ButtonStyle.secondary, emoji='☕', custom_id='shift_menu:start_break')
     async def start_break(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.handle_start_break(interaction)
+        await extension('shifts').start_break(interaction)
 
-    @discord.ui.button(label='End Break', style=discord.ButtonStyle.primary, emoji='▶️')
+    @discord.ui.button(label='End Break', style=discord.ButtonStyle.primary, emoji='▶️', custom_id='shift_menu:end_break')
     async def end_break(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.handle_end_break(interaction)
-
-    async def handle_end_shift(self, interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        guild_id = str(interaction.guild.id)
-        user_id = str(interaction.user.id)
-        
-        # Check if user is clocked in
-        if guild_id not in bot_data['shifts'] or user_id not in bot_data['shifts'][guild_id]:
-            await interaction.response.send_message("You are not currently clocked in!", ephemeral=True)
-            return
-        
-        # Calculate shift duration
-        shift_data = bot_data['shifts'][guild_id][user_id]
-        start_time = datetime.fromisoformat(shift_data['start_time'])
-        end_time = datetime.now()
-        
-        # Account for break time if any
-        total_break_time = shift_data.get('total_break_time', 0)
-        duration = end_time - start_time
-        duration_minutes = int(duration.total_seconds() / 60) - total_break_time
-        
-        # Add to total time
-        if guild_id not in bot_data['shift_totals']:
-            bot_data['shift_totals'][guild_id] = {}
-        if user_id not in bot_data['shift_totals'][guild_id]:
-            bot_data['shift_totals'][guild_id][user_id] = 0
-        
-        bot_data['shift_totals'][guild_id][user_id] += max(0, duration_minutes)
-        
-        # Store username
-        member = interaction.user if isinstance(interaction.user, discord.Member) else interaction.guild.get_member(interaction.user.id)
-        if member:
-            if guild_id not in bot_data.setdefault('usernames', {}):
-                bot_data['usernames'][guild_id] = {}
-            bot_data['usernames'][guild_id][user_id] = member.display_name
-        
-        # Remove from active shifts
-        airport = shift_data['airport']
-        del bot_data['shifts'][guild_id][user_id]
-        save_data(bot_data)
-        
-        # Update status board
-        await update_status_board_for_guild(interaction.guild)
-        
-        # Format duration
-        hours = duration_minutes // 60
-        minutes = duration_minutes % 60
-        
-        embed = discord.Embed(
-            title="⏰ Shift Ended",
-            description=f"You have successfully ended your shift at **{airport}**\n\n**Shift Duration:** {hours}h {minutes}m",
-            color=discord.Color.red(),
-            timestamp=datetime.now()
-        )
-        embed.set_footer(text="Thanks for your service!")
-        
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-
-    async def handle_start_break(self, interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        guild_id = str(interaction.guild.id)
-        user_id = str(interaction.user.id)
-        
-        # Check if user is clocked in
-        if guild_id not in bot_data['shifts'] or user_id not in bot_data['shifts'][guild_id]:
-            await interaction.response.send_message("You need to be clocked in to take a break!", ephemeral=True)
-            return
-        
-        shift_data = bot_data['shifts'][guild_id][user_id]
-        
-        # Check if already on break
-        if shift_data.get('on_break'):
-            await interaction.response.send_message("You are already on break!", ephemeral=True)
-            return
-        
-        # Start break
-        shift_data['on_break'] = True
-        shift_data['break_start'] = datetime.now().isoformat()
-        save_data(bot_data)
-        
-        # Update status board
-        await update_status_board_for_guild(interaction.guild)
-        
-        embed = discord.Embed(
-            title="☕ Break Started",
-            description="Enjoy your break! Remember to end it when you're back.",
-            color=discord.Color.orange(),
-            timestamp=datetime.now()
-        )
-        
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-
-    async def handle_end_break(self, interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        guild_id = str(interaction.guild.id)
-        user_id = str(interaction.user.id)
-        
-        # Check if user is clocked in
-        if guild_id not in bot_data['shifts'] or user_id not in bot_data['shifts'][guild_id]:
-            await interaction.response.send_message("You need to be clocked in!", ephemeral=True)
-            return
-        
-        shift_data = bot_data['shifts'][guild_id][user_id]
-        
-        # Check if on break
-        if not shift_data.get('on_break'):
-            await interaction.response.send_message("You are not currently on break!", ephemeral=True)
-            return
-        
-        # Calculate break duration
-        break_start = datetime.fromisoformat(shift_data['break_start'])
-        break_end = datetime.now()
-        break_duration = int((break_end - break_start).total_seconds() / 60)
-        
-        # Add to total break time
-        if 'total_break_time' not in shift_data:
-            shift_data['total_break_time'] = 0
-        shift_data['total_break_time'] += break_duration
-        
-        # End break
-        shift_data['on_break'] = False
-        del shift_data['break_start']
-        save_data(bot_data)
-        
-        # Update status board
-        await update_status_board_for_guild(interaction.guild)
-        
-        embed = discord.Embed(
-            title="▶️ Break Ended",
-            description=f"Welcome back! Your break lasted {break_duration} minutes.",
-            color=discord.Color.green(),
-            timestamp=datetime.now()
-        )
-        
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await extension('shifts').end_break(interaction)
 
 
-class StartShiftModal(discord.ui.Modal):
+class StartShiftModal(ShutdownCheck, discord.ui.Modal):
     def __init__(self):
-        super().__init__(title="Start Your Shift")
+        super().__init__(title="Start Your Shift", custom_id=modal_custom_id('start_shift'))
         
         self.airport_input = discord.ui.TextInput(
             label="Airport",
+            custom_id='airport',
             placeholder="Enter airport code (e.g., KJFK, EGLL)",
             required=True,
             max_length=10
@@ -924,246 +1873,487 @@ class StartShiftModal(discord.ui.Modal):
         self.add_item(self.airport_input)
 
     async def on_submit(self, interaction: discord.Interaction):
-        global bot_data
-        
-        if interaction.guild is None:
-            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
-            return
-        
-        guild_id = str(interaction.guild.id)
-        user_id = str(interaction.user.id)
-        airport = self.airport_input.value.strip().upper()
-        
-        # Initialize data structures if needed
-        if guild_id not in bot_data['shifts']:
-            bot_data['shifts'][guild_id] = {}
-        
-        # Check if user is already clocked in
-        if user_id in bot_data['shifts'][guild_id]:
-            await interaction.response.send_message("You are already clocked in! Use 'End Shift' to finish your current shift first.", ephemeral=True)
-            return
-        
-        # Get member for display_name and store username
-        member = interaction.user if isinstance(interaction.user, discord.Member) else interaction.guild.get_member(interaction.user.id)
-        display_name = member.display_name if member else interaction.user.name
-        
-        if guild_id not in bot_data.setdefault('usernames', {}):
-            bot_data['usernames'][guild_id] = {}
-        bot_data['usernames'][guild_id][user_id] = display_name
-        
-        # Clock in the user
-        bot_data['shifts'][guild_id][user_id] = {
-            'airport': airport,
-            'start_time': datetime.now().isoformat(),
-            'username': display_name,
-            'on_break': False,
-            'total_break_time': 0
-        }
-        
-        save_data(bot_data)
-        
-        # Update status board
-        await update_status_board_for_guild(interaction.guild)
-        
-        embed = discord.Embed(
-            title="⏰ Shift Started",
-            description=f"You have successfully started your shift at **{airport}**",
-            color=discord.Color.green(),
-            timestamp=datetime.now()
-        )
-        embed.set_footer(text="Have a great shift!")
-        
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await extension('shifts').clock_in(interaction, self.airport_input.value)
 
+# Stale shifts - a shift running longer than BOT_MAX_SHIFT_HOURS, or a break
+# longer than BOT_MAX_BREAK_MINUTES, is ended for the user as if they'd clocked
+# out at that limit. 0 turns a limit off.
+MAX_SHIFT_HOURS = float(os.getenv('BOT_MAX_SHIFT_HOURS', '12'))
+MAX_BREAK_MINUTES = float(os.getenv('BOT_MAX_BREAK_MINUTES', '120'))
 
-async def generate_status_board_embed(guild):
-    global bot_data
-    guild_id = str(guild.id)
-    
-    active_shifts = bot_data['shifts'].get(guild_id, {})
-    
-    embed = discord.Embed(
-        title="📊 Live Status Board",
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
-    )
-    
-    if not active_shifts:
-        embed.description = "No one is currently on shift."
-        embed.set_footer(text="ATC24 PTFS Ground Crew • Updates automatically")
-        return embed
-    
-    on_duty = []
-    on_break = []
-    
-    for user_id, shift_data in active_shifts.items():
-        user = guild.get_member(int(user_id))
-        username = user.display_name if user else shift_data.get('username', f'User {user_id}')
-        
-        start_time = datetime.fromisoformat(shift_data['start_time'])
-        duration = datetime.now() - start_time
-        duration_minutes = int(duration.total_seconds() / 60)
-        hours = duration_minutes // 60
-        minutes = duration_minutes % 60
-        
-        shift_info = f"• **{username}** at {shift_data['airport']} ({hours}h {minutes}m)"
-        
-        if shift_data.get('on_break'):
-            break_start = datetime.fromisoformat(shift_data['break_start'])
-            break_duration = int((datetime.now() - break_start).total_seconds() / 60)
-            shift_info += f" - *Break: {break_duration}m*"
-            on_break.append(shift_info)
-        else:
-            on_duty.append(shift_info)
-    
-    if on_duty:
-        embed.add_field(name=f"🟢 On Duty ({len(on_duty)})", value="\n".join(on_duty), inline=False)
+def shift_deadline(shift_data):
+    """Return (when, reason) a shift is ended automatically, or (None, None)"""
+    deadlines = []
+    if MAX_SHIFT_HOURS > 0:
+        deadlines.append((datetime.fromisoformat(shift_data['start_time']) + timedelta(hours=MAX_SHIFT_HOURS), 'shift'))
+    if MAX_BREAK_MINUTES > 0 and shift_data.get('on_break') and shift_data.get('break_start'):
+        deadlines.append((datetime.fromisoformat(shift_data['break_start']) + timedelta(minutes=MAX_BREAK_MINUTES), 'break'))
+    return min(deadlines, default=(None, None))
+
+def schedule_shift_expiry(guild_id, user_id):
+    """Queue the automatic clock-out of one shift"""
+    if HTTP_INTERACTIONS:
+        return
+    guild_id = str(guild_id)
+    shift_data = bot_data['shifts'].get(guild_id, {}).get(str(user_id))
+    if not shift_data:
+        return
+    deadline, _ = shift_deadline(shift_data)
+    if deadline:
+        # Shift times are stored as local time. Shifts of the same guild that
+        # expire together share one timer.
+        deadline = deadline.astimezone()
+        timers.schedule(deadline, ('stale_shifts', guild_id, deadline.timestamp()), lambda: expire_stale_shifts(guild_id))
+
+def schedule_all_shift_expiries():
+    """Rebuild the clock-out timers for every open shift, e.g. after a restart"""
+    for guild_id, shifts in bot_data['shifts'].items():
+        for user_id in list(shifts):
+            schedule_shift_expiry(guild_id, user_id)
+
+def on_shifts_stored(section, key):
+    """Schedule clock-outs for shifts started through another process"""
+    if section == 'shifts':
+        for user_id in list(bot_data['shifts'].get(key, {})):
+            schedule_shift_expiry(key, user_id)
+
+if data_store:
+    data_store.listeners.append(on_shifts_stored)
+
+async def expire_stale_shifts(guild_id):
+    """End every shift in a guild that has run past its limit, with one save"""
+    guild = bot.get_guild(int(guild_id))
+    if guild is None:
+        return
+    now = datetime.now()
+    expired = []
+    async with guild_lock(guild_id):
+        for user_id, shift_data in list(bot_data['shifts'].get(guild_id, {}).items()):
+            deadline, reason = shift_deadline(shift_data)
+            if deadline and deadline <= now:
+                # Credit the shift up to the limit, not up to now
+                shift_data, duration_minutes = close_shift(guild_id, user_id, end_time=deadline)
+                expired.append((user_id, shift_data, duration_minutes, reason))
+        if expired:
+            save_data(bot_data)
     
-    if on_break:
-        embed.add_field(name=f"☕ On Break ({len(on_break)})", value="\n".join(on_break), inline=False)
+    if not expired:
+        return
     
-    embed.set_footer(text="ATC24 PTFS Ground Crew • Updates automatically")
-    return embed
+    print(f"Ended {len(expired)} stale shift(s) in guild {guild_id}")
+    schedule_status_board_update(guild, priority='maintenance')
+    for user_id, shift_data, duration_minutes, reason in expired:
+        rest_scheduler.submit(
+            'maintenance',
+            lambda user_id=user_id, shift_data=shift_data, duration_minutes=duration_minutes, reason=reason:
+                notify_shift_expired(guild, user_id, shift_data, duration_minutes, reason),
+            resume=['shift_expired', guild.id, user_id, shift_data, duration_minutes, reason],
+            bucket=guild.id
+        )
+
+async def notify_shift_expired(guild, user_id, shift_data, duration_minutes, reason):
+    """DM a user that their shift was ended for them"""
+    embed = extension('shifts').shift_expired_embed(guild, shift_data, duration_minutes, reason)
+    try:
+        user = bot.get_user(int(user_id)) or await bot.fetch_user(int(user_id))
+        await user.send(embed=embed)
+    except discord.HTTPException:
+        # DMs closed or the account is gone - the shift is still ended
+        pass
+
+
+async def generate_status_board_embed(guild):
+    """The guild's status board, from the render cache until a shown duration changes"""
+    def valid_until():
+        change = next_status_board_change(bot_data['shifts'].get(str(guild.id), {}), datetime.now())
+        return change.timestamp() if change else time.time() + RENDER_CACHE_SECONDS
+    return await cached_render(guild, 'status_board', extension('status_board').render_status_board_embed, valid_until)
 
 async def update_status_board_for_guild(guild):
     """Update the status board for a specific guild"""
     global bot_data
-    config = bot_data['config'].get(str(guild.id), {})
-    status_board_channel_id = config.get('status_board_channel')
-    status_board_message_id = config.get('status_board_message_id')
-    
-    if not status_board_channel_id:
-        return
+    # One board update per guild at a time, so racing updates can't each post a new message
+    async with keyed_lock(status_board_locks, guild.id):
+        guild_id = str(guild.id)
+        plan_status_board(guild_id, status_board_ticks.pop(guild_id, None))
+        config = bot_data['config'].get(guild_id, {})
+        status_board_channel_id = config.get('status_board_channel')
+        status_board_message_id = config.get('status_board_message_id')
+        
+        if not status_board_channel_id:
+            return
+        
+        channel = bot.get_channel(status_board_channel_id)
+        if not isinstance(channel, discord.TextChannel):
+            return
+        
+        # Generate new status board embed
+        embed = await generate_status_board_embed(guild)
+        content = embed.to_dict()
+        content.pop('timestamp', None)
+        if status_board_message_id and status_board_renders.get(guild_id) == content:
+            status_board_stats['unchanged'] += 1
+            return
+        status_board_stats['sent'] += 1
+        
+        # Try to edit existing message first
+        if status_board_message_id:
+            try:
+                message = await channel.fetch_message(status_board_message_id)
+                await message.edit(embed=embed)
+                status_board_renders[guild_id] = content
+                return
+            except (discord.NotFound, discord.HTTPException):
+                # Message was deleted or not found, create new one
+                pass
+        
+        # Create new status board message
+        message = await channel.send(embed=embed)
+        status_board_renders[guild_id] = content
+        # Store new message ID
+        async with guild_lock(guild.id):
+            bot_data['config'][str(guild.id)]['status_board_message_id'] = message.id
+            save_data(bot_data)
+
+def schedule_status_board_update(guild, priority='user_edit'):
+    """Queue a status board update, replacing one for the same guild that hasn't run yet"""
+    return rest_scheduler.submit(
+        priority,
+        lambda: update_status_board_for_guild(guild),
+        key=('status_board', guild.id),
+        resume=['status_board', guild.id],
+        bucket=guild.id
+    )
+
+# Error handler for missing permissions, attached to the admin commands by their extensions
+async def admin_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        message = "You need administrator permissions to use this command."
+    elif isinstance(error, app_commands.NoPrivateMessage):
+        message = "This command can only be used in a server."
+    else:
+        message = f"An error occurred: {str(error)}"
     
-    channel = bot.get_channel(status_board_channel_id)
-    if not isinstance(channel, discord.TextChannel):
+    # Commands that deferred their response have to report errors as a followup
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+# Command extensions - the slash commands, the button and modal handlers and
+# the embeds users see live in extensions/, and /reload swaps in edited
+# versions without reconnecting. State (bot_data, the schedulers and caches)
+# and the registrations Discord routes to (views, dynamic items, modals) stay
+# in this module, which is never reloaded, so no state is lost. Those call into
+# the extensions through extension(), which looks the module up on every call,
+# so persistent views and Attend buttons pick up a reload straight away.
+EXTENSIONS = ('operations', 'shifts', 'leaderboard', 'status_board', 'welcome', 'admin')
+
+def extension(name):
+    """The currently loaded version of a command extension's module"""
+    return bot.extensions[f"extensions.{name}"]
+
+async def load_extensions():
+    """Load the command extensions; run before commands are synced or served"""
+    for name in EXTENSIONS:
+        await bot.load_extension(f"extensions.{name}")
+
+@bot.tree.command(name="reload", description="Reload command extensions after editing them (Bot owner only)")
+@app_commands.describe(
+    extension="Only reload this extension",
+    sync="Also re-sync slash commands, needed when names or options changed"
+)
+async def reload_extensions(
+    interaction: discord.Interaction,
+    extension: Optional[Literal['operations', 'shifts', 'leaderboard', 'status_board', 'welcome', 'admin']] = None,
+    sync: bool = False
+):
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can reload extensions.", ephemeral=True)
         return
     
-    # Generate new status board embed
-    embed = await generate_status_board_embed(guild)
-    
-    # Try to edit existing message first
-    if status_board_message_id:
+    await interaction.response.defer(ephemeral=True)
+    lines = []
+    for name in [extension] if extension else EXTENSIONS:
         try:
-            message = await channel.fetch_message(status_board_message_id)
-            await message.edit(embed=embed)
-            return
-        except (discord.NotFound, discord.HTTPException):
-            # Message was deleted or not found, create new one
-            pass
-    
-    # Create new status board message
-    message = await channel.send(embed=embed)
-    # Store new message ID
-    bot_data['config'][str(guild.id)]['status_board_message_id'] = message.id
-    save_data(bot_data)
+            await bot.reload_extension(f"extensions.{name}")
+            lines.append(f"✅ Reloaded {name}")
+        except commands.ExtensionError as e:
+            # discord.py keeps the old version loaded if the new one fails
+            lines.append(f"❌ {name}: {e.__cause__ or e}")
+    # Cached leaderboards and boards were drawn by the old renderers
+    render_cache.clear()
+    if sync:
+        synced = await bot.tree.sync()
+        lines.append(f"Synced {len(synced)} command(s)")
+    if HTTP_INTERACTIONS:
+        lines.append("Only this worker was reloaded")
+    await interaction.followup.send("\n".join(lines), ephemeral=True)
 
-# Remove old clock commands - they are now replaced by the shift management interface
+# HTTP interactions endpoint
 
-@bot.tree.command(name="shift", description="Manage your shift (start, end, breaks)")
-@app_commands.guild_only()
-async def shift_management(interaction: discord.Interaction):
-    view = ShiftManagementView()
-    
-    embed = discord.Embed(
-        title="🔧 Shift Management",
-        description="Choose an option below to manage your shift:",
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
-    )
-    embed.add_field(name="🟢 Start Shift", value="Begin working at an airport", inline=True)
-    embed.add_field(name="🔴 End Shift", value="Finish your current shift", inline=True)
-    embed.add_field(name="☕ Start Break", value="Take a break (pauses shift timer)", inline=True)
-    embed.add_field(name="▶️ End Break", value="Resume work after break", inline=True)
-    embed.set_footer(text="ATC24 PTFS Ground Crew")
-    
-    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-
-@bot.tree.command(name="links", description="Get useful links for ATC24 PTFS Ground Crew")
-@app_commands.guild_only()
-async def links_command(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="🔗 ATC24 PTFS Ground Crew Links",
-        description="Here are the essential links for our ground crew operations:",
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
-    )
-    
-    embed.add_field(
-        name="📚 Ground Crew Guide",
-        value="[Click here to access the guide](https://drive.google.com/file/d/1a7ek3QyG4efP2GQNdH3pwk_aOdNL8GYY/view?usp=sharing)",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="✈️ My Plane",
-        value="[Click here to access My Plane](https://myplane.onrender.com)",
-        inline=False
-    )
-    
-    embed.set_footer(text="ATC24 PTFS Ground Crew")
-    
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+# Modal classes by custom_id prefix, so a worker can take a modal submission
+# for a modal that another worker (or an earlier run) opened
+STATELESS_MODALS = {
+    'start_shift': StartShiftModal,
+    'add_time': AddTimeModal,
+    'remove_time': RemoveTimeModal,
+    'end_user_shift': EndShiftModal,
+}
 
-@bot.tree.command(name="shift-manage", description="Manage shifts (Admin only)")
-@app_commands.checks.has_permissions(administrator=True)
-@app_commands.guild_only()
-async def shift_manage(interaction: discord.Interaction):
-    global bot_data
-    
-    # Guild is guaranteed to exist due to @app_commands.guild_only()
-    assert interaction.guild is not None
-    guild_id = str(interaction.guild.id)
-    
-    # Get active shifts
-    active_shifts = bot_data['shifts'].get(guild_id, {})
-    
-    embed = discord.Embed(
-        title="🔧 Shift Management Dashboard",
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
-    )
-    
-    if active_shifts:
-        shift_list = []
-        for user_id, shift_data in active_shifts.items():
-            user = interaction.guild.get_member(int(user_id))
-            username = user.display_name if user else f"User {user_id}"
-            start_time = datetime.fromisoformat(shift_data['start_time'])
-            duration = datetime.now() - start_time
-            duration_minutes = int(duration.total_seconds() / 60)
-            hours = duration_minutes // 60
-            minutes = duration_minutes % 60
-            
-            shift_list.append(f"• **{username}** at {shift_data['airport']} ({hours}h {minutes}m)")
+# Guilds loaded over REST, keyed by guild ID, with the time they were loaded
+hydrated_guilds = {}
+hydrate_locks = {}
+HYDRATE_SECONDS = float(os.getenv('BOT_HYDRATE_SECONDS', '300'))
+
+# How long Discord waits for an interaction to be acknowledged
+INTERACTION_ACK_SECONDS = 3
+
+async def hydrate_guild(guild_id):
+    """Load a guild's roles and channels over REST, since there's no gateway to cache them"""
+    async with keyed_lock(hydrate_locks, guild_id):
+        loaded_at = hydrated_guilds.get(guild_id)
+        if loaded_at is not None and time.monotonic() - loaded_at < HYDRATE_SECONDS:
+            return
         
-        embed.add_field(name=f"Active Shifts ({len(active_shifts)})", value="\n".join(shift_list), inline=False)
-    else:
-        embed.add_field(name="Active Shifts (0)", value="No active shifts", inline=False)
+        guild = await bot.fetch_guild(guild_id)
+        for channel in await guild.fetch_channels():
+            guild._add_channel(channel)
+        guild._add_member(await guild.fetch_member(bot.user.id))
+        bot._connection._add_guild(guild)
+        hydrated_guilds[guild_id] = time.monotonic()
+
+def load_signature_verifier(public_key):
+    """Return a function that checks Discord's Ed25519 request signatures"""
+    try:
+        from nacl.exceptions import BadSignatureError
+        from nacl.signing import VerifyKey
+    except ImportError:
+        raise RuntimeError("HTTP interactions need PyNaCl to verify requests: pip install pynacl")
+    
+    verify_key = VerifyKey(bytes.fromhex(public_key))
     
-    embed.set_footer(text="Use the buttons below to manage shifts")
+    def verify(signature, timestamp, body):
+        try:
+            verify_key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+        except (BadSignatureError, ValueError):
+            return False
+        return True
     
-    view = ShiftManageView()
-    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+    return verify
 
-@bot.tree.command(name="leaderboard", description="Show shift time leaderboard")
-@app_commands.guild_only()
-async def leaderboard(interaction: discord.Interaction):
-    embed = await generate_leaderboard_embed(interaction.guild)
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+def dispatch_interaction(payload):
+    """Run an interaction received over HTTP through the same handlers as the gateway.
+    
+    Mirrors ConnectionState.parse_interaction_create, but first makes sure any
+    modal the interaction is for is registered on this worker, and
+    hands the interaction back so the caller can wait for its response.
+    """
+    state = bot._connection
+    interaction = discord.Interaction(data=payload, state=state)
+    data = payload.get('data', {})
+    
+    if payload['type'] in (2, 4):  # Slash command or autocomplete
+        bot.tree._from_interaction(interaction)
+    elif payload['type'] == 3:  # Button
+        # Attend buttons are dynamic items and the menus are registered at
+        # startup, so any worker can take any button
+        state._view_store.dispatch_view(data['component_type'], data['custom_id'], interaction)
+    elif payload['type'] == 5:  # Modal submit
+        custom_id = data['custom_id']
+        modal_class = STATELESS_MODALS.get(custom_id.split(':', 1)[0])
+        if custom_id not in state._view_store._modals and modal_class:
+            modal = modal_class()
+            modal.custom_id = custom_id
+            state.store_view(modal)
+        state._view_store.dispatch_modal(custom_id, interaction, data['components'], data.get('resolved', {}))
+    
+    bot.dispatch('interaction', interaction)
+    return interaction
 
-# Error handler for missing permissions
-@setup.error
-@operation_start.error
-@operation_stop.error
-@shift_manage.error
-async def admin_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    if isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
-    elif isinstance(error, app_commands.NoPrivateMessage):
-        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+def make_interactions_app(verify_signature):
+    """Build the aiohttp app that receives interactions at /interactions"""
+    from aiohttp import web
+    
+    async def handle_interaction(request):
+        body = await request.read()
+        signature = request.headers.get('X-Signature-Ed25519', '')
+        timestamp = request.headers.get('X-Signature-Timestamp', '')
+        if not verify_signature(signature, timestamp, body):
+            return web.Response(status=401, text="invalid request signature")
+        
+        payload = json.loads(body)
+        if payload['type'] == 1:  # Discord checking the endpoint is alive
+            return web.json_response({'type': 1})
+        
+        # Pick up whatever other workers wrote so this one isn't working from stale data
+        if data_store:
+            data_store.refresh(bot_data)
+        if payload.get('guild_id'):
+            await hydrate_guild(int(payload['guild_id']))
+        
+        # The handlers answer through the interaction callback endpoint, so hold
+        # the request until they have, then tell Discord there's nothing more to send
+        interaction = dispatch_interaction(payload)
+        deadline = time.monotonic() + INTERACTION_ACK_SECONDS
+        while not interaction.response.is_done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return web.Response(status=202)
+    
+    app = web.Application()
+    app.router.add_post('/interactions', handle_interaction)
+    return app
+
+async def serve_http_interactions(token):
+    """Log in over REST only and serve interactions from the HTTP endpoint"""
+    from aiohttp import web
+    
+    async with bot:
+        await bot.login(token)
+        public_key = PUBLIC_KEY or (await bot.application_info()).verify_key
+        app = make_interactions_app(load_signature_verifier(public_key))
+        
+        await load_extensions()
+        register_persistent_views()
+        start_persistence_loops()
+        if data_store:
+            refresh_shared_data.start()
+        await restore_pending_work()
+        
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, HTTP_HOST, HTTP_PORT).start()
+        print(f"Serving interactions on http://{HTTP_HOST}:{HTTP_PORT}/interactions")
+        stop = asyncio.Event()
+        stop_on_signals(stop)
+        try:
+            await stop.wait()
+        finally:
+            # Stop taking interactions first, so the load balancer moves on
+            await runner.cleanup()
+            await shut_down()
+
+# Shutdown and restart - on SIGINT or SIGTERM the bot stops creating
+# background work, gives queued REST work up to BOT_SHUTDOWN_SECONDS to finish
+# and saves what's left so the next start can queue it again. Timers and board
+# cadences are rebuilt from bot_data, and caches fill up again on first use.
+SHUTDOWN_SECONDS = float(os.getenv('BOT_SHUTDOWN_SECONDS', '20'))
+
+# Where this process keeps unfinished work in bot_data['pending_work'], so
+# processes sharing a store each get their own back: BOT_WORKER_ID if it's set,
+# otherwise the shard range for a gateway process or the address an HTTP
+# worker listens on. Give HTTP workers on different hosts a BOT_WORKER_ID.
+if os.getenv('BOT_WORKER_ID'):
+    PENDING_WORK_KEY = os.environ['BOT_WORKER_ID']
+elif HTTP_INTERACTIONS:
+    PENDING_WORK_KEY = f"http:{HTTP_HOST}:{HTTP_PORT}"
+else:
+    PENDING_WORK_KEY = ','.join(map(str, SHARD_IDS)) if SHARD_IDS else 'default'
+
+async def work_guild(guild_id):
+    """The guild a restored job is for, loading it first in HTTP mode"""
+    if HTTP_INTERACTIONS:
+        await hydrate_guild(int(guild_id))
+    return bot.get_guild(int(guild_id))
+
+async def resume_work(kind, *args):
+    """Queue a job again from the resume descriptor it was saved with"""
+    if kind == 'message':
+        channel_id, content, embed = args
+        channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+        embed = discord.Embed.from_dict(embed) if embed else None
+        rest_scheduler.submit('maintenance', lambda: channel.send(content, embed=embed), resume=[kind, *args], bucket=channel.guild.id)
+    elif kind == 'shift_expired':
+        guild_id, user_id, shift_data, duration_minutes, reason = args
+        guild = await work_guild(guild_id)
+        rest_scheduler.submit(
+            'maintenance',
+            lambda: notify_shift_expired(guild, user_id, shift_data, duration_minutes, reason),
+            resume=[kind, *args],
+            bucket=guild_id
+        )
     else:
-        await interaction.response.send_message(f"An error occurred: {str(error)}", ephemeral=True)
+        guild = await work_guild(args[0])
+        if guild is None:
+            return
+        if kind == 'status_board':
+            schedule_status_board_update(guild, 'maintenance')
+        elif kind == 'leaderboard':
+            rest_scheduler.submit('user_edit', lambda: refresh_leaderboard(guild), key=('leaderboard', guild.id), resume=[kind, *args], bucket=guild.id)
+        elif kind == 'operation_role':
+            _, user_id, role_name = args
+            member = await fetch_member(guild, user_id)
+            if member:
+                rest_scheduler.submit('user_edit', lambda: give_operation_role(guild, member, role_name), resume=[kind, *args], bucket=guild.id)
+        elif kind == 'delete_role':
+            role = guild.get_role(args[1])
+            if role:
+                rest_scheduler.submit('maintenance', lambda: delete_operation_role(guild, role), resume=[kind, *args], bucket=guild.id)
+
+async def restore_pending_work():
+    """Queue again the work the last shutdown didn't get to"""
+    pending = bot_data.get('pending_work', {}).pop(PENDING_WORK_KEY, None)
+    if not pending:
+        return
+    save_data(bot_data)
+    for descriptor in pending:
+        try:
+            await resume_work(*descriptor)
+        except Exception as e:
+            print(f"Could not restore {descriptor[0]} job: {e}")
+    print(f"Restored {len(pending)} job(s) from the last shutdown")
+
+async def shut_down():
+    """Stop creating work, finish or save what's queued and save bot_data"""
+    global shutting_down
+    if shutting_down:
+        return
+    shutting_down = True
+    print("Shutting down...")
+    
+    # Nothing new from the loops and timers; they're rebuilt on the next start
+    for loop in [*status_board_loops.values(), resolve_pending_usernames, refresh_shared_data, flush_dirty_data, sync_data_periodically, snapshot_data]:
+        loop.cancel()
+    timers.stop()
+    for guild_id in list(welcome_buffers):
+        flush_welcomes(guild_id)
+    welcome_buffers.clear()
+    
+    pending = await rest_scheduler.drain(SHUTDOWN_SECONDS)
+    if pending:
+        bot_data.setdefault('pending_work', {})[PENDING_WORK_KEY] = pending
+        print(f"Saved {len(pending)} unfinished job(s) for the next start")
+    save_data(bot_data)
+    if not data_store:
+        sync_data_file()
+
+def stop_on_signals(stop):
+    """Set the stop event on SIGINT or SIGTERM"""
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop.set)
+        except NotImplementedError:
+            # Windows - Ctrl+C still raises KeyboardInterrupt
+            pass
+
+async def run_gateway(token):
+    """Run over the gateway until SIGINT or SIGTERM, then shut down cleanly"""
+    async with bot:
+        await load_extensions()
+        stop = asyncio.Event()
+        stop_on_signals(stop)
+        connection = asyncio.create_task(bot.start(token))
+        stopping = asyncio.create_task(stop.wait())
+        await asyncio.wait({connection, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        if connection.done():
+            stopping.cancel()
+            # Login failures and the like
+            connection.result()
+            return
+        await shut_down()
+        await bot.close()
+        await connection
 
 # Run the bot
 if __name__ == "__main__":
@@ -1171,4 +2361,5 @@ if __name__ == "__main__":
     if not token:
         print("Please set the DISCORD_BOT_TOKEN environment variable")
     else:
-        bot.run(token)
\ No newline at end of file
+        discord.utils.setup_logging()
+        asyncio.run(serve_http_interactions(token) if HTTP_INTERACTIONS else run_gateway(token))
\ No newline at end of file
@@ -0,0 +1 @@
+"""Command extensions loaded by discord_bot.load_extensions and reloadable with /reload"""
@@ -0,0 +1,467 @@
+"""Admin commands: /setup, /time-import, /export and /diagnostics"""
+import discord
+from discord import app_commands
+import asyncio
+import copy
+import csv
+from datetime import datetime, timedelta
+import io
+import json
+import math
+import os
+import tempfile
+from typing import Literal, Optional
+
+from discord_bot import (
+    DURABILITY, HTTP_INTERACTIONS, SHARDED, admin_error, bot, bot_data,
+    display_name_for, generate_status_board_embed, global_ranking,
+    guild_changed, guild_lock, keyed_lock, parse_user_reference,
+    refresh_leaderboard, render_stats, rest_scheduler, save_data, save_stats,
+    shard_health, shard_latencies, snapshot_stats, status_board_due,
+    status_board_locks, status_board_stats, timers, welcome_stats,
+)
+
+@app_commands.command(name="setup", description="Configure bot settings (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.describe(
+    operation_role="Role to ping for operations",
+    operation_channel="Channel for operation announcements",
+    leaderboard_channel="Channel for leaderboard updates",
+    status_board_channel="Channel for live status board",
+    welcome_channel="Channel for welcome messages",
+    global_leaderboard="Count this server's shift time on the global leaderboard"
+)
+async def setup_command(
+    interaction: discord.Interaction, 
+    operation_role: discord.Role, 
+    operation_channel: discord.TextChannel, 
+    leaderboard_channel: discord.TextChannel,
+    status_board_channel: Optional[discord.TextChannel] = None,
+    welcome_channel: Optional[discord.TextChannel] = None,
+    global_leaderboard: Optional[bool] = None
+):
+    
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    guild_id = str(interaction.guild.id)
+    
+    config_updates = {
+        'operation_role_id': operation_role.id,
+        'operation_channel_id': operation_channel.id,
+        'leaderboard_channel': leaderboard_channel.id
+    }
+    
+    if status_board_channel:
+        config_updates['status_board_channel'] = status_board_channel.id
+    
+    if welcome_channel:
+        config_updates['welcome_channel'] = welcome_channel.id
+    
+    if global_leaderboard is not None:
+        config_updates['global_leaderboard'] = global_leaderboard
+    
+    async with guild_lock(guild_id):
+        if guild_id not in bot_data['config']:
+            bot_data['config'][guild_id] = {}
+        bot_data['config'][guild_id].update(config_updates)
+        save_data(bot_data)
+    global_ranking.stale.add(guild_id)
+    
+    description = f"**Operation Role:** {operation_role.mention}\n**Operation Channel:** {operation_channel.mention}\n**Leaderboard Channel:** {leaderboard_channel.mention}"
+    
+    if status_board_channel:
+        description += f"\n**Status Board Channel:** {status_board_channel.mention}"
+    
+    if welcome_channel:
+        description += f"\n**Welcome Channel:** {welcome_channel.mention}"
+    
+    if global_leaderboard is not None:
+        description += f"\n**Global Leaderboard:** {'Taking part' if global_leaderboard else 'Not taking part'}"
+    
+    embed = discord.Embed(
+        title="✅ Setup Complete",
+        description=description,
+        color=discord.Color.green()
+    )
+    
+    # Post initial status board if configured
+    if status_board_channel:
+        async with keyed_lock(status_board_locks, guild_id):
+            status_embed = await generate_status_board_embed(interaction.guild)
+            message = await status_board_channel.send(embed=status_embed)
+            # Store message ID for future updates
+            async with guild_lock(guild_id):
+                bot_data['config'][guild_id]['status_board_message_id'] = message.id
+                save_data(bot_data)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Limits for /time-import uploads
+TIME_IMPORT_MAX_BYTES = 1024 * 1024
+TIME_IMPORT_MAX_ROWS = 5000
+
+def parse_time_adjustments(text):
+    """Parse and validate a time adjustment CSV.
+    
+    Each row is: user (mention or ID), minutes (e.g. 30, +30 or -15), optional
+    reason. A header row is skipped. Returns (rows, errors) where rows are
+    (line, user_id, minutes, reason) tuples and errors are (line, message).
+    """
+    rows = []
+    errors = []
+    for line_number, record in enumerate(csv.reader(io.StringIO(text)), start=1):
+        cells = [cell.strip() for cell in record]
+        if not any(cells):
+            continue
+        if len(cells) < 2:
+            errors.append((line_number, "Expected at least a user and a number of minutes"))
+            continue
+        try:
+            user_id = parse_user_reference(cells[0])
+        except ValueError:
+            # Allow a header row like "user,minutes,reason" - but a first row
+            # with numeric minutes is data with a bad user, not a header
+            if line_number == 1 and not cells[1].lstrip('+-').isdigit():
+                continue
+            errors.append((line_number, f"Invalid user `{cells[0][:40]}`"))
+            continue
+        try:
+            minutes = int(cells[1])
+        except ValueError:
+            errors.append((line_number, f"Invalid minutes `{cells[1][:20]}`"))
+            continue
+        if minutes == 0:
+            errors.append((line_number, "Minutes can't be zero"))
+            continue
+        reason = cells[2] if len(cells) > 2 else ""
+        rows.append((line_number, user_id, minutes, reason))
+        if len(rows) > TIME_IMPORT_MAX_ROWS:
+            errors.append((line_number, f"Too many rows, the limit is {TIME_IMPORT_MAX_ROWS}"))
+            break
+    return rows, errors
+
+@app_commands.command(name="time-import", description="Add or remove time for many users from a CSV file (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.describe(file="CSV with rows of: user mention or ID, minutes (+/-), optional reason")
+async def time_import(interaction: discord.Interaction, file: discord.Attachment):
+    
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    guild_id = str(interaction.guild.id)
+    
+    if file.size > TIME_IMPORT_MAX_BYTES:
+        await interaction.response.send_message("That file is too large (1 MB max).", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    
+    try:
+        text = (await file.read()).decode('utf-8-sig')
+    except UnicodeDecodeError:
+        await interaction.followup.send("That file isn't a UTF-8 CSV file.", ephemeral=True)
+        return
+    
+    # Validate every row before touching any totals
+    rows, errors = parse_time_adjustments(text)
+    if errors:
+        error_lines = [f"Line {line}: {message}" for line, message in errors[:20]]
+        if len(errors) > 20:
+            error_lines.append(f"...and {len(errors) - 20} more")
+        embed = discord.Embed(
+            title="❌ Import Rejected",
+            description="No changes were made. Fix these rows and upload the file again:\n\n" + "\n".join(error_lines),
+            color=discord.Color.red()
+        )
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+    
+    if not rows:
+        await interaction.followup.send("That file has no rows to import.", ephemeral=True)
+        return
+    
+    # Apply the whole batch at once with a single save
+    results = []
+    async with guild_lock(guild_id):
+        totals = bot_data['shift_totals'].setdefault(guild_id, {})
+        for line, user_id, minutes, reason in rows:
+            user_id_str = str(user_id)
+            before = totals.get(user_id_str, 0)
+            after = max(0, before + minutes)
+            totals[user_id_str] = after
+            results.append((line, user_id_str, minutes, before, after, reason))
+        guild_changed(guild_id)
+        save_data(bot_data)
+    
+    guild = interaction.guild
+    rest_scheduler.submit('user_edit', lambda: refresh_leaderboard(guild), key=('leaderboard', guild.id), resume=['leaderboard', guild.id], bucket=guild.id)
+    
+    added = sum(minutes for _, _, minutes, _, _, _ in results if minutes > 0)
+    removed = -sum(minutes for _, _, minutes, _, _, _ in results if minutes < 0)
+    
+    summary_lines = []
+    for line, user_id_str, minutes, before, after, reason in results[:15]:
+        name = display_name_for(interaction.guild, user_id_str)
+        reason_text = f" - {reason}" if reason else ""
+        summary_lines.append(f"• **{name}** {minutes:+d}m ({before}m → {after}m){reason_text}")
+    if len(results) > 15:
+        summary_lines.append(f"...and {len(results) - 15} more, see the attached file")
+    
+    embed = discord.Embed(
+        title="✅ Time Import Complete",
+        description="\n".join(summary_lines)[:4000],
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Rows Applied", value=str(len(results)), inline=True)
+    embed.add_field(name="Minutes Added", value=str(added), inline=True)
+    embed.add_field(name="Minutes Removed", value=str(removed), inline=True)
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    
+    # Full per-row results as a CSV attachment
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['line', 'user_id', 'username', 'minutes', 'total_before', 'total_after', 'reason'])
+    for line, user_id_str, minutes, before, after, reason in results:
+        writer.writerow([line, user_id_str, display_name_for(interaction.guild, user_id_str, ''), minutes, before, after, reason])
+    results_file = discord.File(io.BytesIO(output.getvalue().encode('utf-8')), filename="time_import_results.csv")
+    
+    await interaction.followup.send(embed=embed, file=results_file, ephemeral=True)
+
+# Columns of each /export dataset
+EXPORT_FIELDS = {
+    'totals': ['user_id', 'username', 'total_minutes'],
+    'usernames': ['user_id', 'username'],
+    'shifts': ['user_id', 'username', 'airport', 'start_time', 'elapsed_minutes', 'on_break', 'break_start', 'total_break_time'],
+    'attendance': ['operation_id', 'airport', 'date', 'time', 'operation_type', 'user_id', 'username', 'joined_at']
+}
+
+def in_date_range(timestamp, since, until):
+    """Check an ISO timestamp against an optional [since, until) range"""
+    if since is None and until is None:
+        return True
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return False
+    return (since is None or moment >= since) and (until is None or moment < until)
+
+def export_rows(dataset, snapshot, since, until, airport):
+    """Yield export rows for one dataset of a guild snapshot"""
+    names = snapshot['usernames']
+    if dataset == 'totals':
+        for user_id, minutes in sorted(snapshot['shift_totals'].items(), key=lambda x: x[1], reverse=True):
+            yield {'user_id': user_id, 'username': names.get(user_id, ''), 'total_minutes': minutes}
+    elif dataset == 'usernames':
+        for user_id, username in names.items():
+            yield {'user_id': user_id, 'username': username}
+    elif dataset == 'shifts':
+        now = datetime.now()
+        for user_id, shift_data in snapshot['shifts'].items():
+            # Older shifts were saved as typed, not uppercased
+            if airport and shift_data.get('airport', '').strip().upper() != airport:
+                continue
+            if not in_date_range(shift_data.get('start_time'), since, until):
+                continue
+            elapsed = int((now - datetime.fromisoformat(shift_data['start_time'])).total_seconds() / 60)
+            yield {
+                'user_id': user_id,
+                'username': shift_data.get('username') or names.get(user_id, ''),
+                'airport': shift_data.get('airport'),
+                'start_time': shift_data.get('start_time'),
+                'elapsed_minutes': elapsed,
+                'on_break': shift_data.get('on_break', False),
+                'break_start': shift_data.get('break_start', ''),
+                'total_break_time': shift_data.get('total_break_time', 0)
+            }
+    elif dataset == 'attendance':
+        for operation_id, operation_data in snapshot['active_operations'].items():
+            if airport and operation_data.get('airport', '').upper() != airport:
+                continue
+            for user_id, attendee in operation_data.get('attendees', {}).items():
+                if not in_date_range(attendee.get('joined_at'), since, until):
+                    continue
+                yield {
+                    'operation_id': operation_id,
+                    'airport': operation_data.get('airport'),
+                    'date': operation_data.get('date'),
+                    'time': operation_data.get('time'),
+                    'operation_type': operation_data.get('operation_type') or '',
+                    'user_id': user_id,
+                    'username': attendee.get('username', ''),
+                    'joined_at': attendee.get('joined_at')
+                }
+
+def write_export(path, file_format, fields, rows):
+    """Stream rows into a CSV or NDJSON file, returning the row count"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(row, default=str))
+                f.write('\n')
+                count += 1
+    return count
+
+@app_commands.command(name="export", description="Export shift and attendance data as files (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.describe(
+    dataset="What to export",
+    file_format="CSV or newline-delimited JSON",
+    since="Only include shifts and attendance from this date on (YYYY-MM-DD)",
+    until="Only include shifts and attendance up to this date (YYYY-MM-DD)",
+    airport="Only include shifts and operations at this airport"
+)
+async def export_data(
+    interaction: discord.Interaction,
+    dataset: Literal['all', 'totals', 'usernames', 'shifts', 'attendance'] = 'all',
+    file_format: Literal['csv', 'ndjson'] = 'csv',
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    airport: Optional[str] = None
+):
+    
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    guild_id = str(interaction.guild.id)
+    
+    try:
+        since_date = datetime.strptime(since, '%Y-%m-%d') if since else None
+        until_date = datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1) if until else None
+    except ValueError:
+        await interaction.response.send_message("Dates must look like 2025-09-15.", ephemeral=True)
+        return
+    airport = airport.strip().upper() if airport else None
+    
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    
+    # Copy this guild's data so the export can be written off the event loop
+    async with guild_lock(guild_id):
+        snapshot = copy.deepcopy({
+            'shift_totals': bot_data['shift_totals'].get(guild_id, {}),
+            'usernames': bot_data.get('usernames', {}).get(guild_id, {}),
+            'shifts': bot_data['shifts'].get(guild_id, {}),
+            'active_operations': {op_id: op for op_id, op in bot_data['active_operations'].items() if op_id.startswith(f"{guild_id}_")}
+        })
+    
+    datasets = list(EXPORT_FIELDS) if dataset == 'all' else [dataset]
+    files = []
+    summary = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in datasets:
+            path = os.path.join(directory, f"{name}.{file_format}")
+            rows = export_rows(name, snapshot, since_date, until_date, airport)
+            count = await asyncio.to_thread(write_export, path, file_format, EXPORT_FIELDS[name], rows)
+            size = os.path.getsize(path)
+            if size > interaction.guild.filesize_limit:
+                summary.append(f"• **{name}**: {count} rows, too large to upload ({size // 1024} KB)")
+                continue
+            files.append(discord.File(path, filename=f"{name}_{guild_id}.{file_format}"))
+            summary.append(f"• **{name}**: {count} rows")
+        
+        notes = []
+        if (since or until or airport) and any(name in ('totals', 'usernames') for name in datasets):
+            notes.append("Totals and usernames have no dates or airports, so filters don't apply to them.")
+        
+        embed = discord.Embed(
+            title="📦 Data Export",
+            description="\n".join(summary + notes),
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text="ATC24 PTFS Ground Crew")
+        await interaction.followup.send(embed=embed, files=files, ephemeral=True)
+
+@app_commands.command(name="diagnostics", description="Show bot health and shard status (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+async def diagnostics(interaction: discord.Interaction):
+    latencies = shard_latencies()
+    
+    guild_counts = {}
+    for guild in bot.guilds:
+        guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+    
+    shard_lines = []
+    for shard_id in sorted(set(latencies) | set(shard_health)):
+        health = shard_health.get(shard_id, {})
+        latency = latencies.get(shard_id)
+        latency_text = f"{latency * 1000:.0f}ms" if latency is not None and math.isfinite(latency) else "n/a"
+        state = health.get('state', 'unknown')
+        since = health.get('since')
+        since_text = f" since <t:{int(since.timestamp())}:R>" if since else ""
+        shard_lines.append(f"• **Shard {shard_id}** - {state}{since_text}, {latency_text}, {guild_counts.get(shard_id, 0)} guild(s)")
+    
+    embed = discord.Embed(
+        title="🩺 Bot Diagnostics",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    if HTTP_INTERACTIONS:
+        mode = "HTTP interactions"
+    else:
+        mode = "Sharded" if SHARDED else "Single connection"
+    embed.add_field(name="Mode", value=mode, inline=True)
+    embed.add_field(name="Guilds", value=str(len(bot.guilds)), inline=True)
+    embed.add_field(name="This Guild's Shard", value=str(interaction.guild.shard_id) if interaction.guild else "n/a", inline=True)
+    saves = save_stats['saves']
+    average_ms = save_stats['seconds'] / saves * 1000 if saves else 0
+    fsyncs = save_stats['fsyncs']
+    fsync_ms = save_stats['fsync_seconds'] / fsyncs * 1000 if fsyncs else 0
+    persistence = (
+        f"{saves} saves, {average_ms:.1f}ms average, {save_stats['bytes'] // 1024} KB written\n"
+        f"Durability: {DURABILITY}, {fsyncs} fsyncs, {fsync_ms:.1f}ms average"
+    )
+    if snapshot_stats['snapshots']:
+        ratio = snapshot_stats['last_bytes'] / snapshot_stats['last_raw_bytes'] * 100 if snapshot_stats['last_raw_bytes'] else 0
+        persistence += (
+            f"\nSnapshots: {snapshot_stats['snapshots']} written, last {snapshot_stats['last_bytes'] // 1024} KB"
+            f" ({ratio:.0f}% of {snapshot_stats['last_raw_bytes'] // 1024} KB)"
+        )
+    if snapshot_stats['failures']:
+        persistence += f", {snapshot_stats['failures']} failed"
+    embed.add_field(name="Persistence", value=persistence, inline=False)
+    embed.add_field(name="REST Scheduler", value="\n".join(rest_scheduler.describe())[:1024], inline=False)
+    embed.add_field(
+        name="Status Boards",
+        value=f"{len(status_board_due)} on a timer\n{status_board_stats['sent']} sent, {status_board_stats['unchanged']} unchanged",
+        inline=True
+    )
+    embed.add_field(
+        name="Welcomes",
+        value=f"{welcome_stats['joins']} joins, {welcome_stats['sends']} messages\n{welcome_stats['joins'] - welcome_stats['sends']} sends saved",
+        inline=True
+    )
+    embed.add_field(
+        name="Render Cache",
+        value=f"{render_stats['hits']} hits, {render_stats['renders']} renders",
+        inline=True
+    )
+    next_deadline = timers.next_deadline()
+    embed.add_field(
+        name="Timers",
+        value=f"{len(timers.heap)} pending" + (f", next <t:{int(next_deadline.timestamp())}:R>" if next_deadline else ""),
+        inline=True
+    )
+    embed.add_field(name="Shards", value="\n".join(shard_lines)[:1024] or "No shards connected", inline=False)
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+for command in (setup_command, time_import, export_data, diagnostics):
+    command.error(admin_error)
+
+COMMANDS = (setup_command, time_import, export_data, diagnostics)
+
+async def setup(bot):
+    """Add this extension's commands to the tree; unloading removes them again"""
+    for command in COMMANDS:
+        bot.tree.add_command(command)
@@ -0,0 +1,110 @@
+"""Leaderboard commands: /leaderboard and /global-leaderboard, and the leaderboard embed"""
+import discord
+from discord import app_commands
+from datetime import datetime
+
+from discord_bot import (
+    bot_data, display_name_for, generate_leaderboard_embed,
+    global_display_name, global_ranking, remember_username,
+)
+
+async def render_leaderboard_embed(guild):
+    """Build the guild's leaderboard embed; generate_leaderboard_embed caches it"""
+    guild_id = str(guild.id)
+    
+    # Sort users by total time
+    user_times = bot_data['shift_totals'].get(guild_id, {})
+    sorted_users = sorted(user_times.items(), key=lambda x: x[1], reverse=True)
+    
+    embed = discord.Embed(
+        title="📊 Shift Time Leaderboard",
+        color=discord.Color.gold(),
+        timestamp=datetime.now()
+    )
+    
+    if not sorted_users:
+        embed.description = "No shift data available yet."
+        return embed
+    
+    leaderboard_text = ""
+    for i, (user_id, total_minutes) in enumerate(sorted_users[:10]):
+        user = guild.get_member(int(user_id))
+        
+        # Try to get username from current member first, then stored usernames, then fallback
+        if user:
+            username = user.display_name
+            # Update stored username if member is found, it is saved with the next flush
+            remember_username(guild_id, user_id, username)
+        else:
+            username = display_name_for(guild, user_id)
+        
+        hours = total_minutes // 60
+        minutes = total_minutes % 60
+        
+        if i == 0:
+            emoji = "🥇"
+        elif i == 1:
+            emoji = "🥈"
+        elif i == 2:
+            emoji = "🥉"
+        else:
+            emoji = f"{i+1}."
+        
+        leaderboard_text += f"{emoji} **{username}** - {hours}h {minutes}m\n"
+    
+    embed.description = leaderboard_text
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    
+    return embed
+
+@app_commands.command(name="leaderboard", description="Show shift time leaderboard")
+@app_commands.guild_only()
+async def leaderboard(interaction: discord.Interaction):
+    embed = await generate_leaderboard_embed(interaction.guild)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@app_commands.command(name="global-leaderboard", description="Show shift time across every participating server")
+@app_commands.guild_only()
+async def global_leaderboard(interaction: discord.Interaction):
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    
+    embed = discord.Embed(
+        title="🌐 Global Shift Time Leaderboard",
+        color=discord.Color.gold(),
+        timestamp=datetime.now()
+    )
+    
+    leaderboard_text = ""
+    for i, (user_id, total_minutes) in enumerate(global_ranking.top(10)):
+        if i == 0:
+            emoji = "🥇"
+        elif i == 1:
+            emoji = "🥈"
+        elif i == 2:
+            emoji = "🥉"
+        else:
+            emoji = f"{i+1}."
+        leaderboard_text += f"{emoji} **{global_display_name(user_id)}** - {total_minutes // 60}h {total_minutes % 60}m\n"
+    
+    if not bot_data['config'].get(str(interaction.guild.id), {}).get('global_leaderboard'):
+        leaderboard_text += "\n*This server isn't taking part. An admin can join with `/setup global_leaderboard:True`.*"
+    embed.description = leaderboard_text or "No shift data available yet."
+    
+    rank = global_ranking.rank(interaction.user.id)
+    if rank:
+        position, total_minutes = rank
+        value = f"#{position} of {len(global_ranking.ranking)} - {total_minutes // 60}h {total_minutes % 60}m"
+    else:
+        value = "No time on participating servers yet"
+    embed.add_field(name="Your Rank", value=value, inline=False)
+    embed.set_footer(text=f"ATC24 PTFS Ground Crew • {len(global_ranking.merged)} participating servers")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+COMMANDS = (leaderboard, global_leaderboard)
+
+async def setup(bot):
+    """Add this extension's commands to the tree; unloading removes them again"""
+    for command in COMMANDS:
+        bot.tree.add_command(command)
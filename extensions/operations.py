@@ -0,0 +1,268 @@
+"""Operation commands: /operation-start and /operation-stop, the Attend button and the operation messages"""
+import discord
+from discord import app_commands
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from discord_bot import (
+    AttendButton, REMINDER_MINUTES, admin_error, airport_autocomplete,
+    airport_index, bot_data, data_store, give_operation_role, guild_lock,
+    operation_lock, parse_operation_start, remember_username,
+    rest_scheduler, save_data, schedule_operation_timers, stop_operations,
+)
+
+def operation_embed(operation_data):
+    """The announcement embed for an active operation, with its attendee list"""
+    embed_description = f"**Airport:** {operation_data['airport']}\n**Time:** {operation_data['time']}\n**Date:** {operation_data['date']}"
+    
+    if operation_data.get('starts_at'):
+        starts_at = int(datetime.fromisoformat(operation_data['starts_at']).timestamp())
+        embed_description += f"\n**Starts:** <t:{starts_at}:F> (<t:{starts_at}:R>)"
+    if operation_data.get('operation_type'):
+        embed_description += f"\n**Type:** {operation_data['operation_type']}"
+    if operation_data.get('description'):
+        embed_description += f"\n**Description:** {operation_data['description']}"
+    if operation_data.get('max_attendees'):
+        embed_description += f"\n**Max Attendees:** {operation_data['max_attendees']}"
+    
+    embed = discord.Embed(
+        title="📢 OPERATION ACTIVE",
+        description=embed_description,
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    
+    attendees_list = []
+    for attendee_data in operation_data['attendees'].values():
+        attendees_list.append(f"• {attendee_data['username']}")
+    
+    # Show attendee count with capacity if applicable
+    attendee_count = len(attendees_list)
+    max_attendees = operation_data.get('max_attendees')
+    
+    if max_attendees:
+        attendee_header = f"Attendees ({attendee_count}/{max_attendees})"
+    else:
+        attendee_header = f"Attendees ({attendee_count})"
+    
+    if attendees_list:
+        embed.add_field(name=attendee_header, value="\n".join(attendees_list), inline=False)
+    else:
+        embed.add_field(name=attendee_header, value="No attendees yet", inline=False)
+    
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    return embed
+
+def operation_ended_embed():
+    """The notice posted when an operation stops"""
+    embed = discord.Embed(
+        title="🔴 OPERATION ENDED",
+        description="This operation has ended. Thank you all for attending!",
+        color=discord.Color.red(),
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    return embed
+
+def reminder_content(role, operation_data, minutes):
+    """The ping sent ahead of (or, for 0 minutes, at) an operation's start"""
+    timestamp = int(datetime.fromisoformat(operation_data['starts_at']).timestamp())
+    if minutes:
+        return f"{role.mention} Reminder: the operation at **{operation_data['airport']}** starts <t:{timestamp}:R> (<t:{timestamp}:t>)."
+    return f"{role.mention} The operation at **{operation_data['airport']}** is starting now!"
+
+async def attend(interaction: discord.Interaction, operation_id):
+    """Put the user on an operation's attendee list and give them its role"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    guild = interaction.guild
+    user = interaction.user
+    
+    # Get member object
+    member = user if isinstance(user, discord.Member) else guild.get_member(user.id)
+    if member is None:
+        await interaction.response.send_message("Could not find your member information.", ephemeral=True)
+        return
+    
+    def claim_spot(operation_data):
+        """Add the user if there's room, returning an error message otherwise"""
+        if operation_data is None:
+            return "This operation is no longer active."
+        if str(user.id) in operation_data['attendees']:
+            return "You are already attending this operation!"
+        if operation_data.get('max_attendees') and len(operation_data['attendees']) >= operation_data['max_attendees']:
+            return "This operation is at maximum capacity!"
+        operation_data['attendees'][str(user.id)] = {
+            'username': member.display_name,
+            'joined_at': datetime.now().isoformat()
+        }
+        return None
+    
+    # Check and claim a spot atomically so two clicks can't both pass the capacity check
+    async with operation_lock(operation_id):
+        if data_store:
+            # Other processes take clicks too, so check against the stored
+            # row under the store's write lock
+            error = data_store.update_row(bot_data, 'active_operations', operation_id, claim_spot)
+        else:
+            error = claim_spot(bot_data['active_operations'].get(operation_id))
+        if error is None:
+            # Store username for future leaderboard use
+            remember_username(str(guild.id), str(user.id), member.display_name)
+            save_data(bot_data)
+        operation_data = bot_data['active_operations'].get(operation_id)
+    
+    if error:
+        await interaction.response.send_message(error, ephemeral=True)
+        return
+    
+    embed = operation_embed(operation_data)
+    
+    # Update the message first, the role can follow within the user edit budget
+    await interaction.response.edit_message(embed=embed)
+    
+    role_name = f"Operation_{operation_data['date']}"
+    role_given = rest_scheduler.submit(
+        'user_edit',
+        lambda: give_operation_role(guild, member, role_name),
+        resume=['operation_role', guild.id, member.id, role_name],
+        bucket=guild.id
+    )
+    
+    # Confirm straight away rather than after the role, which may be queued behind other edits
+    message = f"You have successfully joined the operation! You'll get the {role_name} role in a moment."
+    await rest_scheduler.run('interaction', lambda: interaction.followup.send(message, ephemeral=True))
+    
+    try:
+        await role_given
+    except Exception:
+        if rest_scheduler.closed:
+            # Saved at shutdown, the next start gives the role
+            return
+        # They're still on the attendee list, only the role is missing
+        message = f"You're on the attendee list, but I couldn't give you the {role_name} role. Please ask an admin to add it."
+        await rest_scheduler.run('interaction', lambda: interaction.followup.send(message, ephemeral=True))
+
+@app_commands.command(name="operation-start", description="Start a new operation (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.describe(
+    airport="Airport code", 
+    time="Operation time", 
+    date="Operation date",
+    description="Optional description or notes about the operation",
+    max_attendees="Maximum number of attendees (leave blank for unlimited)",
+    operation_type="Type of operation (e.g., Training, Event, Regular)",
+    duration="Minutes after the start to stop the operation automatically"
+)
+@app_commands.autocomplete(airport=airport_autocomplete)
+async def operation_start(
+    interaction: discord.Interaction, 
+    airport: str, 
+    time: str, 
+    date: str,
+    description: Optional[str] = None,
+    max_attendees: Optional[int] = None,
+    operation_type: Optional[str] = None,
+    duration: Optional[app_commands.Range[int, 1, 1440]] = None
+):
+    # Validate max_attendees
+    if max_attendees is not None and max_attendees < 1:
+        await interaction.response.send_message("Max attendees must be at least 1.", ephemeral=True)
+        return
+    
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    guild_id = str(interaction.guild.id)
+    config = bot_data['config'].get(guild_id, {})
+    airport = airport.strip().upper()
+    starts_at = parse_operation_start(time, date)
+    
+    if not config.get('operation_role_id') or not config.get('operation_channel_id'):
+        await interaction.response.send_message("Please run /setup first to configure the bot.", ephemeral=True)
+        return
+    
+    # Get role and channel
+    role = interaction.guild.get_role(config['operation_role_id'])
+    channel = interaction.guild.get_channel(config['operation_channel_id'])
+    
+    if not role:
+        await interaction.response.send_message("Operation role not found. Please run /setup again.", ephemeral=True)
+        return
+    
+    if not isinstance(channel, discord.TextChannel):
+        await interaction.response.send_message("Operation channel not found or is not a text channel. Please run /setup again.", ephemeral=True)
+        return
+    
+    async with guild_lock(guild_id):
+        # Check if there's already an active operation for this guild
+        already_active = any(op_id.startswith(f"{guild_id}_") for op_id in bot_data['active_operations'])
+        if not already_active:
+            # Create operation data
+            operation_id = f"{guild_id}_{datetime.now().timestamp()}"
+            operation_data = {
+                'airport': airport,
+                'time': time,
+                'date': date,
+                'description': description,
+                'max_attendees': max_attendees,
+                'operation_type': operation_type,
+                'started_by': interaction.user.id,
+                'started_at': datetime.now().isoformat(),
+                'starts_at': starts_at.isoformat() if starts_at else None,
+                'reminders_sent': [],
+                'attendees': {}
+            }
+            if duration:
+                auto_stop_at = (starts_at or datetime.now(timezone.utc)) + timedelta(minutes=duration)
+                operation_data['auto_stop_at'] = auto_stop_at.isoformat()
+            
+            airport_index(guild_id).add(airport)
+            bot_data['active_operations'][operation_id] = operation_data
+            save_data(bot_data)
+    
+    if already_active:
+        await interaction.response.send_message("There is already an active operation. Please stop it first with /operation-stop.", ephemeral=True)
+        return
+    
+    schedule_operation_timers(operation_id)
+    
+    embed = operation_embed(operation_data)
+    
+    # Send message with button
+    view = AttendButton(operation_id)
+    await channel.send(content=f"{role.mention} New operation starting!", embed=embed, view=view)
+    
+    reply = f"Operation started successfully in {channel.mention}!"
+    if starts_at and REMINDER_MINUTES:
+        reply += f"\nReminders will ping {role.mention} ahead of the start at <t:{int(starts_at.timestamp())}:F>."
+    elif not starts_at:
+        reply += "\nI couldn't work out a start time from that time and date (try something like `7:30 PM EST` and `12/25`), so no reminders will be sent."
+    if duration:
+        reply += f"\nIt will stop itself <t:{int(datetime.fromisoformat(operation_data['auto_stop_at']).timestamp())}:R>."
+    await interaction.response.send_message(reply, ephemeral=True)
+
+@app_commands.command(name="operation-stop", description="Stop the current operation (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+async def operation_stop(interaction: discord.Interaction):
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    
+    # The end notice and role cleanup are queued, so the reply isn't held up
+    if await stop_operations(interaction.guild):
+        await interaction.response.send_message("Operation stopped successfully!", ephemeral=True)
+    else:
+        await interaction.response.send_message("No active operation found.", ephemeral=True)
+
+for command in (operation_start, operation_stop):
+    command.error(admin_error)
+
+COMMANDS = (operation_start, operation_stop)
+
+async def setup(bot):
+    """Add this extension's commands to the tree; unloading removes them again"""
+    for command in COMMANDS:
+        bot.tree.add_command(command)
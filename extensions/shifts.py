@@ -0,0 +1,547 @@
+"""Shift commands: /shift, /shift-start, /shift-manage, /shift-end-all and /links, and their buttons and modals"""
+import discord
+from discord import app_commands
+import csv
+import io
+from datetime import datetime
+from typing import Optional
+
+from discord_bot import (
+    MAX_BREAK_MINUTES, MAX_SHIFT_HOURS, ShiftManageView,
+    ShiftManagementView, admin_error, airport_autocomplete, airport_index,
+    bot, bot_data, close_shift, display_name_for, fetch_member, guild_changed,
+    guild_lock, parse_user_reference, post_leaderboard, refresh_leaderboard,
+    remember_username, rest_scheduler, save_data, schedule_shift_expiry,
+    schedule_status_board_update,
+)
+
+async def clock_in(interaction: discord.Interaction, airport: str):
+    """Start the user's shift, from the Start Shift modal or /shift-start"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    guild_id = str(interaction.guild.id)
+    user_id = str(interaction.user.id)
+    airport = airport.strip().upper()
+    
+    # Get member for display_name
+    member = interaction.user if isinstance(interaction.user, discord.Member) else interaction.guild.get_member(interaction.user.id)
+    display_name = member.display_name if member else interaction.user.name
+    
+    async with guild_lock(guild_id):
+        # Initialize data structures if needed
+        if guild_id not in bot_data['shifts']:
+            bot_data['shifts'][guild_id] = {}
+        
+        # Check if user is already clocked in
+        already_clocked_in = user_id in bot_data['shifts'][guild_id]
+        if not already_clocked_in:
+            remember_username(guild_id, user_id, display_name)
+            airport_index(guild_id).add(airport)
+            
+            # Clock in the user
+            bot_data['shifts'][guild_id][user_id] = {
+                'airport': airport,
+                'start_time': datetime.now().isoformat(),
+                'username': display_name,
+                'on_break': False,
+                'total_break_time': 0
+            }
+            guild_changed(guild_id)
+            
+            save_data(bot_data)
+    
+    if already_clocked_in:
+        await interaction.response.send_message("You are already clocked in! Use 'End Shift' to finish your current shift first.", ephemeral=True)
+        return
+    
+    schedule_shift_expiry(guild_id, user_id)
+    
+    # Update status board once the reply is out of the way
+    schedule_status_board_update(interaction.guild)
+    
+    embed = discord.Embed(
+        title="⏰ Shift Started",
+        description=f"You have successfully started your shift at **{airport}**",
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="Have a great shift!")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def end_shift(interaction: discord.Interaction):
+    """Clock the user out from the shift menu"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    guild_id = str(interaction.guild.id)
+    user_id = str(interaction.user.id)
+    
+    async with guild_lock(guild_id):
+        # Check if user is clocked in
+        if guild_id not in bot_data['shifts'] or user_id not in bot_data['shifts'][guild_id]:
+            shift_data = None
+        else:
+            shift_data, duration_minutes = close_shift(guild_id, user_id)
+            
+            # Store username
+            member = interaction.user if isinstance(interaction.user, discord.Member) else interaction.guild.get_member(interaction.user.id)
+            if member:
+                remember_username(guild_id, user_id, member.display_name)
+            
+            airport = shift_data['airport']
+            save_data(bot_data)
+    
+    if shift_data is None:
+        await interaction.response.send_message("You are not currently clocked in!", ephemeral=True)
+        return
+    
+    # Update status board once the reply is out of the way
+    schedule_status_board_update(interaction.guild)
+    
+    # Format duration
+    hours = duration_minutes // 60
+    minutes = duration_minutes % 60
+    
+    embed = discord.Embed(
+        title="⏰ Shift Ended",
+        description=f"You have successfully ended your shift at **{airport}**\n\n**Shift Duration:** {hours}h {minutes}m",
+        color=discord.Color.red(),
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="Thanks for your service!")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def start_break(interaction: discord.Interaction):
+    """Pause the user's shift timer"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    guild_id = str(interaction.guild.id)
+    user_id = str(interaction.user.id)
+    
+    error = None
+    async with guild_lock(guild_id):
+        # Check if user is clocked in
+        if guild_id not in bot_data['shifts'] or user_id not in bot_data['shifts'][guild_id]:
+            error = "You need to be clocked in to take a break!"
+        # Check if already on break
+        elif bot_data['shifts'][guild_id][user_id].get('on_break'):
+            error = "You are already on break!"
+        else:
+            # Start break
+            shift_data = bot_data['shifts'][guild_id][user_id]
+            shift_data['on_break'] = True
+            shift_data['break_start'] = datetime.now().isoformat()
+            guild_changed(guild_id)
+            save_data(bot_data)
+    
+    if error:
+        await interaction.response.send_message(error, ephemeral=True)
+        return
+    
+    schedule_shift_expiry(guild_id, user_id)
+    
+    # Update status board once the reply is out of the way
+    schedule_status_board_update(interaction.guild)
+    
+    embed = discord.Embed(
+        title="☕ Break Started",
+        description="Enjoy your break! Remember to end it when you're back.",
+        color=discord.Color.orange(),
+        timestamp=datetime.now()
+    )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def end_break(interaction: discord.Interaction):
+    """Resume the user's shift after a break"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    guild_id = str(interaction.guild.id)
+    user_id = str(interaction.user.id)
+    
+    error = None
+    async with guild_lock(guild_id):
+        # Check if user is clocked in
+        if guild_id not in bot_data['shifts'] or user_id not in bot_data['shifts'][guild_id]:
+            error = "You need to be clocked in!"
+        # Check if on break
+        elif not bot_data['shifts'][guild_id][user_id].get('on_break'):
+            error = "You are not currently on break!"
+        else:
+            shift_data = bot_data['shifts'][guild_id][user_id]
+            
+            # Calculate break duration
+            break_start = datetime.fromisoformat(shift_data['break_start'])
+            break_end = datetime.now()
+            break_duration = int((break_end - break_start).total_seconds() / 60)
+            
+            # Add to total break time
+            if 'total_break_time' not in shift_data:
+                shift_data['total_break_time'] = 0
+            shift_data['total_break_time'] += break_duration
+            
+            # End break
+            shift_data['on_break'] = False
+            del shift_data['break_start']
+            guild_changed(guild_id)
+            save_data(bot_data)
+    
+    if error:
+        await interaction.response.send_message(error, ephemeral=True)
+        return
+    
+    schedule_shift_expiry(guild_id, user_id)
+    
+    # Update status board once the reply is out of the way
+    schedule_status_board_update(interaction.guild)
+    
+    embed = discord.Embed(
+        title="▶️ Break Ended",
+        description=f"Welcome back! Your break lasted {break_duration} minutes.",
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def update_leaderboard(interaction: discord.Interaction):
+    """Post or refresh the leaderboard from the /shift-manage button"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    config = bot_data['config'].get(str(interaction.guild.id), {})
+    leaderboard_channel_id = config.get('leaderboard_channel')
+    
+    if not leaderboard_channel_id:
+        await interaction.response.send_message("Leaderboard channel not configured. Use /setup first.", ephemeral=True)
+        return
+    
+    channel = bot.get_channel(leaderboard_channel_id)
+    if not isinstance(channel, discord.TextChannel):
+        await interaction.response.send_message("Leaderboard channel not found or is not a text channel.", ephemeral=True)
+        return
+    
+    # The edit can wait behind other queued work for longer than Discord
+    # gives us to respond, so acknowledge first
+    await interaction.response.defer(ephemeral=True)
+    guild = interaction.guild
+    updated = await rest_scheduler.run('user_edit', lambda: post_leaderboard(guild, channel), key=('leaderboard', guild.id), bucket=guild.id)
+    if updated:
+        await interaction.followup.send("Leaderboard updated!", ephemeral=True)
+    else:
+        await interaction.followup.send("New leaderboard posted!", ephemeral=True)
+
+async def add_time(interaction: discord.Interaction, user_text, minutes_text):
+    """Add minutes to a user's total, from the Add Time modal"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    try:
+        # Parse user
+        user_id = parse_user_reference(user_text)
+        
+        user = await fetch_member(interaction.guild, user_id)
+        if not user:
+            await interaction.response.send_message("User not found.", ephemeral=True)
+            return
+        
+        # Parse time
+        minutes = int(minutes_text)
+        
+        guild_id = str(interaction.guild.id)
+        user_id_str = str(user_id)
+        
+        async with guild_lock(guild_id):
+            # Store username for leaderboard
+            remember_username(guild_id, user_id_str, user.display_name)
+            
+            if guild_id not in bot_data['shift_totals']:
+                bot_data['shift_totals'][guild_id] = {}
+            
+            if user_id_str not in bot_data['shift_totals'][guild_id]:
+                bot_data['shift_totals'][guild_id][user_id_str] = 0
+            
+            bot_data['shift_totals'][guild_id][user_id_str] += minutes
+            guild_changed(guild_id)
+            save_data(bot_data)
+        
+        await interaction.response.send_message(f"Added {minutes} minutes to {user.display_name}'s total time.", ephemeral=True)
+        
+    except ValueError:
+        await interaction.response.send_message("Invalid input. Please check your values.", ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
+
+async def remove_time(interaction: discord.Interaction, user_text, minutes_text):
+    """Take minutes off a user's total, from the Remove Time modal"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    try:
+        # Parse user
+        user_id = parse_user_reference(user_text)
+        
+        user = await fetch_member(interaction.guild, user_id)
+        if not user:
+            await interaction.response.send_message("User not found.", ephemeral=True)
+            return
+        
+        # Parse time
+        minutes = int(minutes_text)
+        
+        guild_id = str(interaction.guild.id)
+        user_id_str = str(user_id)
+        
+        async with guild_lock(guild_id):
+            # Store username for leaderboard
+            remember_username(guild_id, user_id_str, user.display_name)
+            
+            if guild_id not in bot_data['shift_totals']:
+                bot_data['shift_totals'][guild_id] = {}
+            
+            if user_id_str not in bot_data['shift_totals'][guild_id]:
+                bot_data['shift_totals'][guild_id][user_id_str] = 0
+            
+            bot_data['shift_totals'][guild_id][user_id_str] = max(0, bot_data['shift_totals'][guild_id][user_id_str] - minutes)
+            guild_changed(guild_id)
+            save_data(bot_data)
+        
+        await interaction.response.send_message(f"Removed {minutes} minutes from {user.display_name}'s total time.", ephemeral=True)
+        
+    except ValueError:
+        await interaction.response.send_message("Invalid input. Please check your values.", ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
+
+async def end_user_shift(interaction: discord.Interaction, user_text):
+    """End someone else's shift, from the End Shift modal"""
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    
+    try:
+        # Parse user
+        user_id = parse_user_reference(user_text)
+        
+        user = await fetch_member(interaction.guild, user_id)
+        if not user:
+            await interaction.response.send_message("User not found.", ephemeral=True)
+            return
+        
+        guild_id = str(interaction.guild.id)
+        user_id_str = str(user_id)
+        duration = None
+        
+        async with guild_lock(guild_id):
+            # Store username for leaderboard
+            remember_username(guild_id, user_id_str, user.display_name)
+            
+            if guild_id in bot_data['shifts'] and user_id_str in bot_data['shifts'][guild_id]:
+                _, duration = close_shift(guild_id, user_id_str)
+                save_data(bot_data)
+        
+        if duration is not None:
+            await interaction.response.send_message(f"Ended {user.display_name}'s shift. Duration: {duration} minutes.", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"{user.display_name} doesn't have an active shift.", ephemeral=True)
+        
+    except ValueError:
+        await interaction.response.send_message("Invalid input. Please check your values.", ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
+
+def shift_expired_embed(guild, shift_data, duration_minutes, reason):
+    """The DM telling a user their shift was ended for them"""
+    if reason == 'break':
+        why = f"your break went past {MAX_BREAK_MINUTES:g} minutes"
+    else:
+        why = f"it went past {MAX_SHIFT_HOURS:g} hours"
+    
+    embed = discord.Embed(
+        title="⏰ Shift Ended Automatically",
+        description=f"Your shift at **{shift_data['airport']}** in **{guild.name}** was ended because {why}.\n\n**Time Counted:** {duration_minutes // 60}h {duration_minutes % 60}m",
+        color=discord.Color.red(),
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="Ask an admin to adjust your time if this is wrong")
+    return embed
+
+@app_commands.command(name="shift", description="Manage your shift (start, end, breaks)")
+@app_commands.guild_only()
+async def shift_management(interaction: discord.Interaction):
+    view = ShiftManagementView()
+    
+    embed = discord.Embed(
+        title="🔧 Shift Management",
+        description="Choose an option below to manage your shift:",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="🟢 Start Shift", value="Begin working at an airport", inline=True)
+    embed.add_field(name="🔴 End Shift", value="Finish your current shift", inline=True)
+    embed.add_field(name="☕ Start Break", value="Take a break (pauses shift timer)", inline=True)
+    embed.add_field(name="▶️ End Break", value="Resume work after break", inline=True)
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+@app_commands.command(name="shift-start", description="Start a shift at an airport")
+@app_commands.guild_only()
+@app_commands.describe(airport="Airport code (e.g., IRFD)")
+@app_commands.autocomplete(airport=airport_autocomplete)
+async def shift_start(interaction: discord.Interaction, airport: app_commands.Range[str, 1, 10]):
+    await clock_in(interaction, airport)
+
+@app_commands.command(name="links", description="Get useful links for ATC24 PTFS Ground Crew")
+@app_commands.guild_only()
+async def links_command(interaction: discord.Interaction):
+    embed = discord.Embed(
+        title="🔗 ATC24 PTFS Ground Crew Links",
+        description="Here are the essential links for our ground crew operations:",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    
+    embed.add_field(
+        name="📚 Ground Crew Guide",
+        value="[Click here to access the guide](https://drive.google.com/file/d/1a7ek3QyG4efP2GQNdH3pwk_aOdNL8GYY/view?usp=sharing)",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="✈️ My Plane",
+        value="[Click here to access My Plane](https://myplane.onrender.com)",
+        inline=False
+    )
+    
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@app_commands.command(name="shift-manage", description="Manage shifts (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+async def shift_manage(interaction: discord.Interaction):
+    
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    guild_id = str(interaction.guild.id)
+    
+    # Get active shifts
+    active_shifts = bot_data['shifts'].get(guild_id, {})
+    
+    embed = discord.Embed(
+        title="🔧 Shift Management Dashboard",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    
+    if active_shifts:
+        shift_list = []
+        for user_id, shift_data in active_shifts.items():
+            username = display_name_for(interaction.guild, user_id, shift_data.get('username'))
+            start_time = datetime.fromisoformat(shift_data['start_time'])
+            duration = datetime.now() - start_time
+            duration_minutes = int(duration.total_seconds() / 60)
+            hours = duration_minutes // 60
+            minutes = duration_minutes % 60
+            
+            shift_list.append(f"• **{username}** at {shift_data['airport']} ({hours}h {minutes}m)")
+        
+        embed.add_field(name=f"Active Shifts ({len(active_shifts)})", value="\n".join(shift_list), inline=False)
+    else:
+        embed.add_field(name="Active Shifts (0)", value="No active shifts", inline=False)
+    
+    embed.set_footer(text="Use the buttons below to manage shifts")
+    
+    view = ShiftManageView()
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+@app_commands.command(name="shift-end-all", description="End every active shift, e.g. at the end of an event (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.describe(airport="Only end shifts at this airport")
+@app_commands.autocomplete(airport=airport_autocomplete)
+async def shift_end_all(interaction: discord.Interaction, airport: Optional[app_commands.Range[str, 1, 10]] = None):
+    
+    # Guild is guaranteed to exist due to @app_commands.guild_only()
+    assert interaction.guild is not None
+    guild = interaction.guild
+    guild_id = str(guild.id)
+    if airport:
+        airport = airport.strip().upper()
+    
+    # End the whole batch at the same moment with a single save
+    ended = []
+    async with guild_lock(guild_id):
+        end_time = datetime.now()
+        for user_id, shift_data in list(bot_data['shifts'].get(guild_id, {}).items()):
+            if airport and shift_data['airport'].strip().upper() != airport:
+                continue
+            shift_data, duration_minutes = close_shift(guild_id, user_id, end_time=end_time)
+            ended.append((user_id, shift_data, duration_minutes))
+        if ended:
+            save_data(bot_data)
+    
+    if not ended:
+        where = f" at **{airport}**" if airport else ""
+        await interaction.response.send_message(f"Nobody is clocked in{where}.", ephemeral=True)
+        return
+    
+    # One board refresh and one leaderboard refresh for the whole batch
+    schedule_status_board_update(guild)
+    rest_scheduler.submit('user_edit', lambda: refresh_leaderboard(guild), key=('leaderboard', guild.id), resume=['leaderboard', guild.id], bucket=guild.id)
+    
+    ended.sort(key=lambda entry: entry[2], reverse=True)
+    summary_lines = []
+    for user_id, shift_data, duration_minutes in ended[:25]:
+        name = display_name_for(guild, user_id, shift_data.get('username', user_id))
+        summary_lines.append(f"• **{name}** at {shift_data['airport']} - {duration_minutes // 60}h {duration_minutes % 60}m")
+    if len(ended) > 25:
+        summary_lines.append(f"...and {len(ended) - 25} more, see the attached file")
+    total_minutes = sum(duration_minutes for _, _, duration_minutes in ended)
+    
+    embed = discord.Embed(
+        title="🔴 Shifts Ended",
+        description="\n".join(summary_lines)[:4000],
+        color=discord.Color.red(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Shifts Ended", value=str(len(ended)), inline=True)
+    embed.add_field(name="Total Time", value=f"{total_minutes // 60}h {total_minutes % 60}m", inline=True)
+    if airport:
+        embed.add_field(name="Airport", value=airport, inline=True)
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    
+    # Everyone who was clocked out, as a CSV attachment
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['user_id', 'username', 'airport', 'start_time', 'end_time', 'minutes'])
+    for user_id, shift_data, duration_minutes in ended:
+        name = display_name_for(guild, user_id, shift_data.get('username', ''))
+        writer.writerow([user_id, name, shift_data['airport'], shift_data['start_time'], end_time.isoformat(), duration_minutes])
+    ended_file = discord.File(io.BytesIO(output.getvalue().encode('utf-8')), filename="shifts_ended.csv")
+    
+    await interaction.response.send_message(embed=embed, file=ended_file, ephemeral=True)
+
+for command in (shift_manage, shift_end_all):
+    command.error(admin_error)
+
+COMMANDS = (shift_management, shift_start, links_command, shift_manage, shift_end_all)
+
+async def setup(bot):
+    """Add this extension's commands to the tree; unloading removes them again"""
+    for command in COMMANDS:
+        bot.tree.add_command(command)
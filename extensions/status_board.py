@@ -0,0 +1,62 @@
+"""The live status board embed, kept here so /reload can change its layout"""
+import discord
+from datetime import datetime
+
+from discord_bot import (
+    board_duration_step, bot_data, display_name_for,
+)
+
+async def render_status_board_embed(guild):
+    """Build the guild's status board embed; generate_status_board_embed caches it"""
+    guild_id = str(guild.id)
+    
+    active_shifts = bot_data['shifts'].get(guild_id, {})
+    
+    embed = discord.Embed(
+        title="📊 Live Status Board",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    
+    if not active_shifts:
+        embed.description = "No one is currently on shift."
+        embed.set_footer(text="ATC24 PTFS Ground Crew • Updates automatically")
+        return embed
+    
+    on_duty = []
+    on_break = []
+    
+    for user_id, shift_data in active_shifts.items():
+        username = display_name_for(guild, user_id, shift_data.get('username'))
+        
+        start_time = datetime.fromisoformat(shift_data['start_time'])
+        duration = datetime.now() - start_time
+        duration_minutes = int(duration.total_seconds() / 60)
+        # Long shifts are shown more coarsely, so their boards change less often
+        duration_minutes -= duration_minutes % board_duration_step(duration_minutes)
+        hours = duration_minutes // 60
+        minutes = duration_minutes % 60
+        
+        shift_info = f"• **{username}** at {shift_data['airport']} ({hours}h {minutes}m)"
+        
+        if shift_data.get('on_break'):
+            break_start = datetime.fromisoformat(shift_data['break_start'])
+            break_duration = int((datetime.now() - break_start).total_seconds() / 60)
+            shift_info += f" - *Break: {break_duration}m*"
+            on_break.append(shift_info)
+        else:
+            on_duty.append(shift_info)
+    
+    if on_duty:
+        embed.add_field(name=f"🟢 On Duty ({len(on_duty)})", value="\n".join(on_duty), inline=False)
+    
+    if on_break:
+        embed.add_field(name=f"☕ On Break ({len(on_break)})", value="\n".join(on_break), inline=False)
+    
+    embed.set_footer(text="ATC24 PTFS Ground Crew • Updates automatically")
+    return embed
+
+COMMANDS = ()
+
+async def setup(bot):
+    """Nothing to register - the core looks the renderer up through discord_bot.extension"""
@@ -0,0 +1,37 @@
+"""The welcome embed for new members, kept here so /reload can change its wording"""
+import discord
+from datetime import datetime
+
+def welcome_embed(mentions):
+    """The welcome embed for one or more new members"""
+    if len(mentions) == 1:
+        description = f"Welcome {mentions[0]}! We're excited to have you join our ground crew team."
+    else:
+        description = f"Welcome {', '.join(mentions)}! We're excited to have you all join our ground crew team."
+    
+    embed = discord.Embed(
+        title="🎉 Welcome to ATC24 PTFS Ground Crew!",
+        description=description,
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    
+    embed.add_field(
+        name="📚 Getting Started",
+        value="Use `/links` to access the Ground Crew Guide and important resources.",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="⏰ Shift Management",
+        value="Use `/shift` to start working and track your hours.",
+        inline=False
+    )
+    
+    embed.set_footer(text="ATC24 PTFS Ground Crew")
+    return embed
+
+COMMANDS = ()
+
+async def setup(bot):
+    """Nothing to register - the core looks the embed up through discord_bot.extension"""
@@ -0,0 +1,1083 @@
+"""Local load testing for the Ground Crew bot.
+
+Runs the real handlers from discord_bot.py against a local stand-in for the
+Discord REST API, so throughput can be measured without a live Discord. The
+stand-in serves the endpoints the bot uses (messages, roles, interaction
+callbacks and followups), answers with rate-limit headers and 429s like the
+real API, and plays the gateway's part by injecting guilds, role events and
+interactions straight into the bot's connection state. The http scenario
+instead signs requests with a generated keypair and sends them to the bot's
+HTTP interactions endpoint, with no gateway cache at all.
+
+Each scenario reports interaction acknowledgement latency, REST calls per
+route and how much time the bot spent persisting data.
+
+Usage:
+    python loadtest.py attend --clicks 500 --seconds 10
+    python loadtest.py shift-start --users 200
+    python loadtest.py stress --clicks 3000 --cycles 2000
+    python loadtest.py status-boards --guilds 100
+    python loadtest.py http --users 50
+
+The bot runs inside a temporary directory, so bot_data.json is never touched.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+import discord
+
+API_PREFIX = '/api/v10'
+
+# (method, route) -> (requests, per seconds), keyed per major parameter like Discord does.
+# Everything else shares DEFAULT_RATE_LIMIT. Interaction callbacks aren't rate limited.
+RATE_LIMITS = {
+    ('POST', '/channels/{channel_id}/messages'): (5, 5.0),
+    ('PATCH', '/channels/{channel_id}/messages/{message_id}'): (5, 5.0),
+    ('POST', '/guilds/{guild_id}/roles'): (10, 10.0),
+    ('DELETE', '/guilds/{guild_id}/roles/{role_id}'): (10, 10.0),
+    ('PUT', '/guilds/{guild_id}/members/{user_id}/roles/{role_id}'): (10, 1.0),
+}
+DEFAULT_RATE_LIMIT = (50, 1.0)
+GLOBAL_RATE_LIMIT = (50, 1.0)
+MAJOR_PARAMETERS = ('channel_id', 'guild_id', 'webhook_token')
+
+
+def json_response(data, status=200, headers=None):
+    """A JSON response with the exact Content-Type discord.py checks for"""
+    headers = dict(headers or {})
+    headers['Content-Type'] = 'application/json'
+    return web.Response(body=json.dumps(data).encode('utf-8'), status=status, headers=headers)
+
+
+class Bucket:
+    """A fixed-window rate limit bucket, the way Discord reports them"""
+
+    def __init__(self, name, limit, per):
+        self.name = name
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self, now):
+        """Use one request, returning 0 if allowed or the seconds to wait if not"""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining <= 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return 0
+
+    def headers(self, now):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': f"{time.time() + max(0.0, self.reset_at - now):.3f}",
+            'X-RateLimit-Reset-After': f"{max(0.0, self.reset_at - now):.3f}",
+            'X-RateLimit-Bucket': self.name,
+        }
+
+
+class FakeDiscord:
+    """A local stand-in for the parts of the Discord API the bot uses"""
+
+    def __init__(self, rate_limits=True, latency=0.0):
+        self.rate_limits = rate_limits
+        self.latency = latency
+        self.ids = itertools.count(1_100_000_000_000_000_000)
+        self.bot_user = {'id': str(self.next_id()), 'username': 'GroundCrewBot', 'discriminator': '0', 'avatar': None, 'bot': True}
+        self.state = None
+        self.base_url = None
+        # False when the bot under test has no gateway connection (HTTP interactions)
+        self.gateway = True
+
+        self.guilds = {}
+
+        self.messages = {}
+        self.channel_messages = defaultdict(list)
+        self.interactions = {}
+        self.originals = {}
+
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        # (method, route) -> extra seconds, to widen races around calls the bot makes under a lock
+        self.route_latency = {}
+        # guild_id -> roles created in it
+        self.roles_created = Counter()
+        self.buckets = {}
+        self.global_bucket = Bucket('global', *GLOBAL_RATE_LIMIT)
+        self.in_flight = 0
+        self.last_request = time.perf_counter()
+
+        self.app = web.Application(middlewares=[self.middleware])
+        routes = [
+            ('GET', '/users/@me', self.get_current_user),
+            ('GET', '/oauth2/applications/@me', self.get_application),
+            ('POST', '/interactions/{interaction_id}/{webhook_token}/callback', self.interaction_callback),
+            ('POST', '/webhooks/{application_id}/{webhook_token}', self.create_followup),
+            ('GET', '/webhooks/{application_id}/{webhook_token}/messages/{message_id}', self.get_webhook_message),
+            ('PATCH', '/webhooks/{application_id}/{webhook_token}/messages/{message_id}', self.edit_webhook_message),
+            ('POST', '/channels/{channel_id}/messages', self.create_message),
+            ('GET', '/channels/{channel_id}/messages', self.channel_history),
+            ('GET', '/channels/{channel_id}/messages/{message_id}', self.get_message),
+            ('PATCH', '/channels/{channel_id}/messages/{message_id}', self.edit_message),
+            ('POST', '/guilds/{guild_id}/roles', self.create_role),
+            ('DELETE', '/guilds/{guild_id}/roles/{role_id}', self.delete_role),
+            ('PUT', '/guilds/{guild_id}/members/{user_id}/roles/{role_id}', self.add_member_role),
+            ('GET', '/guilds/{guild_id}/members/{user_id}', self.get_member),
+            ('GET', '/guilds/{guild_id}', self.get_guild),
+            ('GET', '/guilds/{guild_id}/channels', self.get_guild_channels),
+        ]
+        for method, path, handler in routes:
+            self.app.router.add_route(method, API_PREFIX + path, handler)
+
+    def next_id(self):
+        return next(self.ids)
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}{API_PREFIX}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        self.in_flight += 1
+        try:
+            route = request.match_info.route.resource.canonical[len(API_PREFIX):] if request.match_info.route.resource else request.path
+            key = (request.method, route)
+            self.calls[key] += 1
+            latency = self.latency + self.route_latency.get(key, 0)
+            if latency:
+                await asyncio.sleep(latency)
+
+            headers = {}
+            if self.rate_limits and not route.startswith('/interactions/'):
+                now = time.monotonic()
+                major = next((request.match_info[name] for name in MAJOR_PARAMETERS if name in request.match_info), '')
+                bucket = self.buckets.get((key, major))
+                if bucket is None:
+                    limit, per = RATE_LIMITS.get(key, DEFAULT_RATE_LIMIT)
+                    bucket = self.buckets[(key, major)] = Bucket(f"{len(self.buckets):x}", limit, per)
+                retry_after = self.global_bucket.take(now)
+                is_global = retry_after > 0
+                if not is_global:
+                    retry_after = bucket.take(now)
+                if retry_after:
+                    self.rate_limited[key] += 1
+                    headers = bucket.headers(now)
+                    headers['Retry-After'] = f"{retry_after:.3f}"
+                    headers['X-RateLimit-Scope'] = 'global' if is_global else 'user'
+                    if is_global:
+                        headers['X-RateLimit-Global'] = 'true'
+                    body = {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': is_global}
+                    return json_response(body, status=429, headers=headers)
+                headers = bucket.headers(now)
+
+            response = await handler(request)
+            response.headers.update(headers)
+            return response
+        finally:
+            self.in_flight -= 1
+            self.last_request = time.perf_counter()
+
+    async def wait_idle(self, quiet=0.5, timeout=120):
+        """Wait until no request has been made for `quiet` seconds and the bot has nothing queued"""
+        deadline = time.perf_counter() + timeout
+        scheduler = sys.modules['discord_bot'].rest_scheduler
+        while time.perf_counter() < deadline:
+            queued = scheduler.running + sum(len(queue) for queue in scheduler.queues.values())
+            if self.in_flight == 0 and not queued and time.perf_counter() - self.last_request >= quiet:
+                return
+            await asyncio.sleep(0.05)
+
+    @staticmethod
+    async def read_body(request):
+        """Read a JSON or multipart request body"""
+        if request.content_type.startswith('multipart/'):
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == 'payload_json':
+                    return json.loads(await part.text())
+            return {}
+        if request.can_read_body:
+            return await request.json()
+        return {}
+
+    # Messages
+
+    def message_payload(self, channel_id, body, flags=0):
+        message = {
+            'id': str(self.next_id()),
+            'channel_id': str(channel_id),
+            'type': 0,
+            'content': body.get('content') or '',
+            'author': self.bot_user,
+            'embeds': body.get('embeds') or [],
+            'components': body.get('components') or [],
+            'attachments': [],
+            'mentions': [],
+            'mention_roles': [],
+            'mention_everyone': False,
+            'pinned': False,
+            'tts': False,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'edited_timestamp': None,
+            'flags': body.get('flags', flags) or 0,
+        }
+        self.messages[message['id']] = message
+        # Ephemeral messages don't show up in channel history
+        if not message['flags'] & 64:
+            self.channel_messages[str(channel_id)].append(message['id'])
+        return message
+
+    def add_message(self, channel_id, body):
+        """Seed a message as if the bot had posted it earlier"""
+        return self.message_payload(channel_id, body)
+
+    def apply_edit(self, message, body):
+        for field in ('content', 'embeds', 'components', 'flags'):
+            if field in body and body[field] is not None:
+                message[field] = body[field]
+        message['edited_timestamp'] = datetime.now(timezone.utc).isoformat()
+        return message
+
+    async def create_message(self, request):
+        body = await self.read_body(request)
+        return json_response(self.message_payload(request.match_info['channel_id'], body))
+
+    async def channel_history(self, request):
+        limit = int(request.query.get('limit', 50))
+        ids = self.channel_messages.get(request.match_info['channel_id'], [])
+        return json_response([self.messages[i] for i in reversed(ids[-limit:])])
+
+    async def get_message(self, request):
+        message = self.messages.get(request.match_info['message_id'])
+        if message is None or message['channel_id'] != request.match_info['channel_id']:
+            return json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return json_response(message)
+
+    async def edit_message(self, request):
+        message = self.messages.get(request.match_info['message_id'])
+        if message is None:
+            return json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return json_response(self.apply_edit(message, await self.read_body(request)))
+
+    # Interactions
+
+    def register_interaction(self, payload):
+        record = self.interactions[payload['token']] = {
+            'id': payload['id'],
+            'token': payload['token'],
+            'channel_id': payload['channel_id'],
+            'message_id': payload.get('message', {}).get('id'),
+            'dispatched_at': time.perf_counter(),
+            'acked_at': None,
+            'future': asyncio.get_running_loop().create_future(),
+        }
+        return record
+
+    async def interaction_callback(self, request):
+        body = await self.read_body(request)
+        interaction = self.interactions.get(request.match_info['webhook_token'])
+        if interaction is None:
+            return json_response({'message': 'Unknown interaction', 'code': 10062}, status=404)
+        if interaction['acked_at'] is not None:
+            return json_response({'message': 'Interaction has already been acknowledged.', 'code': 40060}, status=400)
+        interaction['acked_at'] = time.perf_counter()
+
+        response_type = body.get('type')
+        data = body.get('data') or {}
+        message = None
+        if response_type == 4:
+            message = self.message_payload(interaction['channel_id'], data)
+            self.originals[request.match_info['webhook_token']] = message['id']
+        elif response_type == 5:
+            message = self.message_payload(interaction['channel_id'], {'flags': data.get('flags', 0) | 128})
+            self.originals[request.match_info['webhook_token']] = message['id']
+        elif response_type == 7 and interaction['message_id'] in self.messages:
+            message = self.apply_edit(self.messages[interaction['message_id']], data)
+
+        result = {
+            'interaction': {
+                'id': interaction['id'],
+                'type': 2,
+                'response_message_id': message['id'] if message else None,
+                'response_message_loading': response_type == 5,
+                'response_message_ephemeral': bool(data.get('flags', 0) & 64),
+            },
+        }
+        if message is not None:
+            result['resource'] = {'type': response_type, 'message': message}
+        if not interaction['future'].done():
+            interaction['future'].set_result(body)
+        return json_response(result)
+
+    async def create_followup(self, request):
+        body = await self.read_body(request)
+        interaction = self.interactions.get(request.match_info['webhook_token'], {})
+        return json_response(self.message_payload(interaction.get('channel_id', 0), body))
+
+    def webhook_message(self, request):
+        message_id = request.match_info['message_id']
+        if message_id == '@original':
+            message_id = self.originals.get(request.match_info['webhook_token'])
+        return self.messages.get(message_id)
+
+    async def get_webhook_message(self, request):
+        message = self.webhook_message(request)
+        if message is None:
+            return json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return json_response(message)
+
+    async def edit_webhook_message(self, request):
+        message = self.webhook_message(request)
+        if message is None:
+            return json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return json_response(self.apply_edit(message, await self.read_body(request)))
+
+    # Roles and members, echoed back to the bot as gateway events
+
+    async def create_role(self, request):
+        body = await self.read_body(request)
+        self.roles_created[request.match_info['guild_id']] += 1
+        role = {
+            'id': str(self.next_id()),
+            'name': body.get('name', 'new role'),
+            'color': body.get('color', 0),
+            'hoist': False,
+            'position': 1,
+            'permissions': str(body.get('permissions', 0)),
+            'managed': False,
+            'mentionable': False,
+            'flags': 0,
+        }
+        if self.gateway:
+            self.state.parse_guild_role_create({'guild_id': request.match_info['guild_id'], 'role': role})
+        return json_response(role)
+
+    async def delete_role(self, request):
+        if self.gateway:
+            self.state.parse_guild_role_delete({'guild_id': request.match_info['guild_id'], 'role_id': request.match_info['role_id']})
+        return web.Response(status=204)
+
+    async def add_member_role(self, request):
+        return web.Response(status=204)
+
+    async def get_member(self, request):
+        return json_response(member_payload(int(request.match_info['user_id'])))
+
+    async def get_guild(self, request):
+        guild = self.guilds.get(request.match_info['guild_id'])
+        if guild is None:
+            return json_response({'message': 'Unknown Guild', 'code': 10004}, status=404)
+        return json_response({key: value for key, value in guild.items() if key not in ('channels', 'members')})
+
+    async def get_guild_channels(self, request):
+        guild = self.guilds.get(request.match_info['guild_id'], {})
+        return json_response(guild.get('channels', []))
+
+    async def get_current_user(self, request):
+        return json_response(self.bot_user)
+
+    async def get_application(self, request):
+        return json_response({
+            'id': self.bot_user['id'],
+            'name': self.bot_user['username'],
+            'icon': None,
+            'description': '',
+            'bot_public': True,
+            'bot_require_code_grant': False,
+            'owner': {'id': '1', 'username': 'owner', 'discriminator': '0', 'avatar': None},
+            'verify_key': '',
+            'flags': 0,
+        })
+
+
+def user_payload(user_id):
+    return {'id': str(user_id), 'username': f"crew{user_id % 100000}", 'discriminator': '0', 'avatar': None, 'global_name': None}
+
+
+def member_payload(user_id, permissions='0'):
+    return {
+        'user': user_payload(user_id),
+        'roles': [],
+        'joined_at': datetime.now(timezone.utc).isoformat(),
+        'deaf': False,
+        'mute': False,
+        'nick': None,
+        'flags': 0,
+        'permissions': permissions,
+    }
+
+
+class LoadGenerator:
+    """Drives the bot's handlers with simulated gateway events"""
+
+    ADMIN_PERMISSIONS = str(discord.Permissions.all().value)
+
+    def __init__(self, bot_module, fake):
+        self.module = bot_module
+        self.bot = bot_module.bot
+        self.state = bot_module.bot._connection
+        self.fake = fake
+        self.user_ids = itertools.count(2_000_000_000_000_000_000)
+        # Set by use_endpoint() to send interactions as signed HTTP requests
+        self.endpoint = None
+        self.signing_key = None
+        self.session = None
+        self.pending = set()
+
+    def use_endpoint(self, url, signing_key, session):
+        """Deliver interactions to the bot's HTTP endpoint instead of its gateway handler"""
+        self.endpoint = url
+        self.signing_key = signing_key
+        self.session = session
+        self.fake.gateway = False
+
+    async def post_signed(self, body, valid=True):
+        """POST a body to the endpoint signed with the test keypair, returning (status, text)"""
+        timestamp = str(int(time.time()))
+        signature = self.signing_key.sign(timestamp.encode() + body).signature.hex()
+        if not valid:
+            signature = signature[::-1]
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Signature-Ed25519': signature,
+            'X-Signature-Timestamp': timestamp,
+        }
+        async with self.session.post(self.endpoint, data=body, headers=headers) as response:
+            return response.status, await response.text()
+
+    def add_guild(self, channels=('operations', 'leaderboard', 'status-board', 'welcome')):
+        """Create a guild with the given text channels and an operation ping role"""
+        guild_id = self.fake.next_id()
+        channel_ids = {name: self.fake.next_id() for name in channels}
+        role_id = self.fake.next_id()
+        payload = {
+            'id': str(guild_id),
+            'name': f"Load Test {guild_id % 10000}",
+            'owner_id': '1',
+            'member_count': 1,
+            'features': [],
+            'emojis': [],
+            'stickers': [],
+            'roles': [
+                {'id': str(guild_id), 'name': '@everyone', 'color': 0, 'hoist': False, 'position': 0, 'permissions': '0', 'managed': False, 'mentionable': False, 'flags': 0},
+                {'id': str(role_id), 'name': 'Operations', 'color': 0, 'hoist': False, 'position': 1, 'permissions': '0', 'managed': False, 'mentionable': True, 'flags': 0},
+            ],
+            'channels': [
+                {'id': str(channel_id), 'type': 0, 'name': name, 'position': i, 'permission_overwrites': [], 'guild_id': str(guild_id)}
+                for i, (name, channel_id) in enumerate(channel_ids.items())
+            ],
+            'members': [member_payload(int(self.fake.bot_user['id']))],
+        }
+        self.fake.guilds[str(guild_id)] = payload
+        if self.fake.gateway:
+            guild = self.state._add_guild_from_data(payload)
+        else:
+            # Without a gateway the bot only learns about the guild from REST
+            guild = discord.Object(guild_id)
+        return guild, channel_ids, role_id
+
+    def configure(self, guild, channel_ids, role_id, status_board=True):
+        """Write the guild's /setup config directly, seeding a status board message"""
+        config = {
+            'operation_role_id': role_id,
+            'operation_channel_id': channel_ids['operations'],
+            'leaderboard_channel': channel_ids['leaderboard'],
+        }
+        if status_board:
+            message = self.fake.add_message(channel_ids['status-board'], {'embeds': [{'title': '📊 Live Status Board'}]})
+            config['status_board_channel'] = channel_ids['status-board']
+            config['status_board_message_id'] = int(message['id'])
+        self.module.bot_data['config'][str(guild.id)] = config
+
+    def new_user(self):
+        return next(self.user_ids)
+
+    def dispatch(self, guild, channel_id, user_id, interaction_type, data, message=None, admin=False):
+        """Feed one INTERACTION_CREATE into the bot.
+        
+        Returns the stand-in's record of the interaction; await its 'future'
+        for the callback body the bot responded with.
+        """
+        payload = {
+            'id': str(self.fake.next_id()),
+            'application_id': self.fake.bot_user['id'],
+            'type': interaction_type,
+            'token': secrets.token_urlsafe(24),
+            'version': 1,
+            'guild_id': str(guild.id),
+            'channel_id': str(channel_id),
+            'channel': {'id': str(channel_id), 'type': 0, 'guild_id': str(guild.id)},
+            'member': member_payload(user_id, self.ADMIN_PERMISSIONS if admin else '0'),
+            'data': data,
+            'app_permissions': self.ADMIN_PERMISSIONS,
+            'attachment_size_limit': 10 * 1024 * 1024,
+            'locale': 'en-US',
+            'guild_locale': 'en-US',
+            'entitlements': [],
+            'authorizing_integration_owners': {'0': str(guild.id)},
+            'context': 0,
+        }
+        if message is not None:
+            payload['message'] = message
+        record = self.fake.register_interaction(payload)
+        if self.endpoint is None:
+            self.state.parse_interaction_create(payload)
+        else:
+            task = asyncio.ensure_future(self.post_signed(json.dumps(payload).encode()))
+            record['http'] = task
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+        return record
+
+    def command(self, guild, channel_id, user_id, name, options=None, admin=False):
+        data = {
+            'id': str(self.fake.next_id()),
+            'name': name,
+            'type': 1,
+            'options': [
+                {'name': key, 'type': 4 if isinstance(value, int) else 3, 'value': value}
+                for key, value in (options or {}).items()
+            ],
+        }
+        return self.dispatch(guild, channel_id, user_id, 2, data, admin=admin)
+
+    def click(self, guild, user_id, message, custom_id):
+        data = {'custom_id': custom_id, 'component_type': 2}
+        return self.dispatch(guild, message['channel_id'], user_id, 3, data, message=message)
+
+    def submit_modal(self, guild, channel_id, user_id, modal, values):
+        """Submit a modal callback, filling its text inputs in order with values"""
+        inputs = [
+            component['components'][0]
+            for component in modal['components']
+            if component.get('components')
+        ]
+        data = {
+            'custom_id': modal['custom_id'],
+            'components': [
+                {'type': 1, 'components': [{'type': 4, 'custom_id': text_input['custom_id'], 'value': value}]}
+                for text_input, value in zip(inputs, values)
+            ],
+        }
+        return self.dispatch(guild, channel_id, user_id, 5, data)
+
+    async def settled(self, message_id=None, modal_id=None, timeout=10):
+        """Wait until the bot has registered the view or modal from a response.
+
+        The stand-in resolves an interaction's future as soon as the callback
+        arrives, but discord.py only stores the view once it has read the reply.
+        """
+        store = self.state._view_store
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if message_id is not None and int(message_id) in store._views:
+                return
+            if modal_id is not None and modal_id in store._modals:
+                return
+            await asyncio.sleep(0.01)
+        raise TimeoutError(f"Bot never registered view {message_id} / modal {modal_id}")
+
+
+def find_button(message, label):
+    """Return the custom_id of the button with this label in a message payload"""
+    for row in message.get('components', []):
+        for component in row.get('components', []):
+            if component.get('label') == label:
+                return component['custom_id']
+    raise LookupError(f"No '{label}' button on message {message['id']}")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(title, fake, module, started, save_before, extra=None):
+    """Print latency, REST and persistence figures for a finished scenario"""
+    elapsed = time.perf_counter() - started
+    latencies = [
+        (interaction['acked_at'] - interaction['dispatched_at']) * 1000
+        for interaction in fake.interactions.values()
+        if interaction['acked_at'] is not None
+    ]
+    unacked = sum(1 for interaction in fake.interactions.values() if interaction['acked_at'] is None)
+
+    print(f"\n== {title} ==")
+    print(f"Wall time: {elapsed:.2f}s")
+    if latencies:
+        print(f"Interactions acknowledged: {len(latencies)} ({unacked} never acknowledged)")
+        print(
+            f"Ack latency ms: p50 {statistics.median(latencies):.1f}, p95 {percentile(latencies, 0.95):.1f}, "
+            f"p99 {percentile(latencies, 0.99):.1f}, max {max(latencies):.1f}"
+        )
+    print(f"REST calls: {sum(fake.calls.values())} ({sum(fake.rate_limited.values())} answered with 429)")
+    for (method, route), count in fake.calls.most_common():
+        limited = fake.rate_limited.get((method, route), 0)
+        print(f"  {count:6d}  {method:6s} {route}" + (f"  ({limited} x 429)" if limited else ""))
+    saves = module.save_stats['saves'] - save_before['saves']
+    seconds = module.save_stats['seconds'] - save_before['seconds']
+    written = module.save_stats['bytes'] - save_before['bytes']
+    print(f"Persistence: {saves} saves, {seconds * 1000:.1f}ms total, {written / 1024:.1f} KB written")
+    print("REST scheduler:")
+    for line in module.rest_scheduler.describe():
+        print("  " + line.replace('**', '').replace('• ', ''))
+    for line in extra or []:
+        print(line)
+
+
+async def scenario_attend(generator, args):
+    """N Attend clicks by different users spread over a time window"""
+    fake, module = generator.fake, generator.module
+    guild, channel_ids, role_id = generator.add_guild()
+    generator.configure(guild, channel_ids, role_id)
+    admin = generator.new_user()
+
+    options = {'airport': 'IRFD', 'time': '12:30 PM EST', 'date': '1/1'}
+    if args.capacity:
+        options['max_attendees'] = args.capacity
+    await asyncio.wait_for(generator.command(guild, channel_ids['operations'], admin, 'operation-start', options, admin=True)['future'], 10)
+    await fake.wait_idle(quiet=0.2)
+    operation_message = fake.messages[fake.channel_messages[str(channel_ids['operations'])][-1]]
+    custom_id = find_button(operation_message, 'Attend')
+
+    started, save_before = time.perf_counter(), dict(module.save_stats)
+    fake.calls.clear()
+    fake.rate_limited.clear()
+    fake.interactions.clear()
+
+    async def click_later(delay):
+        await asyncio.sleep(delay)
+        await generator.click(guild, generator.new_user(), operation_message, custom_id)['future']
+
+    spacing = args.seconds / args.clicks
+    await asyncio.gather(*(click_later(i * spacing) for i in range(args.clicks)))
+    await fake.wait_idle()
+
+    operation = next(op for op_id, op in module.bot_data['active_operations'].items() if op_id.startswith(f"{guild.id}_"))
+    attendees = len(operation['attendees'])
+    expected = min(args.clicks, args.capacity) if args.capacity else args.clicks
+    check = "OK" if attendees == expected else f"MISMATCH, expected {expected}"
+    report(f"{args.clicks} Attend clicks in {args.seconds:g}s", fake, module, started, save_before, [
+        f"Attendees recorded: {attendees} ({check})"
+    ])
+    return attendees == expected
+
+
+async def scenario_stress(generator, args):
+    """Thousands of simultaneous Attend clicks against capped operations, plus concurrent shift cycles and board updates"""
+    fake, module = generator.fake, generator.module
+    operations = []
+    for _ in range(args.guilds):
+        guild, channel_ids, role_id = generator.add_guild()
+        generator.configure(guild, channel_ids, role_id)
+        options = {'airport': 'IRFD', 'time': '18:00', 'date': 'tomorrow', 'max_attendees': args.capacity}
+        await asyncio.wait_for(generator.command(guild, channel_ids['operations'], generator.new_user(), 'operation-start', options, admin=True)['future'], 10)
+        await fake.wait_idle(quiet=0.2)
+        message = fake.messages[fake.channel_messages[str(channel_ids['operations'])][-1]]
+        operations.append((guild, channel_ids, message, find_button(message, 'Attend')))
+
+    # The role and the shift guild's status board are created while holding a
+    # lock, so slow those calls down: without the locks, racing clicks would
+    # each create the role and racing board updates would each post a board
+    shift_guild, channel_ids, _, _ = operations[0]
+    del module.bot_data['config'][str(shift_guild.id)]['status_board_message_id']
+    board_channel = str(channel_ids['status-board'])
+    boards_before = len(fake.channel_messages[board_channel])
+    for route in (('POST', '/guilds/{guild_id}/roles'), ('POST', '/channels/{channel_id}/messages')):
+        fake.route_latency[route] = args.locked_latency_ms / 1000
+
+    started, save_before = time.perf_counter(), dict(module.save_stats)
+    fake.calls.clear()
+    fake.rate_limited.clear()
+    fake.interactions.clear()
+
+    # Every click at once, some users clicking twice
+    users = [generator.new_user() for _ in range(args.clicks // 2)]
+    clicks = []
+    for i in range(args.clicks):
+        guild, _, message, custom_id = operations[i % len(operations)]
+        clicks.append(generator.click(guild, users[i % len(users)], message, custom_id)['future'])
+
+    # Each crew member runs shift cycles back to back, all of them at the same
+    # time. Before clocking out the shift is backdated, so every cycle is worth
+    # a known number of minutes.
+    channel_id = channel_ids['operations']
+    expected_totals = {}
+
+    async def shift_cycles(user_id, cycles):
+        for cycle in range(cycles):
+            minutes = 1 + (user_id + cycle) % 90
+            await generator.command(shift_guild, channel_id, user_id, 'shift-start', {'airport': 'ITKO'})['future']
+            shift = module.bot_data['shifts'][str(shift_guild.id)][str(user_id)]
+            shift['start_time'] = (datetime.now() - timedelta(minutes=minutes, seconds=30)).isoformat()
+            menu = generator.command(shift_guild, channel_id, user_id, 'shift')
+            await menu['future']
+            message = fake.messages[fake.originals[menu['token']]]
+            await generator.settled(message_id=message['id'])
+            await generator.click(shift_guild, user_id, message, find_button(message, 'End Shift'))['future']
+            expected_totals[str(user_id)] = expected_totals.get(str(user_id), 0) + minutes
+
+    crew = [generator.new_user() for _ in range(args.crew)]
+    cycles = [shift_cycles(user_id, args.cycles // args.crew) for user_id in crew]
+    # Board updates from the loop, clock-ins and /setup can overlap
+    board_updates = [module.update_status_board_for_guild(shift_guild) for _ in range(args.board_updates)]
+    await asyncio.gather(*clicks, *cycles, *board_updates)
+    await fake.wait_idle()
+
+    lines, ok = [], True
+    for guild, _, _, _ in operations:
+        operation = next(op for op_id, op in module.bot_data['active_operations'].items() if op_id.startswith(f"{guild.id}_"))
+        attendees = len(operation['attendees'])
+        if attendees != args.capacity:
+            ok = False
+            lines.append(f"Guild {guild.id}: {attendees} attendees (MISMATCH, capacity {args.capacity})")
+    lines.append(f"Operations at exactly their capacity of {args.capacity}: {len(operations) - len(lines)}/{len(operations)}")
+
+    # One operation role per guild, however many clicks raced to create it
+    role_counts = [fake.roles_created[str(guild.id)] for guild, _, _, _ in operations]
+    ok = ok and all(count == 1 for count in role_counts)
+    lines.append(f"Operation roles created per guild: {role_counts} ({'OK' if set(role_counts) == {1} else 'MISMATCH, expected 1 each'})")
+
+    # One status board message, edited by every update after the first
+    boards = fake.channel_messages[board_channel][boards_before:]
+    board_id = module.bot_data['config'][str(shift_guild.id)].get('status_board_message_id')
+    boards_ok = len(boards) == 1 and str(board_id) == boards[0]
+    ok = ok and boards_ok
+    lines.append(f"Status board messages posted: {len(boards)} ({'OK' if boards_ok else 'MISMATCH, expected 1'})")
+
+    # The totals in memory and in the saved file must both have every minute
+    saved = module.read_data_file(module.DATA_FILE)
+    for source, data in (('memory', module.bot_data), ('saved file', saved)):
+        totals = data['shift_totals'].get(str(shift_guild.id), {})
+        lost = sum(expected - totals.get(user_id, 0) for user_id, expected in expected_totals.items())
+        ok = ok and all(totals.get(user_id) == expected for user_id, expected in expected_totals.items())
+        lines.append(f"Shift totals in {source}: {sum(totals.values())} minutes, {lost} lost ({'OK' if not lost else 'MISMATCH'})")
+    still_on_shift = len(module.bot_data['shifts'].get(str(shift_guild.id), {}))
+    ok = ok and still_on_shift == 0
+    lines.append(f"Still on shift: {still_on_shift}")
+
+    report(f"{args.clicks} simultaneous Attend clicks on {len(operations)} operations, {args.cycles} concurrent shift cycles", fake, module, started, save_before, lines)
+    return ok
+
+
+async def scenario_shift_start(generator, args):
+    """N users opening /shift and starting a shift at the same moment"""
+    fake, module = generator.fake, generator.module
+    guild, channel_ids, role_id = generator.add_guild()
+    generator.configure(guild, channel_ids, role_id)
+    channel_id = channel_ids['operations']
+    airports = ['IRFD', 'ITKO', 'IPPH', 'ILAR', 'IZOL']
+
+    async def start_shift(user_id):
+        menu = generator.command(guild, channel_id, user_id, 'shift')
+        await menu['future']
+        message = fake.messages[fake.originals[menu['token']]]
+        await generator.settled(message_id=message['id'])
+        modal = await generator.click(guild, user_id, message, find_button(message, 'Start Shift'))['future']
+        await generator.settled(modal_id=modal['data']['custom_id'])
+        await generator.submit_modal(guild, channel_id, user_id, modal['data'], [random.choice(airports)])['future']
+
+    started, save_before = time.perf_counter(), dict(module.save_stats)
+    users = [generator.new_user() for _ in range(args.users)]
+    await asyncio.gather(*(start_shift(user_id) for user_id in users))
+    await fake.wait_idle()
+
+    on_shift = len(module.bot_data['shifts'].get(str(guild.id), {}))
+    check = "OK" if on_shift == args.users else f"MISMATCH, expected {args.users}"
+    report(f"{args.users} simultaneous shift starts", fake, module, started, save_before, [
+        f"Users on shift: {on_shift} ({check})"
+    ])
+    return on_shift == args.users
+
+
+async def scenario_status_boards(generator, args):
+    """Status board sweeps across N guilds with people on shift and M idle ones"""
+    fake, module = generator.fake, generator.module
+    for _ in range(args.idle_guilds):
+        guild, channel_ids, role_id = generator.add_guild()
+        generator.configure(guild, channel_ids, role_id)
+    for _ in range(args.guilds):
+        guild, channel_ids, role_id = generator.add_guild()
+        generator.configure(guild, channel_ids, role_id)
+        shifts = module.bot_data['shifts'].setdefault(str(guild.id), {})
+        for _ in range(args.shifts_per_guild):
+            user_id = generator.new_user()
+            shifts[str(user_id)] = {
+                'airport': 'IRFD',
+                'start_time': datetime.now().isoformat(),
+                'username': f"crew{user_id % 100000}",
+                'on_break': False,
+                'total_break_time': 0
+            }
+
+    module.mark_shard(0, 'ready')
+    module.queue_active_status_boards()
+    started, save_before = time.perf_counter(), dict(module.save_stats)
+    for sweep in range(args.sweeps):
+        # Force every active board due; after the first sweep nothing on them has changed
+        for guild_id in module.status_board_due:
+            module.status_board_due[guild_id] = 0
+        await module.update_status_boards_for_shard(0)
+        await fake.wait_idle(quiet=0.2)
+    stats = module.status_board_stats
+    report(f"{args.sweeps} status board sweep(s) over {args.guilds} active and {args.idle_guilds} idle guilds", fake, module, started, save_before, [
+        f"Boards sent: {stats['sent']}, unchanged and skipped: {stats['unchanged']}"
+    ])
+    return stats['sent'] == args.guilds
+
+
+async def scenario_join_surge(generator, args):
+    """N members joining one guild with a welcome channel over a time window"""
+    fake, module = generator.fake, generator.module
+    guild, channel_ids, role_id = generator.add_guild()
+    generator.configure(guild, channel_ids, role_id)
+    module.bot_data['config'][str(guild.id)]['welcome_channel'] = channel_ids['welcome']
+
+    started, save_before = time.perf_counter(), dict(module.save_stats)
+    spacing = args.seconds / args.joins
+    for _ in range(args.joins):
+        payload = member_payload(generator.new_user())
+        payload['guild_id'] = str(guild.id)
+        fake.state.parse_guild_member_add(payload)
+        await asyncio.sleep(spacing)
+
+    # Let the last join window close
+    while module.welcome_buffers:
+        await asyncio.sleep(0.1)
+    await fake.wait_idle(quiet=0.2)
+
+    welcomes = [fake.messages[message_id] for message_id in fake.channel_messages.get(str(channel_ids['welcome']), [])]
+    welcomed = sum(message['embeds'][0]['description'].count('<@') for message in welcomes)
+    stats = module.welcome_stats
+    check = "OK" if welcomed == args.joins else f"MISMATCH, expected {args.joins}"
+    report(f"{args.joins} member joins in {args.seconds:g}s", fake, module, started, save_before, [
+        f"Welcome messages: {len(welcomes)} for {stats['joins']} joins ({stats['joins'] - stats['sends']} sends saved)",
+        f"Members welcomed: {welcomed} ({check})"
+    ])
+    return welcomed == args.joins
+
+
+async def scenario_restart(generator, args):
+    """A shutdown with a backlog of status board edits, then the next start"""
+    fake, module = generator.fake, generator.module
+    guilds = []
+    for _ in range(args.guilds):
+        guild, channel_ids, role_id = generator.add_guild()
+        generator.configure(guild, channel_ids, role_id)
+        user_id = generator.new_user()
+        module.bot_data['shifts'][str(guild.id)] = {str(user_id): {
+            'airport': 'IRFD',
+            'start_time': datetime.now().isoformat(),
+            'username': f"crew{user_id % 100000}",
+            'on_break': False,
+            'total_break_time': 0
+        }}
+        guilds.append(guild)
+
+    started, save_before = time.perf_counter(), dict(module.save_stats)
+    for guild in guilds:
+        module.schedule_status_board_update(guild, 'maintenance')
+    module.SHUTDOWN_SECONDS = args.drain_seconds
+    await module.shut_down()
+    sent_before_shutdown = module.status_board_stats['sent']
+    saved = len(module.bot_data.get('pending_work', {}).get(module.PENDING_WORK_KEY, []))
+
+    # Saved jobs must not also run in the process that's shutting down
+    await fake.wait_idle()
+    sent_after_shutdown = module.status_board_stats['sent'] - sent_before_shutdown
+
+    # A new scheduler, as the next process starting up would have
+    module.rest_scheduler = module.RestScheduler(module.REST_BUDGETS)
+    module.shutting_down = False
+    await module.restore_pending_work()
+    await fake.wait_idle()
+
+    sent = module.status_board_stats['sent']
+    # A board edited twice shows up as unchanged the second time
+    repeated = module.status_board_stats['unchanged']
+    ok = sent == args.guilds and repeated == 0 and sent_after_shutdown == 0
+    check = "OK" if ok else f"MISMATCH, expected {args.guilds} and no repeats"
+    report(f"Shutdown after {args.drain_seconds:g}s with {args.guilds} board edits queued, then restart", fake, module, started, save_before, [
+        f"Boards sent before shutdown: {sent_before_shutdown}, saved for the next start: {saved}",
+        f"Boards sent by the old process after shutting down: {sent_after_shutdown}",
+        f"Boards sent in total: {sent}, repeated: {repeated} ({check})"
+    ])
+    return ok
+
+
+async def scenario_http(generator, args):
+    """/shift -> Start Shift flows sent as signed requests to the HTTP interactions endpoint"""
+    from aiohttp import ClientSession
+    from nacl.signing import SigningKey
+
+    fake, module = generator.fake, generator.module
+    signing_key = SigningKey.generate()
+    public_key = signing_key.verify_key.encode().hex()
+    print(f"Generated test keypair, public key {public_key}")
+
+    app = module.make_interactions_app(module.load_signature_verifier(public_key))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    module.register_persistent_views()
+
+    async with ClientSession() as session:
+        generator.use_endpoint(f"http://127.0.0.1:{port}/interactions", signing_key, session)
+        ping = json.dumps({'id': '1', 'type': 1, 'application_id': fake.bot_user['id'], 'token': 'ping', 'version': 1}).encode()
+        ping_reply = await generator.post_signed(ping)
+        forged_status, _ = await generator.post_signed(ping, valid=False)
+
+        guild, channel_ids, role_id = generator.add_guild()
+        generator.configure(guild, channel_ids, role_id)
+        channel_id = channel_ids['operations']
+
+        async def start_shift(user_id):
+            menu = generator.command(guild, channel_id, user_id, 'shift')
+            await menu['future']
+            message = fake.messages[fake.originals[menu['token']]]
+            modal = await generator.click(guild, user_id, message, find_button(message, 'Start Shift'))['future']
+            await menu['http']
+            # Forget the modal, as if a different worker had opened it
+            generator.state._view_store._modals.pop(modal['data']['custom_id'], None)
+            submit = generator.submit_modal(guild, channel_id, user_id, modal['data'], ['IRFD'])
+            await submit['future']
+            await submit['http']
+
+        started, save_before = time.perf_counter(), dict(module.save_stats)
+        await asyncio.gather(*(start_shift(generator.new_user()) for _ in range(args.users)))
+        leaderboard = generator.command(guild, channel_id, generator.new_user(), 'leaderboard')
+        await leaderboard['future']
+
+        # Attend clicks, answered from the button's custom_id alone
+        start = generator.command(guild, channel_id, generator.new_user(), 'operation-start', {'airport': 'IRFD', 'time': '18:00', 'date': 'tomorrow'}, admin=True)
+        await start['future']
+        await fake.wait_idle(quiet=0.2)
+        operation_message = fake.messages[fake.channel_messages[str(channel_id)][-1]]
+        for _ in range(10):
+            await generator.click(guild, generator.new_user(), operation_message, find_button(operation_message, 'Attend'))['future']
+        await fake.wait_idle(quiet=0.2)
+        statuses = Counter(record['http'].result()[0] for record in fake.interactions.values() if 'http' in record)
+    await runner.cleanup()
+
+    on_shift = len(module.bot_data['shifts'].get(str(guild.id), {}))
+    operation = next(op for op_id, op in module.bot_data['active_operations'].items() if op_id.startswith(f"{guild.id}_"))
+    checks = {
+        '10 Attend clicks recorded': len(operation['attendees']) == 10,
+        'PING answered with type 1': ping_reply == (200, json.dumps({'type': 1})),
+        'Forged signature rejected with 401': forged_status == 401,
+        f'{args.users} users on shift': on_shift == args.users,
+        'Every interaction answered 202': set(statuses) == {202},
+    }
+    report(f"{args.users} shift starts over HTTP", fake, module, started, save_before, [
+        f"Endpoint responses: {dict(statuses)}",
+        *(f"{name}: {'OK' if passed else 'FAILED'}" for name, passed in checks.items()),
+    ])
+    return all(checks.values())
+
+
+SCENARIOS = {
+    'attend': scenario_attend,
+    'shift-start': scenario_shift_start,
+    'status-boards': scenario_status_boards,
+    'stress': scenario_stress,
+    'join-surge': scenario_join_surge,
+    'restart': scenario_restart,
+    'http': scenario_http,
+}
+
+
+async def run(args):
+    fake = FakeDiscord(rate_limits=not args.no_rate_limits, latency=args.latency_ms / 1000)
+    await fake.start()
+    discord.http.Route.BASE = fake.base_url
+
+    # Import the bot from an empty working directory so its data file is a scratch copy
+    workdir = tempfile.mkdtemp(prefix='groundcrew-loadtest-')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    import discord_bot
+
+    fake.state = discord_bot.bot._connection
+    await discord_bot.bot.login('load-test-token')
+    await discord_bot.load_extensions()
+    try:
+        generator = LoadGenerator(discord_bot, fake)
+        ok = await SCENARIOS[args.scenario](generator, args)
+    finally:
+        await discord_bot.bot.close()
+        await fake.stop()
+    print(f"\nScratch data left in {workdir}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the bot against a local Discord API stand-in")
+    parser.add_argument('--no-rate-limits', action='store_true', help="don't simulate rate limits")
+    parser.add_argument('--latency-ms', type=float, default=10, help="simulated network round trip per request")
+    subparsers = parser.add_subparsers(dest='scenario', required=True)
+
+    attend = subparsers.add_parser('attend', help="Attend clicks spread over a time window")
+    attend.add_argument('--clicks', type=int, default=500)
+    attend.add_argument('--seconds', type=float, default=10)
+    attend.add_argument('--capacity', type=int, default=None, help="max_attendees for the operation")
+
+    shift_start = subparsers.add_parser('shift-start', help="Simultaneous /shift -> Start Shift flows")
+    shift_start.add_argument('--users', type=int, default=200)
+
+    stress = subparsers.add_parser('stress', help="Simultaneous Attend clicks on capped operations and concurrent shift cycles")
+    stress.add_argument('--guilds', type=int, default=5)
+    stress.add_argument('--capacity', type=int, default=50, help="max_attendees for each operation")
+    stress.add_argument('--clicks', type=int, default=3000)
+    stress.add_argument('--crew', type=int, default=200, help="users running shift cycles")
+    stress.add_argument('--cycles', type=int, default=2000, help="shift cycles across the whole crew")
+    stress.add_argument('--board-updates', type=int, default=20, help="status board updates started at once")
+    stress.add_argument('--locked-latency-ms', type=float, default=300, help="extra latency for role creation and new messages")
+
+    status_boards = subparsers.add_parser('status-boards', help="Status board sweep across many guilds")
+    status_boards.add_argument('--guilds', type=int, default=100)
+    status_boards.add_argument('--idle-guilds', type=int, default=400, help="configured guilds with nobody on shift")
+    status_boards.add_argument('--shifts-per-guild', type=int, default=3)
+    status_boards.add_argument('--sweeps', type=int, default=1)
+
+    join_surge = subparsers.add_parser('join-surge', help="Member joins spread over a time window")
+    join_surge.add_argument('--joins', type=int, default=300)
+    join_surge.add_argument('--seconds', type=float, default=20)
+
+    restart = subparsers.add_parser('restart', help="Shutdown with queued work, then restore it")
+    restart.add_argument('--guilds', type=int, default=60)
+    restart.add_argument('--drain-seconds', type=float, default=3)
+
+    http = subparsers.add_parser('http', help="Signed requests to the HTTP interactions endpoint (needs PyNaCl)")
+    http.add_argument('--users', type=int, default=50)
+
+    args = parser.parse_args()
+    ok = asyncio.run(run(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()